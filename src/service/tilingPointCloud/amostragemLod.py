@@ -0,0 +1,72 @@
+import numpy as np
+from typing import Tuple
+
+# pontos usados para calibrar o tamanho do voxel antes da seleção final
+PONTOS_CALIBRACAO = 2_000_000
+
+
+def _chaves_voxel(pontos: np.ndarray, origem: np.ndarray, lado: float) -> Tuple[np.ndarray, np.ndarray]:
+    indices = np.floor((pontos - origem) / lado).astype(np.int64)
+    dims = indices.max(axis=0) + 1
+    chaves = (indices[:, 0] * dims[1] + indices[:, 1]) * dims[2] + indices[:, 2]
+    return chaves, indices
+
+
+def _calibrar_voxel(pontos: np.ndarray, alvo: int, iteracoes: int) -> Tuple[np.ndarray, float]:
+    # origem e lado da grade de voxels com cerca de 'alvo' voxels ocupados
+    n = len(pontos)
+    origem = np.min(pontos, axis=0)
+    extensao = np.maximum(np.max(pontos, axis=0) - origem, 1e-9)
+
+    # nuvens de levantamento são quase 2.5D: parte da área das duas maiores extensões
+    maiores = np.sort(extensao)[::-1]
+    lado = float(np.sqrt(maiores[0] * maiores[1] / alvo))
+
+    passo = max(1, n // PONTOS_CALIBRACAO)
+    calibracao = pontos[::passo]
+    alvo_calibracao = max(1, alvo // passo) if passo > 1 else alvo
+    for _ in range(iteracoes):
+        ocupados = np.unique(_chaves_voxel(calibracao, origem, lado)[0]).size
+        if ocupados <= alvo_calibracao * 1.1:
+            break
+        lado *= float(np.sqrt(ocupados / alvo_calibracao))
+
+    return origem, lado
+
+
+def medir_espacamento(pontos: np.ndarray, alvo: int, iteracoes: int = 6) -> float:
+    """
+    Espaçamento que uma amostra uniforme de 'alvo' pontos teria, sem escolher
+    a amostra: o lado do voxel calibrado como em selecionar_amostra_voxel.
+    """
+    if len(pontos) <= alvo:
+        return 0.0
+    return _calibrar_voxel(pontos, alvo, iteracoes)[1]
+
+
+def selecionar_amostra_voxel(pontos: np.ndarray, alvo: int, iteracoes: int = 6) -> Tuple[np.ndarray, float]:
+    """
+    Escolhe cerca de 'alvo' pontos espalhados de forma uniforme: a caixa dos
+    pontos é dividida em uma grade de voxels e, de cada voxel ocupado, fica o
+    ponto mais próximo do centro. Retorna a máscara dos escolhidos e o lado do
+    voxel, que é o espaçamento da amostra.
+    """
+    n = len(pontos)
+    if n <= alvo:
+        return np.ones(n, dtype=bool), 0.0
+
+    origem, lado = _calibrar_voxel(pontos, alvo, iteracoes)
+    chaves, indices = _chaves_voxel(pontos, origem, lado)
+    centros = (indices + 0.5) * lado + origem
+    distancias = np.sum((pontos - centros) ** 2, axis=1)
+    del centros, indices
+
+    ordem = np.lexsort((distancias, chaves))
+    chaves_ordenadas = chaves[ordem]
+    primeiro = np.ones(n, dtype=bool)
+    primeiro[1:] = chaves_ordenadas[1:] != chaves_ordenadas[:-1]
+
+    selecionados = np.zeros(n, dtype=bool)
+    selecionados[ordem[primeiro]] = True
+
+    return selecionados, lado
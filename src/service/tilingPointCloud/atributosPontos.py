@@ -0,0 +1,128 @@
+import numpy as np
+from typing import Dict, Optional, Sequence
+from boundingVolumes import base_enu
+from amostragemLod import medir_espacamento
+
+# atributos do LAS levados até a batch table de cada .pnts:
+# nome: (dimensão no laspy, tipo gravado, propriedade na batch table, componentType)
+ATRIBUTOS = {
+    "classificacao": ("classification", np.dtype('<u1'), "Classification", "UNSIGNED_BYTE"),
+    "intensidade": ("intensity", np.dtype('<u2'), "Intensity", "UNSIGNED_SHORT"),
+    "retorno": ("return_number", np.dtype('<u1'), "ReturnNumber", "UNSIGNED_BYTE"),
+}
+# colunas de RGB no começo de cada linha do array de cores; os atributos vêm em seguida, em bytes
+COLUNAS_RGB = 3
+# pontos por voxel na estimativa das normais
+PONTOS_POR_VOXEL_NORMAL = 16
+# abaixo disso um voxel não define um plano e usa o voxel do dobro do tamanho
+PONTOS_MINIMOS_NORMAL = 5
+
+
+def validar_atributos(atributos: Sequence[str]):
+    invalidos = [nome for nome in atributos if nome not in ATRIBUTOS]
+    if invalidos:
+        raise ValueError(f"Atributos inválidos: {invalidos} (opções: {', '.join(ATRIBUTOS)})")
+
+
+def bytes_atributos(atributos: Sequence[str]) -> int:
+    return sum(ATRIBUTOS[nome][1].itemsize for nome in atributos)
+
+
+def largura_cores(atributos: Sequence[str]) -> int:
+    # colunas uint8 por ponto do array de cores: RGB e os bytes dos atributos
+    return COLUNAS_RGB + bytes_atributos(atributos)
+
+
+def gravar_atributos(fonte, atributos: Sequence[str], destino: np.ndarray):
+    """
+    Copia os atributos de um LasData (ou bloco do chunk_iterator) para as
+    colunas depois do RGB em 'destino' (uint8, uma linha por ponto). Os
+    atributos andam junto com as cores em todas as reordenações e fatias, sem
+    arrays paralelos para manter em sincronia.
+    """
+    n = len(destino)
+    coluna = COLUNAS_RGB
+    for nome in atributos:
+        dimensao, tipo, _, _ = ATRIBUTOS[nome]
+        valores = np.ascontiguousarray(np.asarray(getattr(fonte, dimensao))[:n], dtype=tipo)
+        destino[:, coluna:coluna + tipo.itemsize] = valores.view(np.uint8).reshape(n, tipo.itemsize)
+        coluna += tipo.itemsize
+
+
+def separar_atributos(cores: np.ndarray, atributos: Sequence[str]) -> Dict[str, np.ndarray]:
+    # valores tipados de cada atributo, a partir das colunas depois do RGB
+    valores = {}
+    coluna = COLUNAS_RGB
+    for nome in atributos:
+        tipo = ATRIBUTOS[nome][1]
+        valores[nome] = np.ascontiguousarray(cores[:, coluna:coluna + tipo.itemsize]).view(tipo).reshape(-1)
+        coluna += tipo.itemsize
+    return valores
+
+
+def _covariancias_por_voxel(relativos: np.ndarray, lado: float):
+    # soma de x, xxᵀ e contagem por voxel, sem loop em Python
+    indices = np.floor((relativos - relativos.min(axis=0)) / lado).astype(np.int64)
+    dimensoes = indices.max(axis=0) + 1
+    chaves = (indices[:, 0] * dimensoes[1] + indices[:, 1]) * dimensoes[2] + indices[:, 2]
+    _, voxel, contagens = np.unique(chaves, return_inverse=True, return_counts=True)
+    voxel = voxel.reshape(-1)
+
+    somas = np.zeros((len(contagens), 3))
+    for eixo in range(3):
+        somas[:, eixo] = np.bincount(voxel, weights=relativos[:, eixo], minlength=len(contagens))
+    produtos = np.zeros((len(contagens), 3, 3))
+    for i in range(3):
+        for j in range(i, 3):
+            produtos[:, i, j] = np.bincount(voxel, weights=relativos[:, i] * relativos[:, j],
+                                            minlength=len(contagens))
+            produtos[:, j, i] = produtos[:, i, j]
+
+    medias = somas / contagens[:, None]
+    covariancias = produtos / contagens[:, None, None] - medias[:, :, None] * medias[:, None, :]
+    return voxel, contagens, covariancias
+
+
+def estimar_normais(pontos: np.ndarray, origem: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Normal de cada ponto pelo plano que melhor ajusta sua vizinhança: os
+    pontos são agrupados em voxels com ~PONTOS_POR_VOXEL_NORMAL pontos e a
+    normal é o autovetor de menor autovalor da covariância do voxel (todos os
+    voxels de uma vez com eigh). Voxels com poucos pontos usam o voxel do
+    dobro do lado e, se ainda faltarem pontos, a vertical local. As normais
+    apontam para o lado da vertical local, já que o levantamento é aéreo.
+    """
+    n = len(pontos)
+    centro = pontos.mean(axis=0, dtype=np.float64)
+    relativos = pontos.astype(np.float64) - centro
+    vertical = base_enu(centro + (0 if origem is None else origem))[:, 2]
+    normais = np.tile(vertical, (n, 1))
+    if n < PONTOS_MINIMOS_NORMAL:
+        return normais
+
+    lado = medir_espacamento(relativos, max(1, n // PONTOS_POR_VOXEL_NORMAL))
+    if lado <= 0:
+        return normais
+
+    definidos = np.zeros(n, dtype=bool)
+    for escala in (1.0, 2.0):
+        voxel, contagens, covariancias = _covariancias_por_voxel(relativos, lado * escala)
+        _, vetores = np.linalg.eigh(covariancias)
+        usar = ~definidos & (contagens[voxel] >= PONTOS_MINIMOS_NORMAL)
+        normais[usar] = vetores[voxel[usar], :, 0]
+        definidos |= usar
+
+    normais[normais @ vertical < 0] *= -1
+    return normais
+
+
+def codificar_oct16p(normais: np.ndarray, destino: np.ndarray):
+    # NORMAL_OCT16P: projeção octaédrica da normal em dois uint8 (como o octEncode do Cesium)
+    soma = np.abs(normais).sum(axis=1, keepdims=True)
+    projetadas = normais[:, :2] / np.where(soma > 0, soma, 1.0)
+    abaixo = normais[:, 2] < 0
+    x, y = projetadas[abaixo, 0], projetadas[abaixo, 1]
+    projetadas[abaixo, 0] = (1.0 - np.abs(y)) * np.where(x >= 0, 1.0, -1.0)
+    projetadas[abaixo, 1] = (1.0 - np.abs(x)) * np.where(y >= 0, 1.0, -1.0)
+    np.rint((np.clip(projetadas, -1.0, 1.0) * 0.5 + 0.5) * 255.0, out=projetadas)
+    destino[:] = projetadas
@@ -0,0 +1,276 @@
+import os
+import io
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+from datetime import datetime
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+from lazExtractor import LAZExtractor
+from configuracaoBuild import GENERATORS
+from nuvemSintetica import DISTRIBUICOES, gerar_ept_sintetico
+from divisaoAdaptativa import DIVISOES
+from boundingVolumes import TIPOS_VOLUME
+
+TAMANHOS = {"1M": 1_000_000, "10M": 10_000_000, "100M": 100_000_000}
+
+CAMINHO_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+# piora relativa aceita em relação à baseline antes de acusar regressão
+TOLERANCIA_TEMPO = 0.10
+TOLERANCIA_MEMORIA = 0.10
+
+
+def _zerar_pico_rss():
+    # no Linux escrever 5 em clear_refs zera o VmHWM, e o pico passa a ser medido por etapa
+    try:
+        with open("/proc/self/clear_refs", 'w') as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _pico_rss_mb() -> float:
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for linha in f:
+                if linha.startswith("VmHWM:"):
+                    return int(linha.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # sem /proc: pico do processo inteiro (KB no Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def _pico_rss_filhos_mb() -> float:
+    # maior pico entre os workers de leitura e de tiles já encerrados
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0
+
+
+class MedidorEtapas:
+    def __init__(self):
+        self.etapas: Dict[str, dict] = {}
+
+    @contextlib.contextmanager
+    def etapa(self, nome: str):
+        _zerar_pico_rss()
+        inicio = time.perf_counter()
+        yield
+        self.etapas[nome] = {"tempo_s": time.perf_counter() - inicio, "pico_rss_mb": _pico_rss_mb()}
+
+
+def _cronometrar_escrita(generator) -> dict:
+    # soma o tempo de _escrever_tile_pnts; só vale com num_workers=1, já que os workers são outros processos
+    acumulado = {"tempo_s": 0.0, "tiles": 0}
+    escrever = generator._escrever_tile_pnts
+
+    def escrever_cronometrado(*args, **kwargs):
+        inicio = time.perf_counter()
+        escrever(*args, **kwargs)
+        acumulado["tempo_s"] += time.perf_counter() - inicio
+        acumulado["tiles"] += 1
+
+    generator._escrever_tile_pnts = escrever_cronometrado
+    return acumulado
+
+
+def _bytes_saida(output_dir: Path) -> Dict[str, int]:
+    por_tipo = {}
+    for arquivo in Path(output_dir).rglob("*"):
+        if arquivo.is_file():
+            por_tipo[arquivo.suffix] = por_tipo.get(arquivo.suffix, 0) + arquivo.stat().st_size
+    return por_tipo
+
+
+def executar_cenario(cenario: dict) -> dict:
+    """
+    Roda leitura, octree e gravação do tileset de um cenário, medindo cada
+    etapa. Executado num processo novo por cenário, para que o pico de memória
+    de um não contamine o do seguinte.
+    """
+    saida = io.StringIO()
+    redirecionar = contextlib.nullcontext() if cenario["verboso"] else contextlib.redirect_stdout(saida)
+
+    with redirecionar:
+        extractor = LAZExtractor(Path(cenario["ept"]))
+        generator = GENERATORS[cenario["generator"]](
+            max_points_per_tile=cenario["max_pontos_por_tile"],
+            num_workers=cenario["workers"],
+            lod=cenario["lod"],
+            divisao=cenario["divisao"],
+            volume_limite=cenario["volume_limite"]
+        )
+        # saída vazia: o TileGeneratorQuality reaproveitaria os tiles da execução anterior
+        generator.output_dir = Path(cenario["saida"])
+        shutil.rmtree(generator.output_dir, ignore_errors=True)
+        generator.output_dir.mkdir(parents=True)
+        medidor = MedidorEtapas()
+        escrita = _cronometrar_escrita(generator) if cenario["workers"] == 1 else None
+
+        inicio = time.perf_counter()
+        with medidor.etapa("leitura"):
+            if cenario["baixa_memoria"]:
+                pontos, cores, generator.origem = extractor.processar_todos_arquivos_laz_baixa_memoria(
+                    num_workers=cenario["workers"], compartilhado=cenario["workers"] > 1
+                )
+            else:
+                pontos, cores = extractor.processar_todos_arquivos_laz(num_workers=cenario["workers"],
+                                                                       compartilhado=cenario["workers"] > 1)
+        with medidor.etapa("octree"):
+            tileset = generator.gerar_tileset(pontos, cores)
+            del pontos, cores
+            extractor.liberar_memoria_compartilhada()
+        with medidor.etapa("salvar"):
+            generator.salvar_tileset_json(tileset)
+        tempo_total = time.perf_counter() - inicio
+
+    if escrita is not None:
+        medidor.etapas["escrita_pnts"] = {"tempo_s": escrita["tempo_s"], "dentro_de": "octree"}
+
+    bytes_por_tipo = _bytes_saida(generator.output_dir)
+    return {
+        "pontos": len(pontos),
+        "tempo_total_s": tempo_total,
+        "pico_rss_mb": max(max(e.get("pico_rss_mb", 0.0) for e in medidor.etapas.values()),
+                           _pico_rss_filhos_mb()),
+        "tiles": generator.tile_counter,
+        "tiles_por_s": generator.tile_counter / medidor.etapas["octree"]["tempo_s"],
+        "bytes_saida": sum(bytes_por_tipo.values()),
+        "bytes_por_tipo": bytes_por_tipo,
+        "etapas": medidor.etapas
+    }
+
+
+def _variacao(atual: float, base: float) -> float:
+    return (atual - base) / base if base else 0.0
+
+
+def comparar_com_baseline(resultados: Dict[str, dict], baseline: Dict[str, dict]) -> List[str]:
+    """
+    Imprime cada cenário ao lado da baseline e devolve as regressões: tempo ou
+    pico de memória acima da tolerância. Mudança no tamanho da saída é só
+    informada, já que pode ser intencional (outro formato, outro LOD).
+    """
+    regressoes = []
+    print(f"\n{'cenário':<48} {'tempo (s)':>18} {'pico RSS (MB)':>20} {'tiles/s':>10} {'saída (bytes)':>24}")
+    for nome, resultado in resultados.items():
+        base = baseline.get(nome)
+        if base is None:
+            print(f"{nome:<48} {resultado['tempo_total_s']:>18.2f} {resultado['pico_rss_mb']:>20.1f} "
+                  f"{resultado['tiles_por_s']:>10.1f} {resultado['bytes_saida']:>24,}  (sem baseline)")
+            continue
+
+        tempo = _variacao(resultado["tempo_total_s"], base["tempo_total_s"])
+        memoria = _variacao(resultado["pico_rss_mb"], base["pico_rss_mb"])
+        tamanho = _variacao(resultado["bytes_saida"], base["bytes_saida"])
+        print(f"{nome:<48} {resultado['tempo_total_s']:>9.2f} ({tempo:+6.1%}) "
+              f"{resultado['pico_rss_mb']:>11.1f} ({memoria:+6.1%}) {resultado['tiles_por_s']:>10.1f} "
+              f"{resultado['bytes_saida']:>15,} ({tamanho:+6.1%})")
+
+        if tempo > TOLERANCIA_TEMPO:
+            regressoes.append(f"{nome}: tempo {tempo:+.1%}")
+        if memoria > TOLERANCIA_MEMORIA:
+            regressoes.append(f"{nome}: pico de memória {memoria:+.1%}")
+        if resultado["bytes_saida"] != base["bytes_saida"]:
+            print(f"  saída mudou: {base['bytes_saida']:,} -> {resultado['bytes_saida']:,} bytes")
+
+    return regressoes
+
+
+def _maquina() -> dict:
+    return {"plataforma": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark do tiler sobre EPTs sintéticos, comparado a uma baseline gravada"
+    )
+    parser.add_argument("--tamanhos", nargs="+", choices=list(TAMANHOS), default=["1M"])
+    parser.add_argument("--distribuicoes", nargs="+", choices=DISTRIBUICOES, default=list(DISTRIBUICOES))
+    parser.add_argument("--generators", nargs="+", choices=list(GENERATORS), default=list(GENERATORS))
+    parser.add_argument("--diretorio", type=Path, default=Path(tempfile.gettempdir()) / "benchmark_tiler",
+                        help="onde ficam os EPTs sintéticos (reaproveitados entre execuções) e as saídas")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-pontos-por-tile", type=int, default=25000)
+    parser.add_argument("--lod", action="store_true")
+    parser.add_argument("--divisao", choices=DIVISOES, default="octree")
+    parser.add_argument("--volume-limite", choices=TIPOS_VOLUME, default="aabb")
+    parser.add_argument("--baixa-memoria", action="store_true", help="ingestão float32 em buffers pré-alocados")
+    parser.add_argument("--baseline", type=Path, default=CAMINHO_BASELINE)
+    parser.add_argument("--salvar-baseline", action="store_true", help="grava os resultados como nova baseline")
+    parser.add_argument("--verboso", action="store_true", help="mostra a saída do tiler")
+    args = parser.parse_args()
+
+    parametros = {"workers": args.workers, "max_pontos_por_tile": args.max_pontos_por_tile,
+                  "lod": args.lod, "baixa_memoria": args.baixa_memoria, "divisao": args.divisao,
+                  "volume_limite": args.volume_limite}
+    resultados = {}
+    for tamanho in args.tamanhos:
+        for distribuicao in args.distribuicoes:
+            ept = gerar_ept_sintetico(args.diretorio / f"{distribuicao}_{tamanho}", TAMANHOS[tamanho], distribuicao)
+            for nome_generator in args.generators:
+                nome = f"{distribuicao}/{tamanho}/{nome_generator}"
+                print(f"Executando {nome}...")
+                cenario = {
+                    "ept": str(ept),
+                    "saida": str(args.diretorio / "saida" / nome.replace("/", "_")),
+                    "generator": nome_generator,
+                    "workers": args.workers,
+                    "max_pontos_por_tile": args.max_pontos_por_tile,
+                    "lod": args.lod,
+                    "divisao": args.divisao,
+                    "volume_limite": args.volume_limite,
+                    "baixa_memoria": args.baixa_memoria,
+                    "verboso": args.verboso
+                }
+                # processo novo por cenário: pico de memória isolado e nenhum cache aquecido pelo anterior
+                with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                    resultados[nome] = pool.submit(executar_cenario, cenario).result()
+
+    baseline = {}
+    if args.baseline.exists():
+        with open(args.baseline, 'r') as f:
+            dados_baseline = json.load(f)
+        if dados_baseline.get("parametros") != parametros:
+            # números de outra configuração não servem de referência
+            print(f"Aviso: baseline gravada com outros parâmetros ({dados_baseline.get('parametros')}), ignorando")
+        else:
+            baseline = dados_baseline["resultados"]
+            if dados_baseline.get("maquina") != _maquina():
+                print(f"Aviso: baseline gravada em outra máquina ({dados_baseline.get('maquina')})")
+
+    regressoes = comparar_com_baseline(resultados, baseline)
+
+    relatorio = {
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "maquina": _maquina(),
+        "parametros": parametros,
+        "resultados": resultados
+    }
+    args.diretorio.mkdir(parents=True, exist_ok=True)
+    with open(args.diretorio / "resultado_benchmark.json", 'w') as f:
+        json.dump(relatorio, f, indent=2)
+    print(f"\nResultados salvos em: {args.diretorio / 'resultado_benchmark.json'}")
+
+    if args.salvar_baseline:
+        # mantém os cenários da baseline que não foram executados desta vez
+        relatorio["resultados"] = dict(baseline, **resultados)
+        with open(args.baseline, 'w') as f:
+            json.dump(relatorio, f, indent=2)
+        print(f"Baseline salva em: {args.baseline}")
+
+    if regressoes:
+        print("\nRegressões em relação à baseline:")
+        for regressao in regressoes:
+            print(f"  {regressao}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
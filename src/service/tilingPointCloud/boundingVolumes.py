@@ -0,0 +1,170 @@
+import math
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional
+from py3dtiles.tileset.bounding_volume_box import BoundingVolumeBox
+
+# "aabb": caixa alinhada aos eixos ECEF; "enu": caixa alinhada ao leste/norte/vertical local;
+# "pca": caixa nos eixos principais dos pontos; "esfera": esfera em volta da caixa ENU
+TIPOS_VOLUME = ("aabb", "enu", "pca", "esfera")
+
+# semi-eixos do WGS84: a normal do elipsoide dá a vertical local da base ENU
+WGS84_A = 6378137.0
+WGS84_B = 6356752.314245179
+# pontos usados para estimar a covariância no ajuste PCA
+PONTOS_AJUSTE_PCA = 50_000
+# pontos projetados por bloco, para não criar cópias float64 do nó inteiro
+TAMANHO_BLOCO_PROJECAO = 1_000_000
+NOME_RELATORIO_VOLUMES = "relatorio_volumes.json"
+
+
+def base_enu(centro: np.ndarray) -> np.ndarray:
+    # colunas leste, norte e vertical (normal do elipsoide) no ponto ECEF 'centro'
+    x, y, z = (float(v) for v in centro)
+    cima = np.array([x / WGS84_A ** 2, y / WGS84_A ** 2, z / WGS84_B ** 2])
+    cima /= np.linalg.norm(cima)
+    leste = np.array([-y, x, 0.0])
+    norma = np.linalg.norm(leste)
+    # nos polos o leste não é definido; qualquer horizontal serve
+    leste = leste / norma if norma > 0 else np.array([1.0, 0.0, 0.0])
+    norte = np.cross(cima, leste)
+    return np.column_stack([leste, norte, cima])
+
+
+def base_pca(pontos: np.ndarray) -> np.ndarray:
+    # eixos principais dos pontos, da maior para a menor variância
+    amostra = pontos[::max(1, len(pontos) // PONTOS_AJUSTE_PCA)].astype(np.float64)
+    amostra -= amostra.mean(axis=0)
+    _, vetores = np.linalg.eigh(amostra.T @ amostra)
+    return vetores[:, ::-1]
+
+
+def _caixa_alinhada(pontos: np.ndarray, origem: np.ndarray) -> List[float]:
+    min_coords = np.min(pontos, axis=0).astype(np.float64) + origem
+    max_coords = np.max(pontos, axis=0).astype(np.float64) + origem
+    center = (min_coords + max_coords) / 2.0
+    half_axes = (max_coords - min_coords) / 2.0
+    return [
+        center[0], center[1], center[2],
+        half_axes[0], 0, 0,
+        0, half_axes[1], 0,
+        0, 0, half_axes[2]
+    ]
+
+
+def _caixa_nos_eixos(pontos: np.ndarray, eixos: np.ndarray, origem: np.ndarray) -> List[float]:
+    # caixa orientada pelos eixos (colunas ortonormais): min/max das projeções, em blocos
+    referencia = pontos[0].astype(np.float64)
+    minimo = np.full(3, np.inf)
+    maximo = np.full(3, -np.inf)
+    for inicio in range(0, len(pontos), TAMANHO_BLOCO_PROJECAO):
+        projecoes = (pontos[inicio:inicio + TAMANHO_BLOCO_PROJECAO] - referencia) @ eixos
+        np.minimum(minimo, projecoes.min(axis=0), out=minimo)
+        np.maximum(maximo, projecoes.max(axis=0), out=maximo)
+
+    center = referencia + origem + eixos @ ((minimo + maximo) / 2.0)
+    half_axes = eixos * ((maximo - minimo) / 2.0)
+    return center.tolist() + half_axes[:, 0].tolist() + half_axes[:, 1].tolist() + half_axes[:, 2].tolist()
+
+
+def _esfera(pontos: np.ndarray, origem: np.ndarray) -> List[float]:
+    # centro da caixa ENU (bem ajustada) e raio até o ponto mais distante dele
+    box = np.asarray(_caixa_nos_eixos(pontos, base_enu(_centro_aproximado(pontos, origem)), origem))
+    centro_relativo = box[:3] - origem
+    raio = 0.0
+    for inicio in range(0, len(pontos), TAMANHO_BLOCO_PROJECAO):
+        distancias = np.linalg.norm(pontos[inicio:inicio + TAMANHO_BLOCO_PROJECAO] - centro_relativo, axis=1)
+        raio = max(raio, float(distancias.max()))
+    return box[:3].tolist() + [raio]
+
+
+def _centro_aproximado(pontos: np.ndarray, origem: np.ndarray) -> np.ndarray:
+    return pontos[::max(1, len(pontos) // PONTOS_AJUSTE_PCA)].astype(np.float64).mean(axis=0) + origem
+
+
+def volume_de_pontos(pontos: np.ndarray, tipo: str = "aabb", origem: Optional[np.ndarray] = None) -> dict:
+    """
+    Bounding volume do 3D Tiles ({"box": [...]} ou {"sphere": [...]}) que
+    contém os pontos. Longe do equador a caixa alinhada aos eixos ECEF fica
+    inclinada em relação ao terreno e muito maior que ele; a caixa ENU segue a
+    vertical local e a PCA também gira no plano para seguir faixas diagonais.
+    Com 'origem' os pontos estão relativos a ela (ingestão de baixa memória).
+    """
+    origem = np.zeros(3) if origem is None else np.asarray(origem, dtype=np.float64)
+    if tipo == "aabb":
+        return BoundingVolumeBox.from_list(_caixa_alinhada(pontos, origem)).to_dict()
+    if tipo == "enu":
+        return {"box": _caixa_nos_eixos(pontos, base_enu(_centro_aproximado(pontos, origem)), origem)}
+    if tipo == "pca":
+        return {"box": _caixa_nos_eixos(pontos, base_pca(pontos), origem)}
+    if tipo == "esfera":
+        return {"sphere": _esfera(pontos, origem)}
+    raise ValueError(f"Tipo de bounding volume inválido: {tipo}")
+
+
+def volume_em_m3(bounding_volume: dict) -> float:
+    if "sphere" in bounding_volume:
+        return 4.0 / 3.0 * math.pi * bounding_volume["sphere"][3] ** 3
+    box = np.asarray(bounding_volume["box"], dtype=np.float64)
+    return 8.0 * abs(float(np.linalg.det(box[3:].reshape(3, 3))))
+
+
+def cantos_volume(bounding_volume: dict) -> np.ndarray:
+    # 8 cantos da caixa (ou da caixa alinhada que contém a esfera)
+    if "sphere" in bounding_volume:
+        centro, raio = np.asarray(bounding_volume["sphere"][:3], dtype=np.float64), bounding_volume["sphere"][3]
+        semi_eixos = np.eye(3) * raio
+    else:
+        box = np.asarray(bounding_volume["box"], dtype=np.float64)
+        centro, semi_eixos = box[:3], box[3:].reshape(3, 3)
+    sinais = np.array([[sx, sy, sz] for sx in (-1, 1) for sy in (-1, 1) for sz in (-1, 1)], dtype=np.float64)
+    return centro + sinais @ semi_eixos
+
+
+def com_margem(bounding_volume: dict, relativa: float = 0.005, absoluta: float = 1.0) -> dict:
+    # aumenta cada semi-eixo (ou o raio) para cobrir a curvatura entre pontos amostrados
+    if "sphere" in bounding_volume:
+        esfera = list(bounding_volume["sphere"])
+        esfera[3] += esfera[3] * relativa + absoluta
+        return {"sphere": esfera}
+    box = np.asarray(bounding_volume["box"], dtype=np.float64)
+    semi_eixos = box[3:].reshape(3, 3)
+    comprimentos = np.linalg.norm(semi_eixos, axis=1, keepdims=True)
+    direcoes = np.divide(semi_eixos, comprimentos, out=np.eye(3), where=comprimentos > 0)
+    semi_eixos = direcoes * (comprimentos * (1.0 + relativa) + absoluta)
+    return {"box": box[:3].tolist() + semi_eixos.reshape(-1).tolist()}
+
+
+def caixa_envolvente(bounding_volumes: List[dict], tipo: str = "aabb") -> dict:
+    # volume do tipo pedido que envolve todos os recebidos (pelos cantos de cada um)
+    cantos = np.vstack([cantos_volume(bounding_volume) for bounding_volume in bounding_volumes])
+    return volume_de_pontos(cantos, tipo)
+
+
+def salvar_relatorio_volumes(output_dir: Path, tipo: str, comparacao: Dict[str, float]):
+    """
+    Grava quanto o bounding volume escolhido reduz o volume em relação à caixa
+    alinhada aos eixos ECEF dos mesmos nós. A razão média por nó pesa cada
+    tile igual; a soma é dominada pelos nós mais altos da árvore.
+    """
+    if comparacao["nos"] == 0:
+        return
+    relatorio = {
+        "tipo": tipo,
+        "nos": int(comparacao["nos"]),
+        "volume_aabb_m3": comparacao["volume_aabb"],
+        "volume_m3": comparacao["volume"],
+        "reducao_volume_total": 1.0 - comparacao["volume"] / comparacao["volume_aabb"]
+        if comparacao["volume_aabb"] > 0 else 0.0,
+        "razao_media_por_no": comparacao["soma_razoes"] / comparacao["nos"]
+    }
+    relatorio_path = Path(output_dir) / NOME_RELATORIO_VOLUMES
+    with open(relatorio_path, 'w') as f:
+        json.dump(relatorio, f, indent=2)
+
+    reducao = relatorio['reducao_volume_total']
+    print(f"Bounding volumes '{tipo}' em {relatorio['nos']} nós: volume total "
+          f"{100.0 * abs(reducao):.1f}% {'menor' if reducao >= 0 else 'maior'} que as caixas ECEF, "
+          f"cada nó com {100.0 * relatorio['razao_media_por_no']:.1f}% do volume da caixa ECEF em média")
+    print(f"Relatório de bounding volumes salvo em: {relatorio_path}")
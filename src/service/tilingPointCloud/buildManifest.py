@@ -0,0 +1,64 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional
+
+NOME_MANIFESTO = "build_manifest.json"
+VERSAO_MANIFESTO = 1
+
+
+def calcular_hash_arquivo(caminho: Path, tamanho_bloco: int = 8 * 1024 * 1024) -> str:
+    # sha256 do conteúdo, lido em blocos para não carregar o arquivo inteiro
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        while True:
+            bloco = f.read(tamanho_bloco)
+            if not bloco:
+                break
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def calcular_hash_parametros(parametros: Dict) -> str:
+    return hashlib.sha256(json.dumps(parametros, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ManifestoBuild:
+    """
+    Registro da última build, salvo ao lado do tileset.json: hash de cada LAZ de
+    entrada e dos parâmetros do tiler, bounds da octree e, para cada entrada, as
+    subárvores (e portanto os tiles) para as quais ela contribuiu.
+    """
+
+    def __init__(self, output_dir: Path):
+        self.caminho = Path(output_dir) / NOME_MANIFESTO
+
+    def carregar(self) -> Optional[Dict]:
+        if not self.caminho.exists():
+            return None
+        try:
+            with open(self.caminho, 'r') as f:
+                dados = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Erro ao ler manifesto de build: {e}")
+            return None
+
+        if dados.get("versao") != VERSAO_MANIFESTO:
+            print("Manifesto de build em versão diferente, ignorando")
+            return None
+        return dados
+
+    def salvar(self, dados: Dict):
+        # escreve em arquivo temporário e troca, para nunca deixar um manifesto pela metade
+        dados = dict(dados, versao=VERSAO_MANIFESTO)
+        temporario = self.caminho.with_name(self.caminho.name + ".tmp")
+        with open(temporario, 'w') as f:
+            json.dump(dados, f, separators=(',', ':'))
+        os.replace(temporario, self.caminho)
+
+    def atualizar(self, campos: Dict):
+        # acrescenta campos ao manifesto existente (ou a um novo) sem apagar os demais
+        dados = self.carregar() or {}
+        dados.update(campos)
+        self.salvar(dados)
@@ -0,0 +1,293 @@
+import json
+import struct
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+from atributosPontos import ATRIBUTOS, largura_cores, separar_atributos, codificar_oct16p
+
+FORMATOS_POSICAO = ("float32", "quantizado")
+FORMATOS_COR = ("rgb", "rgb565")
+
+TAMANHO_CABECALHO_PNTS = 28
+# bytes acumulados pelo EscritorPnts antes de gravar um lote de tiles. Em disco local
+# gravar cada tile logo após montá-lo é mais rápido (o buffer ainda está no cache);
+# lotes ajudam em volumes de rede, onde a latência por arquivo domina e os arquivos
+# do lote são gravados ao mesmo tempo
+LIMITE_LOTE_ESCRITA = 0
+# arquivos de um lote gravados em paralelo
+THREADS_ESCRITA_LOTE = 8
+
+
+def calcular_caixa_quantizacao(pontos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # QUANTIZED_VOLUME_OFFSET e QUANTIZED_VOLUME_SCALE do tile
+    offset = np.min(pontos, axis=0)
+    scale = np.max(pontos, axis=0) - offset
+    scale = np.where(scale > 0, scale, 1.0)
+    return offset, scale
+
+
+def quantizar_posicoes(pontos: np.ndarray, offset: np.ndarray, scale: np.ndarray, destino: np.ndarray):
+    # POSITION_QUANTIZED: uint16 por eixo dentro da caixa offset + scale do tile
+    quantizados = np.rint((pontos - offset) / scale * 65535.0)
+    np.clip(quantizados, 0, 65535, out=destino, casting='unsafe')
+
+
+def codificar_rgb565(cores: np.ndarray, destino: np.ndarray):
+    # 5 bits de vermelho, 6 de verde e 5 de azul em um uint16
+    c = np.clip(cores, 0, 255).astype(np.uint16)
+    np.bitwise_or((c[:, 0] >> 3) << 11 | (c[:, 1] >> 2) << 5, c[:, 2] >> 3, out=destino, casting='unsafe')
+
+
+def _layout_batch_table(num_pontos: int, atributos: Sequence[str]) -> Tuple[dict, List[int], int]:
+    # JSON da batch table, posição de cada atributo no corpo binário e tamanho do corpo;
+    # cada atributo começa alinhado ao tamanho do seu componente
+    batch_table_json = {}
+    deslocamentos = []
+    deslocamento = 0
+    for nome in atributos:
+        _, tipo, propriedade, componente = ATRIBUTOS[nome]
+        deslocamento += (tipo.itemsize - deslocamento % tipo.itemsize) % tipo.itemsize
+        batch_table_json[propriedade] = {"byteOffset": deslocamento, "componentType": componente, "type": "SCALAR"}
+        deslocamentos.append(deslocamento)
+        deslocamento += num_pontos * tipo.itemsize
+    deslocamento += (8 - deslocamento % 8) % 8
+    return batch_table_json, deslocamentos, deslocamento
+
+
+def _feature_table_json(num_pontos: int, quantizado: bool, formato_cor: str, normais: bool) -> Tuple[dict, int]:
+    # entradas binárias da feature table e o tamanho delas, sem o padding
+    bytes_posicoes = num_pontos * (6 if quantizado else 12)
+    bytes_cores = num_pontos * (2 if formato_cor == "rgb565" else 3)
+    feature_table_json = {"POINTS_LENGTH": num_pontos}
+    feature_table_json["POSITION_QUANTIZED" if quantizado else "POSITION"] = {"byteOffset": 0}
+    feature_table_json["RGB565" if formato_cor == "rgb565" else "RGB"] = {"byteOffset": bytes_posicoes}
+    tamanho = bytes_posicoes + bytes_cores
+    if normais:
+        feature_table_json["NORMAL_OCT16P"] = {"byteOffset": tamanho}
+        tamanho += num_pontos * 2
+    return feature_table_json, tamanho
+
+
+def _tamanho_json_alinhado(objeto: dict, inicio: int, alinhamento: int) -> int:
+    # bytes do JSON com os espaços que fazem o que vem depois começar alinhado
+    tamanho = len(json.dumps(objeto, separators=(',', ':')))
+    return tamanho + (alinhamento - (inicio + tamanho) % alinhamento) % alinhamento
+
+
+def tamanho_tile_pnts(num_pontos: int, formato_posicao: str = "float32", formato_cor: str = "rgb",
+                      atributos: Sequence[str] = (), normais: bool = False) -> int:
+    # bytes do .pnts que montar_tile_pnts gera para num_pontos, sem montar o buffer;
+    # os números do JSON são coordenadas ECEF típicas, com o mesmo número de dígitos
+    quantizado = formato_posicao == "quantizado"
+    feature_table_json, tamanho_binario = _feature_table_json(num_pontos, quantizado, formato_cor, normais)
+    coordenadas = [4012345.678901234, -4456789.012345678, -2512345.678901234]
+    if quantizado:
+        feature_table_json["QUANTIZED_VOLUME_OFFSET"] = coordenadas
+        feature_table_json["QUANTIZED_VOLUME_SCALE"] = [123.45678901234567] * 3
+    else:
+        feature_table_json["RTC_CENTER"] = coordenadas
+
+    tamanho_json = len(json.dumps(feature_table_json, separators=(',', ':')))
+    tamanho_json += (4 - tamanho_json % 4) % 4
+    tamanho_binario += (8 - tamanho_binario % 8) % 8
+    tamanho = TAMANHO_CABECALHO_PNTS + tamanho_json + tamanho_binario
+    if atributos:
+        batch_table_json, _, tamanho_batch_binario = _layout_batch_table(num_pontos, atributos)
+        tamanho += _tamanho_json_alinhado(batch_table_json, tamanho, 8) + tamanho_batch_binario
+    return tamanho
+
+
+def montar_tile_pnts(pontos: np.ndarray, cores: np.ndarray, formato_posicao: str = "float32",
+                     formato_cor: str = "rgb", rtc_center: Optional[np.ndarray] = None,
+                     origem: Optional[np.ndarray] = None, atributos: Sequence[str] = (),
+                     normais: Optional[np.ndarray] = None) -> bytearray:
+    """
+    Monta o .pnts inteiro em um único buffer pré-alocado: cabeçalho, JSON e
+    corpo binário da feature table são gravados nas suas posições finais, e as
+    posições e cores são convertidas direto para dentro do buffer, sem bytes
+    intermediários. Com formato_posicao="float32" e rtc_center as posições são
+    relativas ao centro; no formato quantizado o offset do volume cumpre esse papel.
+    Com 'origem' os pontos (e rtc_center) estão relativos a ela, como na ingestão
+    de baixa memória, e ela só é somada nos valores absolutos gravados.
+    Os 'atributos' vêm nas colunas de 'cores' depois do RGB e vão para a batch
+    table, cada um com o seu tipo; 'normais' (unitárias) viram NORMAL_OCT16P.
+    """
+    if formato_posicao not in FORMATOS_POSICAO:
+        raise ValueError(f"Formato de posição inválido: {formato_posicao}")
+    if formato_cor not in FORMATOS_COR:
+        raise ValueError(f"Formato de cor inválido: {formato_cor}")
+    if cores.shape[1] != largura_cores(atributos):
+        raise ValueError(f"Cores com {cores.shape[1]} colunas, mas os atributos {list(atributos)} "
+                         f"pedem {largura_cores(atributos)}")
+
+    num_pontos = len(pontos)
+    quantizado = formato_posicao == "quantizado"
+    bytes_posicoes = num_pontos * (6 if quantizado else 12)
+    feature_table_json, ft_binary_length = _feature_table_json(num_pontos, quantizado, formato_cor,
+                                                              normais is not None)
+
+    deslocamento = np.zeros(3) if origem is None else np.asarray(origem, dtype=np.float64)
+    if quantizado:
+        offset, scale = calcular_caixa_quantizacao(pontos)
+        feature_table_json["QUANTIZED_VOLUME_OFFSET"] = [float(v) for v in offset + deslocamento]
+        feature_table_json["QUANTIZED_VOLUME_SCALE"] = [float(v) for v in scale]
+    elif rtc_center is not None:
+        centro = rtc_center + deslocamento
+        feature_table_json["RTC_CENTER"] = [float(centro[0]), float(centro[1]), float(centro[2])]
+
+    # JSON com padding de 4 bytes e corpo binário com padding de 8
+    ft_json_bytes = json.dumps(feature_table_json, separators=(',', ':')).encode('utf-8')
+    ft_json_bytes += b' ' * ((4 - len(ft_json_bytes) % 4) % 4)
+    ft_binary_length += (8 - ft_binary_length % 8) % 8
+
+    inicio_binario = TAMANHO_CABECALHO_PNTS + len(ft_json_bytes)
+    inicio_batch_table = inicio_binario + ft_binary_length
+    bt_json_bytes, bt_binary_length, deslocamentos = b'', 0, []
+    if atributos:
+        batch_table_json, deslocamentos, bt_binary_length = _layout_batch_table(num_pontos, atributos)
+        bt_json_bytes = json.dumps(batch_table_json, separators=(',', ':')).encode('utf-8')
+        bt_json_bytes += b' ' * ((8 - (inicio_batch_table + len(bt_json_bytes)) % 8) % 8)
+
+    buffer = bytearray(inicio_batch_table + len(bt_json_bytes) + bt_binary_length)
+    struct.pack_into('<4sIIIIII', buffer, 0, b'pnts', 1, len(buffer), len(ft_json_bytes), ft_binary_length,
+                     len(bt_json_bytes), bt_binary_length)
+    buffer[TAMANHO_CABECALHO_PNTS:inicio_binario] = ft_json_bytes
+
+    if quantizado:
+        destino = np.frombuffer(buffer, dtype='<u2', count=num_pontos * 3, offset=inicio_binario)
+        quantizar_posicoes(pontos, offset, scale, destino.reshape(num_pontos, 3))
+    else:
+        destino = np.frombuffer(buffer, dtype='<f4', count=num_pontos * 3, offset=inicio_binario)
+        if rtc_center is not None:
+            np.subtract(pontos, rtc_center, out=destino.reshape(num_pontos, 3), casting='unsafe')
+        elif origem is not None:
+            np.add(pontos, deslocamento, out=destino.reshape(num_pontos, 3), casting='unsafe')
+        else:
+            destino.reshape(num_pontos, 3)[:] = pontos
+
+    inicio_cores = inicio_binario + bytes_posicoes
+    rgb = cores[:, :3]
+    if formato_cor == "rgb565":
+        codificar_rgb565(rgb, np.frombuffer(buffer, dtype='<u2', count=num_pontos, offset=inicio_cores))
+    else:
+        destino = np.frombuffer(buffer, dtype=np.uint8, count=num_pontos * 3, offset=inicio_cores)
+        if cores.dtype == np.uint8:
+            destino.reshape(num_pontos, 3)[:] = rgb
+        else:
+            np.clip(rgb, 0, 255, out=destino.reshape(num_pontos, 3), casting='unsafe')
+
+    if normais is not None:
+        inicio_normais = feature_table_json["NORMAL_OCT16P"]["byteOffset"] + inicio_binario
+        destino = np.frombuffer(buffer, dtype=np.uint8, count=num_pontos * 2, offset=inicio_normais)
+        codificar_oct16p(normais, destino.reshape(num_pontos, 2))
+
+    inicio_batch_binario = inicio_batch_table + len(bt_json_bytes)
+    buffer[inicio_batch_table:inicio_batch_binario] = bt_json_bytes
+    for (nome, valores), deslocamento in zip(separar_atributos(cores, atributos).items(), deslocamentos):
+        destino = np.frombuffer(buffer, dtype=ATRIBUTOS[nome][1], count=num_pontos,
+                                offset=inicio_batch_binario + deslocamento)
+        destino[:] = valores
+
+    return buffer
+
+
+class EscritorPnts:
+    """
+    Grava os buffers de montar_tile_pnts com uma única chamada de write por
+    arquivo. Tiles pequenos ficam acumulados até somar limite_lote_bytes e são
+    gravados juntos em descarregar(), vários arquivos ao mesmo tempo, para que
+    a latência de um volume de rede não se some tile a tile;
+    limite_lote_bytes=0 grava na hora.
+    """
+
+    def __init__(self, limite_lote_bytes: int = LIMITE_LOTE_ESCRITA):
+        self.limite_lote_bytes = limite_lote_bytes
+        self._pendentes = []
+        self._bytes_pendentes = 0
+
+    def __getstate__(self):
+        # o escritor vai junto com o generator para os workers, mas sem os tiles pendentes
+        return {"limite_lote_bytes": self.limite_lote_bytes, "_pendentes": [], "_bytes_pendentes": 0}
+
+    def _gravar(self, caminho: Path, buffer: bytearray):
+        with open(caminho, 'wb', buffering=0) as f:
+            f.write(buffer)
+
+    def adicionar(self, caminho: Path, buffer: bytearray):
+        if len(buffer) >= self.limite_lote_bytes:
+            self._gravar(caminho, buffer)
+            return
+        self._pendentes.append((caminho, buffer))
+        self._bytes_pendentes += len(buffer)
+        if self._bytes_pendentes >= self.limite_lote_bytes:
+            self.descarregar()
+
+    def descarregar(self):
+        pendentes, self._pendentes, self._bytes_pendentes = self._pendentes, [], 0
+        if len(pendentes) <= 1:
+            for caminho, buffer in pendentes:
+                self._gravar(caminho, buffer)
+            return
+        with ThreadPoolExecutor(max_workers=min(THREADS_ESCRITA_LOTE, len(pendentes))) as pool:
+            # list() propaga o primeiro erro de gravação
+            list(pool.map(lambda pendente: self._gravar(*pendente), pendentes))
+
+
+def listar_conteudos(tile: dict) -> List[str]:
+    uris = [tile["content"]["uri"]] if "content" in tile else []
+    for child in tile.get("children", []):
+        uris.extend(listar_conteudos(child))
+    return uris
+
+
+def gerar_relatorio_compactacao(output_dir: Path, tileset: dict) -> dict:
+    """
+    Compara o tamanho de cada .pnts com o que ele teria em POSITION float32 + RGB,
+    lendo só o cabeçalho e a feature table JSON de cada arquivo.
+    """
+    tiles = []
+    for uri in listar_conteudos(tileset["root"]):
+        caminho = Path(output_dir) / uri
+        if not caminho.exists():
+            continue
+        with open(caminho, 'rb') as f:
+            header = f.read(TAMANHO_CABECALHO_PNTS)
+            _, _, byte_length, ft_json_length, _, bt_json_length, bt_binary_length = struct.unpack('<4sIIIIII', header)
+            feature_table_json = json.loads(f.read(ft_json_length))
+
+        num_pontos = feature_table_json["POINTS_LENGTH"]
+        # as normais (quando houver) entram iguais nos dois lados da comparação
+        binario_float32 = num_pontos * (17 if "NORMAL_OCT16P" in feature_table_json else 15)
+        binario_float32 += (8 - binario_float32 % 8) % 8
+        bytes_float32 = TAMANHO_CABECALHO_PNTS + ft_json_length + binario_float32 + bt_json_length + bt_binary_length
+
+        tiles.append({
+            "uri": uri,
+            "pontos": num_pontos,
+            "bytes": byte_length,
+            "bytes_float32_rgb": bytes_float32,
+            "bytes_economizados": bytes_float32 - byte_length
+        })
+
+    total = sum(t["bytes"] for t in tiles)
+    total_float32 = sum(t["bytes_float32_rgb"] for t in tiles)
+    return {
+        "tiles": tiles,
+        "bytes_total": total,
+        "bytes_total_float32_rgb": total_float32,
+        "bytes_economizados": total_float32 - total
+    }
+
+
+def salvar_relatorio_compactacao(output_dir: Path, tileset: dict):
+    relatorio = gerar_relatorio_compactacao(output_dir, tileset)
+    relatorio_path = Path(output_dir) / "relatorio_compactacao.json"
+    with open(relatorio_path, 'w') as f:
+        json.dump(relatorio, f, indent=2)
+
+    if relatorio["bytes_total_float32_rgb"] > 0:
+        reducao = 100.0 * relatorio["bytes_economizados"] / relatorio["bytes_total_float32_rgb"]
+        print(f"Compactação dos tiles: {relatorio['bytes_total']:,} bytes "
+              f"({relatorio['bytes_economizados']:,} bytes economizados, {reducao:.1f}%)")
+    print(f"Relatório de compactação salvo em: {relatorio_path}")
@@ -0,0 +1,113 @@
+import os
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# extensão do arquivo irmão gravado para cada formato
+EXTENSOES_COMPRESSAO = {"gzip": ".gz", "brotli": ".br"}
+# arquivos da build servidos ao viewer, além dos tileset*.json
+EXTENSOES_TILES = (".pnts", ".subtree")
+
+
+def _formatos_disponiveis(formatos: Iterable[str]) -> List[str]:
+    disponiveis = []
+    for formato in formatos:
+        if formato not in EXTENSOES_COMPRESSAO:
+            raise ValueError(f"Formato de compressão inválido: {formato}")
+        if formato == "brotli" and brotli is None:
+            print("Pacote 'brotli' não instalado - pulando a compressão brotli")
+            continue
+        disponiveis.append(formato)
+    return disponiveis
+
+
+def _comprimir_bytes(dados: bytes, formato: str) -> bytes:
+    if formato == "brotli":
+        return brotli.compress(dados, quality=11)
+    # mtime=0 para que o .gz não mude entre builds do mesmo conteúdo
+    return gzip.compress(dados, compresslevel=9, mtime=0)
+
+
+def comprimir_arquivo(caminho: Path, formatos: List[str]) -> Tuple[int, dict]:
+    """
+    Grava os irmãos comprimidos de 'caminho' (tile.pnts -> tile.pnts.gz, ...).
+    O irmão recebe o mtime do original, então numa build incremental os tiles
+    que não mudaram são reconhecidos e não são comprimidos de novo.
+    Retorna o tamanho original e o tamanho de cada formato.
+    """
+    estado = caminho.stat()
+    tamanhos = {}
+    dados = None
+
+    for formato in formatos:
+        irmao = caminho.with_name(caminho.name + EXTENSOES_COMPRESSAO[formato])
+        if irmao.exists() and irmao.stat().st_mtime_ns == estado.st_mtime_ns:
+            tamanhos[formato] = irmao.stat().st_size
+            continue
+
+        if dados is None:
+            with open(caminho, 'rb') as f:
+                dados = f.read()
+        comprimido = _comprimir_bytes(dados, formato)
+
+        temporario = irmao.with_name(irmao.name + ".tmp")
+        with open(temporario, 'wb') as f:
+            f.write(comprimido)
+        os.utime(temporario, ns=(estado.st_atime_ns, estado.st_mtime_ns))
+        os.replace(temporario, irmao)
+        tamanhos[formato] = len(comprimido)
+
+    return estado.st_size, tamanhos
+
+
+def remover_irmaos_orfaos(output_dir: Path) -> int:
+    # apaga .gz/.br cujo arquivo original não existe mais (tiles removidos numa build incremental)
+    removidos = 0
+    for extensao in EXTENSOES_COMPRESSAO.values():
+        for irmao in Path(output_dir).rglob(f"*{extensao}"):
+            if not irmao.with_suffix("").exists():
+                irmao.unlink()
+                removidos += 1
+    return removidos
+
+
+def comprimir_tileset(output_dir: Path, formatos: Iterable[str], num_workers: int = 1) -> int:
+    """
+    Etapa de compressão da build: grava ao lado do tileset.json e de cada tile
+    as versões .gz (e .br, se o pacote brotli estiver instalado), para o nginx
+    servir com gzip_static sem comprimir nada por requisição. zlib e brotli
+    liberam o GIL enquanto comprimem, então um pool de threads basta. Retorna
+    o total de bytes dos arquivos comprimidos.
+    """
+    formatos = _formatos_disponiveis(formatos)
+    if not formatos:
+        return 0
+
+    # varre o diretório em vez das uris do tileset, que no tiling implícito são só modelos
+    output_dir = Path(output_dir)
+    arquivos = sorted(output_dir.glob("tileset*.json"))
+    for extensao in EXTENSOES_TILES:
+        arquivos.extend(sorted(output_dir.rglob(f"*{extensao}")))
+
+    print(f"Comprimindo {len(arquivos)} arquivos ({', '.join(formatos)}) com {num_workers} threads...")
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        resultados = list(pool.map(lambda arquivo: comprimir_arquivo(arquivo, formatos), arquivos))
+
+    removidos = remover_irmaos_orfaos(output_dir)
+    if removidos:
+        print(f"Removidos {removidos} arquivos comprimidos órfãos")
+
+    total = sum(tamanho for tamanho, _ in resultados)
+    for formato in formatos:
+        total_formato = sum(tamanhos[formato] for _, tamanhos in resultados)
+        if total > 0:
+            print(f"  {formato}: {total:,} -> {total_formato:,} bytes "
+                  f"({100.0 * (1 - total_formato / total):.1f}% menor)")
+
+    return sum(sum(tamanhos.values()) for _, tamanhos in resultados)
@@ -0,0 +1,208 @@
+import os
+import json
+import argparse
+from pathlib import Path
+from typing import Dict
+from tilesGenerator import TileGenerator
+from tilesGeneratorQuality import TileGeneratorQuality
+from codificacaoPnts import FORMATOS_POSICAO, FORMATOS_COR
+from compressaoTiles import EXTENSOES_COMPRESSAO
+from transformacaoEcef import MODOS_TRANSFORMACAO
+from divisaoAdaptativa import DIVISOES
+from boundingVolumes import TIPOS_VOLUME
+from atributosPontos import ATRIBUTOS
+
+GENERATORS = {"TileGenerator": TileGenerator, "TileGeneratorQuality": TileGeneratorQuality}
+MODOS_INGESTAO = ("completo", "streaming", "hierarquia_ept", "incremental")
+
+# chave: (padrão, tipo, opções válidas, ajuda). A mesma chave vale no arquivo JSON
+# (--config) e na linha de comando (--max-pontos-por-tile para max_pontos_por_tile);
+# a linha de comando tem precedência sobre o arquivo, que tem precedência sobre o padrão.
+# None em workers/threads usa todos os núcleos
+OPCOES = {
+    "diretorio_ept": ("/assets", str, None, "diretório EPT de entrada (ept.json, ept-data/)"),
+    "diretorio_saida": (None, str, None, "onde gravar o tileset; sem ele vale a pasta padrão do generator"),
+    "generator": ("TileGeneratorQuality", str, tuple(GENERATORS), "TileGenerator é mais rápido, "
+                  "TileGeneratorQuality grava posições relativas ao centro do tile"),
+    "max_pontos_por_tile": (25000, int, None, "pontos máximos por tile"),
+    "max_niveis_octree": (6, int, None, "profundidade máxima da octree"),
+    "divisao": ("octree", str, DIVISOES, "adaptativa corta na mediana dos pontos: tiles com a mesma quantidade "
+                "de pontos, erro geométrico pelo espaçamento medido (com lod) e nenhum ponto descartado"),
+    "volume_limite": ("aabb", str, TIPOS_VOLUME, "enu e pca gravam caixas orientadas e esfera esferas, mais justas "
+                      "que a caixa ECEF; relatorio_volumes.json mostra a redução"),
+    "lod": (False, bool, None, "nós internos com amostra uniforme, para a raiz já desenhar algo com poucos bytes"),
+    "formato_posicao": ("float32", str, FORMATOS_POSICAO, "quantizado grava uint16 por eixo"),
+    "formato_cor": ("rgb", str, FORMATOS_COR, None),
+    "compressao": (["gzip"], list, tuple(EXTENSOES_COMPRESSAO),
+                   "irmãos pré-comprimidos servidos pelo nginx com gzip_static"),
+    "atributos": ([], list, tuple(ATRIBUTOS), "atributos do LAS (classificacao, intensidade, retorno) gravados "
+                  "na batch table de cada tile como Classification, Intensity e ReturnNumber, para filtrar e "
+                  "colorir no estilo do Cesium"),
+    "normais": (False, bool, None, "NORMAL_OCT16P estimado pelos vizinhos de cada ponto, para iluminação"),
+    "indice_espacial": (True, bool, None, "indice_espacial.npy com a caixa e os bytes de cada tile, para consultar "
+                        "pontos por caixa, raio ou polígono com o IndiceEspacial"),
+    "tiling_implicito": (False, bool, None, "3D Tiles 1.1 implícito, com disponibilidade em arquivos .subtree"),
+    "niveis_subarvore": (4, int, None, "níveis por arquivo .subtree no tiling implícito"),
+    "niveis_por_tileset_externo": (0, int, None, "um tileset_<nó>.json a cada tantos níveis (0 = um só)"),
+    "modo_ingestao": ("completo", str, MODOS_INGESTAO, "completo carrega tudo na memória; streaming lê em "
+                      "blocos; hierarquia_ept segue os nós do EPT; incremental regenera só o que mudou"),
+    "limite_memoria_mb": (4096, int, None, "teto de memória do modo streaming"),
+    "profundidade_maxima_ept": (None, int, None, "corta a hierarquia EPT nessa profundidade"),
+    "nivel_particao_incremental": (2, int, None, "nível das subárvores regeneradas no modo incremental"),
+    "intervalo_observacao": (10.0, float, None, "segundos entre as verificações do diretório EPT no --observar"),
+    "espera_observacao": (30.0, float, None, "segundos sem mudanças nos LAZ antes de atualizar o tileset "
+                          "no --observar, para não ler arquivos ainda sendo copiados"),
+    "resolucao_deduplicacao": (None, float, None, "lado (m) do voxel da deduplicação: um ponto por voxel, "
+                               "para faixas de voo sobrepostas"),
+    "celula_outliers": (None, float, None, "lado (m) das células da remoção de outliers; grande o bastante "
+                        "para um ponto típico ter dezenas de vizinhos nas 27 células em volta"),
+    "desvios_outliers": (3.0, float, None, "desvios-padrão abaixo da densidade média (em log) para virar outlier"),
+    "ingestao_baixa_memoria": (False, bool, None, "modo completo com pontos float32 relativos a uma origem"),
+    "modo_transformacao": ("exato", str, MODOS_TRANSFORMACAO, "plano_tangente aproxima a reprojeção por arquivo"),
+    "erro_maximo_plano_tangente": (0.005, float, None, "erro máximo (m) aceito no modo plano_tangente"),
+    "workers_leitura": (None, int, None, "processos que descompactam e reprojetam os LAZ"),
+    "workers_tiles": (None, int, None, "processos que constroem as subárvores e gravam os .pnts"),
+    "limite_lote_escrita": (0, int, None, "bytes de .pnts pequenos acumulados e gravados juntos, vários arquivos "
+                            "ao mesmo tempo; ajuda em volumes de rede (0 = grava cada tile na hora)"),
+    "threads_transformacao": (None, int, None, "threads da reprojeção na leitura sem pool de processos"),
+    "diretorio_metricas": ("../metricasBuild/", str, None, "build.jsonl e tiler.prom; fora da pasta de saída"),
+    "perfil_amostragem": (False, bool, None, "flamegraph do build com py-spy"),
+    "forcar_regeneracao": (False, bool, None, "refaz o tileset mesmo que um válido já exista na saída")
+}
+# opções da leitura que mudam os pontos que chegam ao generator, para decidir se a saída existente serve
+OPCOES_LEITURA = ("diretorio_ept", "resolucao_deduplicacao", "celula_outliers", "desvios_outliers",
+                  "ingestao_baixa_memoria", "modo_transformacao", "erro_maximo_plano_tangente")
+# opções com padrão que também aceitam null (desligado)
+ANULAVEIS = ("diretorio_metricas",)
+
+
+def _validar_valor(chave: str, valor):
+    padrao, tipo, escolhas, _ = OPCOES[chave]
+    if valor is None:
+        if padrao is not None and chave not in ANULAVEIS:
+            raise ValueError(f"'{chave}' não pode ser nulo")
+        return
+    # int é aceito onde se espera float; bool não passa por int
+    if tipo is float and isinstance(valor, int) and not isinstance(valor, bool):
+        return
+    if not isinstance(valor, tipo) or (tipo is int and isinstance(valor, bool)):
+        raise ValueError(f"'{chave}' deve ser {tipo.__name__}, não {type(valor).__name__}")
+    if escolhas is not None:
+        invalidos = [v for v in (valor if tipo is list else [valor]) if v not in escolhas]
+        if invalidos:
+            raise ValueError(f"Valor inválido para '{chave}': {invalidos} (opções: {', '.join(escolhas)})")
+
+
+def validar_configuracao(config: Dict):
+    for chave, valor in config.items():
+        if chave not in OPCOES:
+            raise ValueError(f"Opção desconhecida: '{chave}'")
+        _validar_valor(chave, valor)
+
+    if config["tiling_implicito"] and config["niveis_por_tileset_externo"] > 0:
+        raise ValueError("Use tiling implícito ou tilesets externos, não os dois")
+    if config["tiling_implicito"] and config["divisao"] == "adaptativa":
+        raise ValueError("O tiling implícito precisa da divisão em octantes, não da adaptativa")
+    if config["tiling_implicito"] and config["volume_limite"] != "aabb":
+        raise ValueError("O tiling implícito usa as caixas dos octantes, não aceita outro bounding volume")
+    if config["tiling_implicito"] and config["modo_ingestao"] in ("hierarquia_ept", "incremental"):
+        raise ValueError(f"Tiling implícito não é suportado no modo de ingestão '{config['modo_ingestao']}'")
+    filtragem = config["resolucao_deduplicacao"] is not None or config["celula_outliers"] is not None
+    if filtragem and config["modo_ingestao"] not in ("completo", "streaming"):
+        raise ValueError(f"A filtragem de pontos não é suportada no modo de ingestão '{config['modo_ingestao']}'")
+    for chave in ("resolucao_deduplicacao", "celula_outliers", "desvios_outliers", "intervalo_observacao"):
+        if config[chave] is not None and config[chave] <= 0:
+            raise ValueError(f"'{chave}' deve ser maior que zero")
+    if config["espera_observacao"] < 0:
+        raise ValueError("'espera_observacao' não pode ser negativa")
+    if config["limite_lote_escrita"] < 0:
+        raise ValueError("'limite_lote_escrita' não pode ser negativo")
+    for chave in ("max_pontos_por_tile", "max_niveis_octree", "limite_memoria_mb", "workers_leitura",
+                  "workers_tiles", "threads_transformacao"):
+        if config[chave] is not None and config[chave] < 1:
+            raise ValueError(f"'{chave}' deve ser maior que zero")
+
+
+def carregar_configuracao(caminho_config: Path = None, sobrescritas: Dict = None) -> Dict:
+    """
+    Configuração do build: padrões de OPCOES, depois o arquivo JSON (se houver)
+    e por fim as sobrescritas da linha de comando. Chaves desconhecidas e
+    valores fora das opções são rejeitados antes de qualquer leitura de LAZ.
+    """
+    config = {chave: opcao[0] for chave, opcao in OPCOES.items()}
+    if caminho_config is not None:
+        with open(caminho_config, 'r') as f:
+            do_arquivo = json.load(f)
+        if not isinstance(do_arquivo, dict):
+            raise ValueError(f"O arquivo de configuração deve conter um objeto JSON: {caminho_config}")
+        desconhecidas = sorted(set(do_arquivo) - set(OPCOES))
+        if desconhecidas:
+            raise ValueError(f"Opções desconhecidas em {caminho_config}: {', '.join(desconhecidas)}")
+        config.update(do_arquivo)
+    config.update(sobrescritas or {})
+
+    validar_configuracao(config)
+    for chave in ("workers_leitura", "workers_tiles", "threads_transformacao"):
+        if config[chave] is None:
+            config[chave] = os.cpu_count() or 1
+    return config
+
+
+def _argumento_bool(texto: str) -> bool:
+    if texto.lower() in ("1", "true", "sim", "s", "yes"):
+        return True
+    if texto.lower() in ("0", "false", "nao", "não", "n", "no"):
+        return False
+    raise argparse.ArgumentTypeError(f"valor booleano inválido: {texto}")
+
+
+def criar_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Gera um tileset 3D Tiles de nuvem de pontos a partir de um diretório EPT"
+    )
+    parser.add_argument("--config", type=Path, help="arquivo JSON com as mesmas chaves das opções abaixo")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="só estima tiles, tamanho da saída e memória pelos cabeçalhos, sem gravar nada")
+    parser.add_argument("--mostrar-config", action="store_true", help="imprime a configuração final em JSON e sai")
+    parser.add_argument("--observar", action="store_true",
+                        help="não termina: observa o diretório EPT e publica uma nova versão do tileset a cada "
+                             "lote de LAZ novos ou alterados (requer --modo-ingestao incremental)")
+    parser.add_argument("--sem-metricas", dest="diretorio_metricas", action="store_const", const=None,
+                        default=argparse.SUPPRESS, help="não grava as métricas do build")
+
+    # default=SUPPRESS: só as opções passadas de fato sobrescrevem o arquivo de configuração
+    for chave, (padrao, tipo, escolhas, ajuda) in OPCOES.items():
+        nomes = ["--" + chave.replace("_", "-")]
+        if chave == "forcar_regeneracao":
+            nomes.append("--force")
+        texto_ajuda = f"{ajuda} (padrão: {padrao})" if ajuda else f"(padrão: {padrao})"
+        if tipo is bool:
+            # --lod liga; --lod false desliga o que veio do arquivo
+            parser.add_argument(*nomes, dest=chave, nargs="?", const=True, type=_argumento_bool,
+                                default=argparse.SUPPRESS, help=texto_ajuda)
+        elif tipo is list:
+            parser.add_argument(*nomes, dest=chave, nargs="*", choices=escolhas, default=argparse.SUPPRESS,
+                                help=texto_ajuda)
+        else:
+            parser.add_argument(*nomes, dest=chave, type=tipo, choices=escolhas, default=argparse.SUPPRESS,
+                                help=texto_ajuda)
+    return parser
+
+
+def configuracao_da_linha_de_comando(argv=None):
+    # devolve a configuração final e as ações (dry-run, mostrar-config, observar) pedidas
+    parser = criar_parser()
+    args = vars(parser.parse_args(argv))
+    acoes = {"dry_run": args.pop("dry_run"), "mostrar_config": args.pop("mostrar_config"),
+             "observar": args.pop("observar")}
+    caminho_config = args.pop("config", None)
+    try:
+        config = carregar_configuracao(caminho_config, args)
+    except (OSError, json.JSONDecodeError, ValueError) as e:
+        parser.error(str(e))
+    if acoes["observar"] and config["modo_ingestao"] != "incremental":
+        parser.error("--observar usa o build incremental: passe --modo-ingestao incremental")
+    if acoes["observar"] and config["niveis_por_tileset_externo"] > 0:
+        # os tileset_<nó>.json são regravados com o mesmo nome e o tileset.json deixaria de ser a única troca
+        parser.error("--observar não suporta tilesets externos (niveis_por_tileset_externo)")
+    return config, acoes
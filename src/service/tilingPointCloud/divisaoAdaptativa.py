@@ -0,0 +1,86 @@
+import math
+import numpy as np
+from octreeMorton import ParticionadorMorton
+from metricasBuild import etapa
+
+# "octree": octantes do centro da caixa, com os limiares fixos do generator
+# "adaptativa": cortes na mediana dos pontos (kd-tree), sem descartar pontos
+DIVISOES = ("octree", "adaptativa")
+# filhos por nó na divisão adaptativa; 8 mantém os nomes tile_r<dígitos 0-7>.pnts
+MAXIMO_FILHOS = 8
+
+
+def partes_da_divisao(quantidade: int, max_pontos: int) -> int:
+    # o menor número de filhos (até MAXIMO_FILHOS) que deixa cada um com no máximo max_pontos
+    return max(1, min(MAXIMO_FILHOS, math.ceil(quantidade / max_pontos)))
+
+
+def tamanhos_da_divisao(quantidade: int, partes: int) -> list:
+    # quantos pontos cada filho recebe de ParticionadorMorton.dividir_mediana, sem dividir nada
+    if partes <= 1 or quantidade < 2:
+        return [quantidade] if quantidade > 0 else []
+    esquerda = partes // 2
+    corte = quantidade * esquerda // partes
+    return tamanhos_da_divisao(corte, esquerda) + tamanhos_da_divisao(quantidade - corte, partes - esquerda)
+
+
+def construir_no_adaptativo(generator, particionador: ParticionadorMorton, inicio: int, fim: int,
+                            nivel: int, caminho: str) -> dict:
+    """
+    Nó da árvore com divisão adaptativa. Até max_points_per_tile pontos o nó
+    é uma folha; acima disso os pontos (menos a amostra LOD, se houver) são
+    repartidos em filhos com a mesma quantidade, cortando pela distribuição
+    dos pontos e não pelo centro da caixa. Nenhum ponto é descartado. O erro
+    geométrico de um nó com amostra LOD é o espaçamento medido dela; sem lod o
+    nó interno não tem conteúdo e fica com a diagonal dos seus pontos, como na
+    octree, para o Cesium sempre refiná-lo em vez de parar num nó vazio.
+    Folhas, que têm todos os pontos da sua região, ficam com erro zero.
+    """
+    pontos, cores = particionador.fatia(inicio, fim)
+    bounding_volume = generator._criar_bounding_volume_from_points(pontos)
+    tile_filename = f"tile_{caminho}.pnts"
+
+    if fim - inicio <= generator.max_points_per_tile or nivel >= generator.max_levels:
+        generator.tile_counter += 1
+        generator._escrever_tile_pnts(pontos, cores, generator.output_dir / tile_filename)
+        return {
+            "boundingVolume": bounding_volume,
+            "geometricError": 0.0,
+            "content": {"uri": tile_filename},
+            "refine": "REPLACE"
+        }
+
+    conteudo = None
+    inicio_filhos = inicio
+    if generator.lod:
+        quantidade, geometric_error = generator._separar_amostra_lod(particionador, inicio, fim)
+        generator.tile_counter += 1
+        amostra_pontos, amostra_cores = particionador.fatia(inicio, inicio + quantidade)
+        generator._escrever_tile_pnts(amostra_pontos, amostra_cores, generator.output_dir / tile_filename)
+        conteudo = {"uri": tile_filename}
+        inicio_filhos = inicio + quantidade
+    else:
+        geometric_error = float(np.linalg.norm(pontos.max(axis=0) - pontos.min(axis=0)))
+
+    children = []
+    if fim > inicio_filhos:
+        partes = partes_da_divisao(fim - inicio_filhos, generator.max_points_per_tile)
+        with etapa("divisao_adaptativa", pontos=fim - inicio_filhos):
+            filhos = particionador.dividir_mediana(inicio_filhos, fim, partes)
+        for filho in filhos:
+            # pelo _construir_no_octree do generator, que reserva as subárvores dos workers;
+            # a divisão adaptativa não usa os bounds do nó, só os dos pontos
+            children.append(generator._construir_no_octree(
+                particionador, filho['inicio'], filho['fim'], nivel + 1, None, caminho + str(filho['octante'])
+            ))
+
+    tile_dict = {
+        "boundingVolume": bounding_volume,
+        "geometricError": geometric_error,
+        "refine": "ADD"
+    }
+    if conteudo is not None:
+        tile_dict["content"] = conteudo
+    if children:
+        tile_dict["children"] = children
+    return tile_dict
@@ -0,0 +1,219 @@
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Tuple
+from lazExtractor import LAZExtractor
+from boundingVolumes import caixa_envolvente, com_margem, volume_de_pontos
+
+
+class HierarquiaEPT:
+    """
+    Lê o ept-hierarchy/ de um diretório EPT (Entwine Point Tile) e monta o plano
+    da octree a partir das chaves D-X-Y-Z e contagens de pontos, sem ler nenhum
+    dado de ept-data/.
+    """
+
+    def __init__(self, diretorio_ept: Path, metadados: Dict):
+        self.diretorio_ept = diretorio_ept
+        self.metadados = metadados
+        self.bounds = np.asarray(metadados["bounds"], dtype=np.float64)
+        self.span = int(metadados.get("span", 256))
+        self.contagens = self._ler_hierarquia("0-0-0-0")
+
+    def _ler_hierarquia(self, chave: str) -> Dict[str, int]:
+        # contagem -1 indica que o nó tem um arquivo de hierarquia próprio
+        hierarquia_path = self.diretorio_ept / "ept-hierarchy" / f"{chave}.json"
+        if not hierarquia_path.exists():
+            raise FileNotFoundError(f"Arquivo de hierarquia EPT não encontrado: {hierarquia_path}")
+
+        with open(hierarquia_path, 'r') as f:
+            entradas = json.load(f)
+
+        contagens = {}
+        for chave_no, contagem in entradas.items():
+            if contagem == -1:
+                contagens.update(self._ler_hierarquia(chave_no))
+            else:
+                contagens[chave_no] = int(contagem)
+        return contagens
+
+    @staticmethod
+    def decompor_chave(chave: str) -> Tuple[int, int, int, int]:
+        d, x, y, z = (int(v) for v in chave.split("-"))
+        return d, x, y, z
+
+    def filhos(self, chave: str) -> List[str]:
+        d, x, y, z = self.decompor_chave(chave)
+        candidatos = [
+            f"{d + 1}-{2 * x + (i & 1)}-{2 * y + ((i >> 1) & 1)}-{2 * z + ((i >> 2) & 1)}"
+            for i in range(8)
+        ]
+        return [c for c in candidatos if c in self.contagens]
+
+    def bounds_no(self, chave: str) -> Tuple[np.ndarray, np.ndarray]:
+        # cubo do nó no SRS do EPT
+        d, x, y, z = self.decompor_chave(chave)
+        tamanho = (self.bounds[3:] - self.bounds[:3]) / (2 ** d)
+        minimo = self.bounds[:3] + np.array([x, y, z]) * tamanho
+        return minimo, minimo + tamanho
+
+    def espacamento_no(self, chave: str) -> float:
+        # distância típica entre pontos do nó: largura do cubo / span
+        d = self.decompor_chave(chave)[0]
+        return float(self.bounds[3] - self.bounds[0]) / (self.span * (2 ** d))
+
+    def arquivo_no(self, chave: str) -> Path:
+        return self.diretorio_ept / "ept-data" / f"{chave}.laz"
+
+    def planejar(self, profundidade_maxima: int = None) -> Dict[str, dict]:
+        """
+        Plano da árvore de tiles: um tile por nó EPT alcançável a partir da raiz,
+        com contagem de pontos e filhos, opcionalmente cortado em uma profundidade.
+        """
+        plano = {}
+        pendentes = ["0-0-0-0"] if "0-0-0-0" in self.contagens else []
+        while pendentes:
+            chave = pendentes.pop()
+            d = self.decompor_chave(chave)[0]
+            filhos = [] if profundidade_maxima is not None and d >= profundidade_maxima else self.filhos(chave)
+            plano[chave] = {"pontos": self.contagens[chave], "profundidade": d, "filhos": filhos}
+            pendentes.extend(filhos)
+        return plano
+
+
+class EPTTiler:
+    """
+    Gera o tileset seguindo a hierarquia EPT: cada nó do Entwine vira um tile
+    com refinamento ADD (o Entwine guarda cada ponto em um único nó) e só o
+    ept-data/D-X-Y-Z.laz daquele nó é lido para escrevê-lo. Nós com mais pontos
+    que max_points_per_tile ainda passam pela octree do generator.
+    """
+
+    def __init__(self, extractor: LAZExtractor, generator, profundidade_maxima: int = None):
+        self.extractor = extractor
+        self.generator = generator
+        self.profundidade_maxima = profundidade_maxima
+        self.hierarquia = HierarquiaEPT(extractor.diretorio_ept, extractor.metadados)
+
+    def _imprimir_plano(self, plano: Dict[str, dict]):
+        por_profundidade = {}
+        for no in plano.values():
+            nos, pontos = por_profundidade.get(no["profundidade"], (0, 0))
+            por_profundidade[no["profundidade"]] = (nos + 1, pontos + no["pontos"])
+
+        total = sum(no["pontos"] for no in plano.values())
+        print(f"Plano EPT: {len(plano)} nós, {total:,} pontos")
+        for d in sorted(por_profundidade):
+            nos, pontos = por_profundidade[d]
+            # 12 bytes de posição + 3 de cor por ponto
+            print(f"  Profundidade {d}: {nos} nós, {pontos:,} pontos, ~{pontos * 15 / 1e6:.1f} MB")
+
+    def _bounding_volume_cubo(self, chave: str) -> dict:
+        # volume do cubo do nó, para nós sem pontos próprios
+        minimo, maximo = self.hierarquia.bounds_no(chave)
+        if self.generator.volume_limite == "aabb":
+            min_ecef, max_ecef = self.extractor.estimar_bounds_ecef([{"mins": minimo, "maxs": maximo}])
+            return volume_de_pontos(np.array([min_ecef, max_ecef]))
+        # volume orientado pela grade 3x3x3 do cubo em ECEF; a margem cobre a curvatura entre as amostras
+        eixos = [np.linspace(minimo[i], maximo[i], 3) for i in range(3)]
+        grade = np.stack(np.meshgrid(*eixos, indexing='ij'), axis=-1).reshape(-1, 3)
+        grade_ecef = self.extractor._converter_coordenadas_para_ecef(grade)
+        return com_margem(volume_de_pontos(grade_ecef, self.generator.volume_limite))
+
+    def _escalar_erros(self, tile: dict, fator: float):
+        tile["geometricError"] *= fator
+        for child in tile.get("children", []):
+            self._escalar_erros(child, fator)
+
+    def _ajustar_subarvore(self, subarvore: dict, espacamento: float) -> float:
+        """
+        Erro do nó EPT cujos pontos viraram a subárvore aninhada: nunca abaixo
+        do erro da raiz dela, senão o Cesium para no nó (que não tem conteúdo)
+        e os pontos dele nunca aparecem. Com lod cada nó da subárvore tem
+        amostra, então os erros dela são reduzidos para caber sob o espaçamento
+        do nó EPT; sem lod os nós internos dela são vazios e precisam dos erros
+        pela diagonal, então é o nó EPT que sobe até a raiz dela.
+        """
+        erro_subarvore = subarvore["geometricError"]
+        if self.generator.lod and erro_subarvore > espacamento:
+            self._escalar_erros(subarvore, espacamento / erro_subarvore)
+            return espacamento
+        return max(espacamento, erro_subarvore)
+
+    def _construir_no(self, plano: Dict[str, dict], chave: str) -> dict:
+        no = plano[chave]
+        tem_filhos = bool(no["filhos"])
+        espacamento = self.hierarquia.espacamento_no(chave)
+        geometric_error = espacamento if tem_filhos else 0.0
+
+        tile_dict = {"geometricError": geometric_error, "refine": "ADD"}
+        children = []
+
+        pontos, cores = (None, None)
+        if no["pontos"] > 0:
+            pontos, cores = self.extractor.processar_arquivo_laz(self.hierarquia.arquivo_no(chave))
+
+        if pontos is not None and len(pontos) > 0:
+            tile_dict["boundingVolume"] = self.generator._criar_bounding_volume_from_points(pontos)
+
+            if len(pontos) <= self.generator.max_points_per_tile:
+                self.generator.tile_counter += 1
+                tile_filename = f"tile_ept_{chave}.pnts"
+                self.generator._escrever_tile_pnts(pontos, cores, self.generator.output_dir / tile_filename)
+                tile_dict["content"] = {"uri": tile_filename}
+            else:
+                # nó maior que um tile: os pontos dele viram uma subárvore própria,
+                # com max_levels contado a partir da profundidade do nó
+                max_levels_original = self.generator.max_levels
+                self.generator.max_levels = max_levels_original + no["profundidade"]
+                try:
+                    subarvore = self.generator._construir_tiles_octree(
+                        pontos, cores, no["profundidade"], None, f"ept_{chave}_r"
+                    )
+                finally:
+                    self.generator.max_levels = max_levels_original
+                geometric_error = self._ajustar_subarvore(subarvore, espacamento)
+                tile_dict["geometricError"] = geometric_error
+                children.append(subarvore)
+        else:
+            tile_dict["boundingVolume"] = self._bounding_volume_cubo(chave)
+
+        del pontos, cores
+
+        for chave_filho in sorted(no["filhos"]):
+            filho = self._construir_no(plano, chave_filho)
+            # um filho que subiu o erro pela subárvore aninhada também sobe o pai
+            geometric_error = max(geometric_error, filho["geometricError"])
+            tile_dict["geometricError"] = geometric_error
+            children.append(filho)
+
+        if children:
+            tile_dict["children"] = children
+            # o volume do pai precisa conter os filhos, senão eles são descartados junto no culling
+            tile_dict["boundingVolume"] = caixa_envolvente(
+                [tile_dict["boundingVolume"]] + [child["boundingVolume"] for child in children],
+                self.generator.volume_limite
+            )
+
+        return tile_dict
+
+    def gerar_tileset(self) -> dict:
+        plano = self.hierarquia.planejar(self.profundidade_maxima)
+        if not plano:
+            raise ValueError(f"Hierarquia EPT vazia em: {self.extractor.diretorio_ept}")
+
+        self._imprimir_plano(plano)
+
+        self.generator._limpar_diretorio_saida()
+        self.generator.tile_counter = 0
+        self.generator.comparacao_volumes = self.generator._comparacao_volumes_vazia()
+
+        tile_raiz = self._construir_no(plano, "0-0-0-0")
+
+        tileset = {
+            "asset": {"version": "1.0"},
+            "geometricError": 2.0 * max(self.hierarquia.espacamento_no("0-0-0-0"), tile_raiz["geometricError"]),
+            "root": tile_raiz
+        }
+
+        return tileset
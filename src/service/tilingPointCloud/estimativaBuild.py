@@ -0,0 +1,171 @@
+import math
+import numpy as np
+from typing import Dict, List
+from lazExtractor import LAZExtractor
+from eptTiler import HierarquiaEPT
+from octreeMorton import calcular_bounds_octante
+from codificacaoPnts import tamanho_tile_pnts
+from atributosPontos import bytes_atributos
+from divisaoAdaptativa import partes_da_divisao, tamanhos_da_divisao
+
+# pontos sintéticos espalhados pelas caixas dos cabeçalhos; cada um representa vários pontos reais
+AMOSTRAS_ESTIMATIVA = 1_000_000
+# tamanho médio de um nó no tileset.json (bounding volume, erro, uri e refine)
+BYTES_JSON_POR_NO = 650
+# bytes por ponto na memória durante a ingestão: posições float64 (ou float32) + cores RGB,
+# mais os bytes dos atributos levados junto com as cores
+BYTES_POR_PONTO_MEMORIA = 27
+BYTES_POR_PONTO_MEMORIA_BAIXA = 15
+
+
+def _amostrar_cabecalhos(extractor: LAZExtractor, cabecalhos: List[Dict], total_amostras: int,
+                         rng: np.random.Generator):
+    """
+    Pontos uniformes dentro da caixa do cabeçalho de cada arquivo, no SRS de
+    origem, levados para ECEF. Cada amostra pesa point_count / amostras do
+    arquivo, então a soma dos pesos é o total de pontos dos cabeçalhos.
+    """
+    total_pontos = sum(c["point_count"] for c in cabecalhos)
+    amostras, pesos = [], []
+    for cabecalho in cabecalhos:
+        if cabecalho["point_count"] == 0:
+            continue
+        quantidade = max(1, min(cabecalho["point_count"],
+                                round(total_amostras * cabecalho["point_count"] / total_pontos)))
+        amostras.append(rng.uniform(cabecalho["mins"], cabecalho["maxs"], (quantidade, 3)))
+        pesos.append(np.full(quantidade, cabecalho["point_count"] / quantidade))
+
+    amostras = extractor._converter_coordenadas_para_ecef(np.vstack(amostras))
+    return amostras, np.concatenate(pesos)
+
+
+def _octantes(amostras: np.ndarray, bounds) -> np.ndarray:
+    # mesmo índice de octante que calcular_bounds_octante: bit 0 = x, 1 = y, 2 = z
+    centro = (bounds[0] + bounds[1]) / 2.0
+    return ((amostras[:, 0] >= centro[0]).astype(np.int8)
+            | (amostras[:, 1] >= centro[1]).astype(np.int8) << 1
+            | (amostras[:, 2] >= centro[2]).astype(np.int8) << 2)
+
+
+def _estimar_no(generator, amostras: np.ndarray, pesos: np.ndarray, bounds, nivel: int, tiles: List[float],
+                contagem: Dict[str, int]):
+    # percorre a octree do generator com pesos no lugar de pontos; 'tiles' recebe os pontos de cada tile
+    contagem["nos"] += 1
+    quantidade = float(pesos.sum())
+    geometric_error = generator._erro_geometrico(bounds, nivel)
+    if generator._deve_criar_folha(quantidade, nivel, geometric_error):
+        tiles.append(quantidade)
+        return
+
+    octantes = _octantes(amostras, bounds)
+    por_octante = np.bincount(octantes, weights=pesos, minlength=8)
+    minimo_octante = max(generator._minimo_pontos_octante(nivel), 1e-9)
+    validos = [o for o in range(8) if por_octante[o] >= minimo_octante]
+    if len(validos) <= 1:
+        tiles.append(quantidade)
+        return
+
+    if generator.lod:
+        # a amostra do nó fica com ~max_points_per_tile pontos, tirados de todos os octantes
+        amostra = min(quantidade, generator.max_points_per_tile)
+        tiles.append(amostra)
+        fator = (quantidade - amostra) / quantidade
+        pesos = pesos * fator
+        por_octante = por_octante * fator
+        validos = [o for o in range(8) if por_octante[o] >= minimo_octante]
+
+    for octante in validos:
+        if por_octante[octante] >= generator.PONTOS_MINIMOS_FILHO:
+            selecao = octantes == octante
+            _estimar_no(generator, amostras[selecao], pesos[selecao], calcular_bounds_octante(bounds, octante),
+                        nivel + 1, tiles, contagem)
+
+
+def _estimar_adaptativo(generator, quantidade: int, nivel: int, tiles: List[float], contagem: Dict[str, int]):
+    # a divisão adaptativa só depende da quantidade de pontos: a árvore sai exata, a menos da amostra lod
+    contagem["nos"] += 1
+    if quantidade <= generator.max_points_per_tile or nivel >= generator.max_levels:
+        tiles.append(quantidade)
+        return
+    if generator.lod:
+        tiles.append(generator.max_points_per_tile)
+        quantidade -= generator.max_points_per_tile
+    for tamanho in tamanhos_da_divisao(quantidade, partes_da_divisao(quantidade, generator.max_points_per_tile)):
+        _estimar_adaptativo(generator, tamanho, nivel + 1, tiles, contagem)
+
+
+def _estimar_octree(extractor: LAZExtractor, generator, cabecalhos: List[Dict]) -> Dict:
+    amostras, pesos = _amostrar_cabecalhos(extractor, cabecalhos, AMOSTRAS_ESTIMATIVA, np.random.default_rng(0))
+    min_coords, max_coords = amostras.min(axis=0), amostras.max(axis=0)
+    padding = (max_coords - min_coords) * 0.001
+    tiles, contagem = [], {"nos": 0}
+    _estimar_no(generator, amostras, pesos, (min_coords - padding, max_coords + padding), 0, tiles, contagem)
+    return {"pontos_por_tile": tiles, "nos": contagem["nos"]}
+
+
+def _estimar_hierarquia_ept(extractor: LAZExtractor, generator, profundidade_maxima: int = None) -> Dict:
+    # um tile por nó EPT com pontos; nós maiores que um tile viram uma subárvore de ~pontos/max tiles
+    plano = HierarquiaEPT(extractor.diretorio_ept, extractor.metadados).planejar(profundidade_maxima)
+    tiles = []
+    for no in plano.values():
+        if no["pontos"] > 0:
+            partes = math.ceil(no["pontos"] / generator.max_points_per_tile)
+            tiles.extend([no["pontos"] / partes] * partes)
+    return {"pontos_por_tile": tiles, "nos": len(plano) + len(tiles)}
+
+
+def estimar_build(extractor: LAZExtractor, generator, modo_ingestao: str = "completo",
+                  profundidade_maxima_ept: int = None, ingestao_baixa_memoria: bool = False) -> Dict:
+    """
+    Prevê o build só com os cabeçalhos dos LAZ (e o ept-hierarchy no modo
+    "hierarquia_ept"): quantos tiles, quantos pontos e quantos bytes de .pnts
+    e tileset.json. Com a divisão adaptativa a árvore só depende do total de
+    pontos; na octree os pontos de cada arquivo são supostos uniformes na caixa
+    do cabeçalho, então nuvens com muitos vazios dentro das caixas geram menos
+    tiles que o previsto. Compressão não entra na conta.
+    """
+    cabecalhos = extractor.ler_cabecalhos_laz(extractor.listar_arquivos_laz())
+    total_pontos = sum(c["point_count"] for c in cabecalhos)
+    if total_pontos == 0:
+        raise ValueError("Nenhum ponto nos cabeçalhos dos arquivos LAZ")
+
+    if modo_ingestao == "hierarquia_ept":
+        octree = _estimar_hierarquia_ept(extractor, generator, profundidade_maxima_ept)
+    elif generator.divisao == "adaptativa":
+        tiles, contagem = [], {"nos": 0}
+        _estimar_adaptativo(generator, total_pontos, 0, tiles, contagem)
+        octree = {"pontos_por_tile": tiles, "nos": contagem["nos"]}
+    else:
+        octree = _estimar_octree(extractor, generator, cabecalhos)
+
+    pontos_por_tile = octree["pontos_por_tile"]
+    bytes_pnts = sum(tamanho_tile_pnts(int(round(n)), generator.formato_posicao, generator.formato_cor,
+                                       generator.atributos, generator.normais)
+                     for n in pontos_por_tile)
+    bytes_por_ponto = BYTES_POR_PONTO_MEMORIA_BAIXA if ingestao_baixa_memoria else BYTES_POR_PONTO_MEMORIA
+    bytes_por_ponto += bytes_atributos(extractor.atributos)
+    return {
+        "arquivos": len(cabecalhos),
+        "pontos": total_pontos,
+        "pontos_nos_tiles": int(round(sum(pontos_por_tile))),
+        "tiles": len(pontos_por_tile),
+        "nos": octree["nos"],
+        "maior_tile": int(round(max(pontos_por_tile))),
+        "bytes_pnts": bytes_pnts,
+        "bytes_tileset_json": octree["nos"] * BYTES_JSON_POR_NO,
+        # só no modo "completo" todos os pontos ficam na memória ao mesmo tempo
+        "bytes_memoria_pontos": total_pontos * bytes_por_ponto if modo_ingestao == "completo" else None
+    }
+
+
+def imprimir_estimativa(estimativa: Dict):
+    print(f"Estimativa (só cabeçalhos): {estimativa['arquivos']} arquivos LAZ, {estimativa['pontos']:,} pontos")
+    print(f"  Tiles: ~{estimativa['tiles']:,} ({estimativa['nos']:,} nós no tileset), "
+          f"maior com ~{estimativa['maior_tile']:,} pontos")
+    if estimativa["pontos_nos_tiles"] < estimativa["pontos"]:
+        print(f"  Pontos em octantes pequenos demais (descartados): "
+              f"~{estimativa['pontos'] - estimativa['pontos_nos_tiles']:,}")
+    print(f"  .pnts: ~{estimativa['bytes_pnts'] / 1e6:,.1f} MB, "
+          f"tileset.json: ~{estimativa['bytes_tileset_json'] / 1e6:,.1f} MB (sem compressão)")
+    if estimativa["bytes_memoria_pontos"] is not None:
+        print(f"  Pontos e cores na memória: ~{estimativa['bytes_memoria_pontos'] / 2 ** 20:,.0f} MB")
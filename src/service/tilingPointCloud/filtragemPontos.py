@@ -0,0 +1,211 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+from metricasBuild import etapa
+
+# bits por eixo na chave int64 das células da grade de outliers
+BITS_POR_EIXO = 21
+DESLOCAMENTO_CELULA = 1 << (BITS_POR_EIXO - 1)
+# uma célula de folga em cada lado para as chaves das vizinhas não transbordarem
+LIMITE_INDICE_CELULA = DESLOCAMENTO_CELULA - 2
+# pontos convertidos em chaves por vez, para não criar cópias float64 da nuvem inteira
+TAMANHO_BLOCO_FILTRAGEM = 1_000_000
+# abaixo disso de vizinhos típicos a flutuação da contagem já se parece com ruído isolado
+VIZINHOS_MINIMOS_RECOMENDADOS = 20
+VIZINHANCA = [(dx, dy, dz) for dx in (-1, 0, 1) for dy in (-1, 0, 1) for dz in (-1, 0, 1)]
+
+
+def _chave_vizinha(dx: int, dy: int, dz: int) -> int:
+    return (dx << (2 * BITS_POR_EIXO)) + (dy << BITS_POR_EIXO) + dz
+
+
+def _compactar_em_lugar(pontos: np.ndarray, cores: np.ndarray, manter: np.ndarray) -> int:
+    # move os pontos mantidos para o começo dos arrays, por blocos (o destino nunca passa a origem)
+    destino = 0
+    for inicio in range(0, len(pontos), TAMANHO_BLOCO_FILTRAGEM):
+        fim = min(inicio + TAMANHO_BLOCO_FILTRAGEM, len(pontos))
+        mascara = manter[inicio:fim]
+        quantidade = int(np.count_nonzero(mascara))
+        if quantidade == fim - inicio and destino == inicio:
+            destino += quantidade
+            continue
+        pontos[destino:destino + quantidade] = pontos[inicio:fim][mascara]
+        cores[destino:destino + quantidade] = cores[inicio:fim][mascara]
+        destino += quantidade
+    return destino
+
+
+def mascara_deduplicacao(pontos: np.ndarray, resolucao: float) -> np.ndarray:
+    """
+    Mantém o primeiro ponto de cada voxel de lado 'resolucao' (hash da posição
+    do voxel). Faixas de voo sobrepostas repetem a mesma superfície; com a
+    resolução perto da precisão do levantamento só as repetições saem. Uma
+    cópia deslocada que cai no voxel vizinho continua na nuvem.
+    """
+    minimo = np.min(pontos, axis=0).astype(np.float64)
+    dimensoes = np.floor((np.max(pontos, axis=0).astype(np.float64) - minimo) / resolucao).astype(np.int64) + 1
+
+    indices = np.empty((len(pontos), 3), dtype=np.int64)
+    for inicio in range(0, len(pontos), TAMANHO_BLOCO_FILTRAGEM):
+        bloco = pontos[inicio:inicio + TAMANHO_BLOCO_FILTRAGEM]
+        indices[inicio:inicio + len(bloco)] = np.floor((bloco - minimo) / resolucao)
+    np.clip(indices, 0, dimensoes - 1, out=indices)
+
+    if int(dimensoes[0]) * int(dimensoes[1]) * int(dimensoes[2]) < 2 ** 63:
+        chaves = (indices[:, 0] * dimensoes[1] + indices[:, 1]) * dimensoes[2] + indices[:, 2]
+        del indices
+        _, primeiros = np.unique(chaves, return_index=True)
+    else:
+        # extensão grande demais para uma chave int64 nessa resolução
+        _, primeiros = np.unique(indices, axis=0, return_index=True)
+
+    manter = np.zeros(len(pontos), dtype=bool)
+    manter[primeiros] = True
+    return manter
+
+
+class FiltroPontos:
+    """
+    Filtragem opcional entre a leitura dos LAZ e os generators: remoção
+    estatística de outliers numa grade de células e deduplicação por voxel.
+
+    Os outliers saem de um histograma de células acumulado bloco a bloco com
+    contar(), então a nuvem pode passar em partes (streaming). Para cada ponto
+    conta-se quantos outros caem nas 27 células em volta da sua; pontos cuja
+    contagem, em escala log, fica mais de desvios_outliers desvios-padrão
+    abaixo da média da nuvem são ruído isolado (pássaros, multipercurso). Em
+    log, a borda do levantamento (metade dos vizinhos) fica perto da média e
+    não é erodida.
+
+    A deduplicação é feita em filtrar_bloco, dentro de cada bloco passado;
+    blocos espacialmente separados (a nuvem inteira ou um bucket do streaming)
+    dão o mesmo resultado que a nuvem inteira, a menos dos voxels cortados pela
+    borda de um bucket.
+    """
+
+    def __init__(self, resolucao_deduplicacao: Optional[float] = None, celula_outliers: Optional[float] = None,
+                 desvios_outliers: float = 3.0):
+        self.resolucao_deduplicacao = resolucao_deduplicacao
+        self.celula_outliers = celula_outliers
+        self.desvios_outliers = desvios_outliers
+        # canto de referência da grade de células, fixado pelo primeiro bloco contado
+        self.referencia = None
+        self._contagens_parciais = []
+        # células (chaves ordenadas) cujos pontos são outliers, definidas em finalizar_contagem()
+        self._celulas_outliers = None
+        self.pontos_entrada = 0
+        self.removidos_outliers = 0
+        self.removidos_duplicados = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.resolucao_deduplicacao is not None or self.celula_outliers is not None
+
+    def _chaves_celulas(self, pontos: np.ndarray) -> np.ndarray:
+        chaves = np.empty(len(pontos), dtype=np.int64)
+        for inicio in range(0, len(pontos), TAMANHO_BLOCO_FILTRAGEM):
+            bloco = pontos[inicio:inicio + TAMANHO_BLOCO_FILTRAGEM]
+            indices = np.floor((bloco - self.referencia) / self.celula_outliers).astype(np.int64)
+            if len(indices) and np.abs(indices).max() > LIMITE_INDICE_CELULA:
+                raise ValueError(f"Nuvem extensa demais para células de {self.celula_outliers} m; "
+                                 f"aumente celula_outliers")
+            indices += DESLOCAMENTO_CELULA
+            chaves[inicio:inicio + len(bloco)] = ((indices[:, 0] << (2 * BITS_POR_EIXO))
+                                                  | (indices[:, 1] << BITS_POR_EIXO) | indices[:, 2])
+        return chaves
+
+    def contar(self, pontos: np.ndarray):
+        # acumula as células ocupadas de um bloco no histograma dos outliers
+        if self.celula_outliers is None or len(pontos) == 0:
+            return
+        if self.referencia is None:
+            self.referencia = pontos[0].astype(np.float64)
+        self._contagens_parciais.append(np.unique(self._chaves_celulas(pontos), return_counts=True))
+
+    def finalizar_contagem(self):
+        # junta os histogramas parciais e escolhe as células de outliers pelos vizinhos de cada uma
+        if self.celula_outliers is None:
+            return
+        if not self._contagens_parciais:
+            self._celulas_outliers = np.empty(0, dtype=np.int64)
+            return
+
+        celulas = np.concatenate([parcial[0] for parcial in self._contagens_parciais])
+        contagens = np.concatenate([parcial[1] for parcial in self._contagens_parciais])
+        self._contagens_parciais = []
+        ordem = np.argsort(celulas, kind='stable')
+        celulas, primeiros = np.unique(celulas[ordem], return_index=True)
+        contagens = np.add.reduceat(contagens[ordem], primeiros)
+        del ordem
+
+        vizinhos = np.zeros(len(celulas), dtype=np.int64)
+        for dx, dy, dz in VIZINHANCA:
+            procuradas = celulas + _chave_vizinha(dx, dy, dz)
+            posicoes = np.minimum(np.searchsorted(celulas, procuradas), len(celulas) - 1)
+            vizinhos += np.where(celulas[posicoes] == procuradas, contagens[posicoes], 0)
+        # cada ponto não conta a si mesmo
+        densidade = np.log1p(vizinhos - 1)
+
+        # mediana por ponto (cada célula pesa a quantidade de pontos dela)
+        ordem = np.argsort(vizinhos)
+        acumulado = np.cumsum(contagens[ordem])
+        mediana = vizinhos[ordem[np.searchsorted(acumulado, acumulado[-1] / 2)]] - 1
+        if mediana < VIZINHOS_MINIMOS_RECOMENDADOS:
+            print(f"Aviso: só {mediana:.0f} vizinhos por ponto na mediana com células de {self.celula_outliers} m; "
+                  f"pontos bons em áreas menos densas podem sair como outliers, aumente celula_outliers")
+
+        media = np.average(densidade, weights=contagens)
+        desvio = np.sqrt(np.average((densidade - media) ** 2, weights=contagens))
+        self._celulas_outliers = celulas[densidade < media - self.desvios_outliers * desvio]
+
+    def filtrar_bloco(self, pontos: np.ndarray, cores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Remove os outliers (pelo histograma já finalizado) e os duplicados do
+        bloco. Os arrays são compactados no lugar e o retorno são fatias deles.
+        """
+        self.pontos_entrada += len(pontos)
+        if len(pontos) == 0:
+            return pontos, cores
+
+        with etapa("filtragem", pontos=len(pontos)):
+            if self.celula_outliers is not None and len(self._celulas_outliers):
+                chaves = self._chaves_celulas(pontos)
+                posicoes = np.minimum(np.searchsorted(self._celulas_outliers, chaves),
+                                      len(self._celulas_outliers) - 1)
+                manter = self._celulas_outliers[posicoes] != chaves
+                del chaves, posicoes
+                restantes = _compactar_em_lugar(pontos, cores, manter)
+                self.removidos_outliers += len(pontos) - restantes
+                pontos, cores = pontos[:restantes], cores[:restantes]
+
+            if self.resolucao_deduplicacao is not None and len(pontos):
+                restantes = _compactar_em_lugar(pontos, cores,
+                                                mascara_deduplicacao(pontos, self.resolucao_deduplicacao))
+                self.removidos_duplicados += len(pontos) - restantes
+                pontos, cores = pontos[:restantes], cores[:restantes]
+
+        return pontos, cores
+
+    def filtrar(self, pontos: np.ndarray, cores: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # nuvem inteira na memória: conta, decide e filtra de uma vez
+        with etapa("filtragem_contagem", pontos=len(pontos)):
+            self.contar(pontos)
+            self.finalizar_contagem()
+        pontos, cores = self.filtrar_bloco(pontos, cores)
+        self.imprimir_relatorio()
+        return pontos, cores
+
+    def relatorio(self) -> Dict[str, int]:
+        return {
+            "pontos_entrada": self.pontos_entrada,
+            "removidos_outliers": self.removidos_outliers,
+            "removidos_duplicados": self.removidos_duplicados,
+            "pontos_saida": self.pontos_entrada - self.removidos_outliers - self.removidos_duplicados
+        }
+
+    def imprimir_relatorio(self):
+        relatorio = self.relatorio()
+        removidos = relatorio["removidos_outliers"] + relatorio["removidos_duplicados"]
+        porcentagem = 100.0 * removidos / relatorio["pontos_entrada"] if relatorio["pontos_entrada"] else 0.0
+        print(f"Filtragem: {relatorio['pontos_entrada']:,} pontos lidos, {relatorio['removidos_outliers']:,} "
+              f"outliers e {relatorio['removidos_duplicados']:,} duplicados removidos ({porcentagem:.2f}%), "
+              f"{relatorio['pontos_saida']:,} restantes")
@@ -0,0 +1,289 @@
+import json
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+from lazExtractor import LAZExtractor
+from memoriaCompartilhada import array_compartilhado, soltar_blocos
+from octreeMorton import calcular_chaves_morton, calcular_bounds_octante
+from streamingTiler import montar_arvore
+from codificacaoPnts import listar_conteudos
+from tilesetsExternos import resolver_tilesets_externos
+from buildManifest import ManifestoBuild, calcular_hash_arquivo, calcular_hash_parametros
+from verificacaoTileset import verificar_tileset, imprimir_relatorio_verificacao
+
+
+class IncrementalTiler:
+    """
+    Build incremental: a octree é cortada em subárvores fixas no nível
+    nivel_particao, dentro de bounds guardados no manifesto. Numa nova execução só
+    as subárvores que recebem pontos de LAZ novos, alterados ou removidos são
+    regeneradas, e o tileset.json é remontado reaproveitando os fragmentos das
+    demais subárvores sem tocar nos tiles delas.
+    """
+
+    def __init__(self, extractor: LAZExtractor, generator, nivel_particao: int = 2,
+                 margem_bounds: float = 0.1, reaproveitar_hashes: bool = False, versionar_tiles: bool = False):
+        self.extractor = extractor
+        self.generator = generator
+        # a subárvore precisa começar acima de max_levels para ainda poder ser dividida
+        self.nivel_particao = max(1, min(nivel_particao, generator.max_levels - 1))
+        self.margem_bounds = margem_bounds
+        self.manifesto = ManifestoBuild(generator.output_dir)
+        self.bounds = None
+        # com reaproveitar_hashes, entradas com o mesmo tamanho e mtime do manifesto não são lidas de novo
+        self.reaproveitar_hashes = reaproveitar_hashes
+        self.estados: Dict[str, list] = {}
+        # True quando a última chamada de gerar_tileset só reaproveitou o tileset existente
+        self.reaproveitado = False
+        # com versionar_tiles os tiles regenerados levam a geração da build no nome (tile_g<n>_r012...),
+        # então nunca sobrescrevem um tile que um tileset.json já publicado ainda referencia
+        self.versionar_tiles = versionar_tiles
+
+    def _parametros(self) -> Dict:
+        return {
+            "generator": type(self.generator).__name__,
+            "max_points_per_tile": self.generator.max_points_per_tile,
+            "max_levels": self.generator.max_levels,
+            "divisao": self.generator.divisao,
+            "volume_limite": self.generator.volume_limite,
+            "lod": self.generator.lod,
+            "formato_posicao": self.generator.formato_posicao,
+            "formato_cor": self.generator.formato_cor,
+            "atributos": list(self.generator.atributos),
+            "normais": self.generator.normais,
+            "nivel_particao": self.nivel_particao
+        }
+
+    def _nome_entrada(self, arquivo_laz: Path) -> str:
+        return arquivo_laz.relative_to(self.extractor.diretorio_ept).as_posix()
+
+    def _calcular_hashes(self, por_nome: Dict[str, Path], manifesto: Optional[Dict]) -> Dict[str, str]:
+        entradas = manifesto["entradas"] if manifesto is not None and self.reaproveitar_hashes else {}
+        hashes = {}
+        for nome, arquivo in por_nome.items():
+            estado = arquivo.stat()
+            self.estados[nome] = [estado.st_size, estado.st_mtime_ns]
+            anterior = entradas.get(nome, {})
+            if anterior.get("estado") == self.estados[nome]:
+                hashes[nome] = anterior["hash"]
+            else:
+                hashes[nome] = calcular_hash_arquivo(arquivo)
+        return hashes
+
+    def _texto_para_caminho(self, texto: str) -> Tuple[int, ...]:
+        return tuple(int(c) for c in texto[1:])
+
+    def _caminho_para_texto(self, caminho: Tuple[int, ...]) -> str:
+        return "r" + "".join(str(o) for o in caminho)
+
+    def _bounds_do_caminho(self, caminho: Tuple[int, ...]):
+        bounds = self.bounds
+        for octante in caminho:
+            bounds = calcular_bounds_octante(bounds, octante)
+        return bounds
+
+    def _concatenar(self, partes: List[np.ndarray], memorias: list) -> np.ndarray:
+        # com workers de tiles a subárvore já é montada em memória compartilhada, que eles anexam sem cópia
+        if self.generator.num_workers <= 1:
+            return np.vstack(partes)
+        destino, shm = array_compartilhado((sum(len(parte) for parte in partes),) + partes[0].shape[1:],
+                                           partes[0].dtype)
+        memorias.append(shm)
+        return np.concatenate(partes, out=destino)
+
+    def _estimar_bounds(self, arquivos_laz: List[Path]):
+        # bounds dos cabeçalhos com folga, para que novas faixas próximas ainda caibam
+        min_coords, max_coords = self.extractor.estimar_bounds_ecef(self.extractor.ler_cabecalhos_laz(arquivos_laz))
+        folga = (max_coords - min_coords) * self.margem_bounds
+        return min_coords - folga, max_coords + folga
+
+    def _distribuir(self, nome: str, pontos: np.ndarray, cores: np.ndarray,
+                    destino: Dict[str, Dict[str, tuple]], filtro: Optional[Set[str]] = None) -> List[str]:
+        # separa os pontos de uma entrada pelas subárvores do nível de partição
+        k = self.nivel_particao
+        chaves = calcular_chaves_morton(pontos, self.bounds, k)
+        ordem = np.argsort(chaves, kind='stable')
+        unicas, inicios = np.unique(chaves[ordem], return_index=True)
+        fins = np.append(inicios[1:], len(ordem))
+
+        subarvores = []
+        for chave, inicio, fim in zip(unicas.tolist(), inicios.tolist(), fins.tolist()):
+            caminho = self._caminho_para_texto(tuple((chave >> (3 * (k - 1 - i))) & 7 for i in range(k)))
+            subarvores.append(caminho)
+            if filtro is None or caminho in filtro:
+                indices = np.sort(ordem[inicio:fim])
+                destino.setdefault(caminho, {})[nome] = (pontos[indices], cores[indices])
+
+        return subarvores
+
+    def _coletar_subarvores(self, tile: dict, subarvores: Dict[str, dict]):
+        # as raízes das subárvores são marcadas com extras.caminho
+        caminho = tile.get("extras", {}).get("caminho")
+        if caminho is not None:
+            subarvores[caminho] = tile
+            return
+        for child in tile.get("children", []):
+            self._coletar_subarvores(child, subarvores)
+
+    def _reconstruir(self, por_nome: Dict[str, Path], hashes: Dict[str, str], alterados: List[str],
+                     removidos: List[str], manifesto_anterior: Optional[Dict],
+                     invalidas: Set[str] = frozenset()) -> dict:
+        completo = manifesto_anterior is None
+        entradas_anteriores = {} if completo else manifesto_anterior["entradas"]
+        tiles_anteriores = {} if completo else manifesto_anterior["subarvores"]
+        # a geração continua contando numa reconstrução completa, para os nomes nunca se repetirem
+        geracao = (self.manifesto.carregar() or {}).get("geracao", 0) + 1
+
+        # subárvores com tiles faltando ou corrompidos são regeneradas mesmo sem entradas alteradas
+        afetadas = set(invalidas)
+        for nome in alterados + removidos:
+            afetadas.update(entradas_anteriores.get(nome, {}).get("subarvores", []))
+
+        entradas = {nome: dict(entrada, estado=self.estados[nome]) for nome, entrada in entradas_anteriores.items()
+                    if nome not in alterados and nome not in removidos}
+        pontos_por_subarvore: Dict[str, Dict[str, tuple]] = {}
+
+        for i, nome in enumerate(alterados, 1):
+            print(f"Processando entrada {i}/{len(alterados)}: {nome}")
+            pontos, cores = self.extractor.processar_arquivo_laz(por_nome[nome])
+            subarvores = []
+            if pontos is not None and cores is not None:
+                subarvores = self._distribuir(nome, pontos, cores, pontos_por_subarvore)
+            entradas[nome] = {"hash": hashes[nome], "estado": self.estados[nome], "subarvores": subarvores}
+            afetadas.update(subarvores)
+
+        # entradas inalteradas que também contribuem para as subárvores afetadas precisam ser relidas
+        for nome in sorted(entradas):
+            if nome in alterados or not afetadas.intersection(entradas[nome]["subarvores"]):
+                continue
+            print(f"Relendo entrada inalterada: {nome}")
+            pontos, cores = self.extractor.processar_arquivo_laz(por_nome[nome])
+            if pontos is not None and cores is not None:
+                self._distribuir(nome, pontos, cores, pontos_por_subarvore, filtro=afetadas)
+
+        if completo:
+            self.generator._limpar_diretorio_saida()
+            subarvores_tileset = {}
+        else:
+            with open(self.generator.output_dir / "tileset.json", 'r') as f:
+                tileset_anterior = resolver_tilesets_externos(self.generator.output_dir, json.load(f))
+            subarvores_tileset = {}
+            self._coletar_subarvores(tileset_anterior["root"], subarvores_tileset)
+
+        print(f"Regenerando {len(afetadas)} subárvores, reaproveitando "
+              f"{len(set(subarvores_tileset) - afetadas)}")
+
+        for caminho in sorted(afetadas):
+            # os tiles da subárvore pelo manifesto, que também conhece os nomes versionados
+            for uri in tiles_anteriores.get(caminho, {}).get("tiles", []):
+                (self.generator.output_dir / uri).unlink(missing_ok=True)
+            for tile_antigo in self.generator.output_dir.glob(f"tile_{caminho}*.pnts"):
+                tile_antigo.unlink()
+            subarvores_tileset.pop(caminho, None)
+
+            partes = pontos_por_subarvore.pop(caminho, None)
+            if not partes:
+                continue
+
+            # concatena na ordem dos nomes para que a saída não dependa da ordem de chegada
+            nomes = sorted(partes)
+            memorias = []
+            try:
+                pontos = self._concatenar([partes[nome][0] for nome in nomes], memorias)
+                cores = self._concatenar([partes[nome][1] for nome in nomes], memorias)
+                del partes
+
+                tile = self.generator._construir_tiles_octree(
+                    pontos, cores, self.nivel_particao,
+                    self._bounds_do_caminho(self._texto_para_caminho(caminho)),
+                    f"g{geracao}_{caminho}" if self.versionar_tiles else caminho
+                )
+                del pontos, cores
+            finally:
+                soltar_blocos(memorias)
+            tile.setdefault("extras", {})["caminho"] = caminho
+            subarvores_tileset[caminho] = tile
+
+        if not subarvores_tileset:
+            raise ValueError("Nenhum arquivo LAZ válido foi processado!")
+
+        tile_raiz = montar_arvore({self._texto_para_caminho(c): t for c, t in subarvores_tileset.items()},
+                                  tipo_volume=self.generator.volume_limite)
+
+        tileset = {
+            "asset": {"version": "1.0"},
+            "geometricError": tile_raiz["geometricError"],
+            "root": tile_raiz
+        }
+
+        self.generator.tile_counter = len(listar_conteudos(tile_raiz))
+        self.manifesto.salvar({
+            "parametros": self._parametros(),
+            "hash_parametros": calcular_hash_parametros(self._parametros()),
+            "bounds": [self.bounds[0].tolist(), self.bounds[1].tolist()],
+            "entradas": entradas,
+            "geracao": geracao,
+            "subarvores": {c: {"tiles": listar_conteudos(t)} for c, t in sorted(subarvores_tileset.items())}
+        })
+
+        return tileset
+
+    def gerar_tileset(self, forcar_regeneracao: bool = False) -> dict:
+        arquivos_laz = self.extractor.listar_arquivos_laz()
+        por_nome = {self._nome_entrada(a): a for a in arquivos_laz}
+        self.reaproveitado = False
+
+        manifesto = self.manifesto.carregar()
+        print("Calculando hashes das entradas...")
+        hashes = self._calcular_hashes(por_nome, manifesto)
+
+        motivo = None
+        if forcar_regeneracao:
+            motivo = "regeneração forçada"
+        elif manifesto is None:
+            motivo = "manifesto de build não encontrado"
+        elif manifesto.get("hash_parametros") != calcular_hash_parametros(self._parametros()):
+            motivo = "parâmetros do tiler mudaram"
+        elif not (self.generator.output_dir / "tileset.json").exists():
+            motivo = "tileset.json não encontrado"
+
+        alterados = []
+        removidos = []
+        invalidas = set()
+        if motivo is None:
+            relatorio = verificar_tileset(self.generator.output_dir, num_workers=self.generator.num_workers)
+            imprimir_relatorio_verificacao(relatorio)
+            invalidas = {invalido.get("subarvore") for invalido in relatorio["invalidos"]}
+            if relatorio["erro"] is not None:
+                motivo = "tileset.json ilegível"
+            elif None in invalidas:
+                motivo = "tiles inválidos fora das subárvores do manifesto"
+
+        if motivo is None:
+            self.bounds = (np.array(manifesto["bounds"][0]), np.array(manifesto["bounds"][1]))
+            alterados = sorted(n for n in hashes if manifesto["entradas"].get(n, {}).get("hash") != hashes[n])
+            removidos = sorted(n for n in manifesto["entradas"] if n not in hashes)
+
+            if alterados:
+                min_novos, max_novos = self.extractor.estimar_bounds_ecef(
+                    self.extractor.ler_cabecalhos_laz([por_nome[n] for n in alterados])
+                )
+                if np.any(min_novos < self.bounds[0]) or np.any(max_novos > self.bounds[1]):
+                    motivo = "novas entradas fora dos bounds da build anterior"
+
+        if motivo is not None:
+            print(f"Reconstrução completa: {motivo}")
+            self.bounds = self._estimar_bounds(arquivos_laz)
+            return self._reconstruir(por_nome, hashes, sorted(hashes), [], None)
+
+        if not alterados and not removidos and not invalidas:
+            print("Nenhuma entrada mudou - reutilizando tileset existente")
+            with open(self.generator.output_dir / "tileset.json", 'r') as f:
+                tileset_existente = resolver_tilesets_externos(self.generator.output_dir, json.load(f))
+            self.generator.tile_counter = len(listar_conteudos(tileset_existente["root"]))
+            self.reaproveitado = True
+            return tileset_existente
+
+        print(f"Build incremental: {len(alterados)} entradas novas ou alteradas, {len(removidos)} removidas, "
+              f"{len(invalidas)} subárvores com tiles inválidos")
+        return self._reconstruir(por_nome, hashes, alterados, removidos, manifesto, invalidas)
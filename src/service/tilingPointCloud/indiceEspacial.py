@@ -0,0 +1,296 @@
+import json
+import struct
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+from atributosPontos import ATRIBUTOS
+from boundingVolumes import WGS84_A, WGS84_B, cantos_volume
+from codificacaoPnts import TAMANHO_CABECALHO_PNTS
+
+NOME_INDICE_ESPACIAL = "indice_espacial.npy"
+NOME_METADADOS_INDICE = "indice_espacial.json"
+VERSAO_INDICE = 1
+
+# códigos dos formatos de cada tile no índice
+POSICAO_FLOAT32, POSICAO_QUANTIZADA = 0, 1
+COR_RGB, COR_RGB565 = 0, 1
+
+WGS84_E2 = 1.0 - (WGS84_B / WGS84_A) ** 2
+WGS84_EP2 = (WGS84_A / WGS84_B) ** 2 - 1.0
+
+
+def _dtype_indice(tamanho_uri: int, atributos: Sequence[str]) -> np.dtype:
+    # um registro por tile com conteúdo; os deslocamentos são absolutos dentro do .pnts
+    campos = [
+        ("minimo", "<f8", (3,)), ("maximo", "<f8", (3,)),
+        ("lonlat_minimo", "<f8", (2,)), ("lonlat_maximo", "<f8", (2,)),
+        ("pontos", "<u4"),
+        ("formato_posicao", "u1"), ("formato_cor", "u1"),
+        ("inicio_posicoes", "<u8"), ("inicio_cores", "<u8"),
+        ("referencia", "<f8", (3,)), ("escala", "<f8", (3,)),
+    ]
+    campos += [(f"inicio_{nome}", "<u8") for nome in atributos]
+    campos.append(("uri", f"S{max(1, tamanho_uri)}"))
+    return np.dtype(campos)
+
+
+def geodesicas_de_ecef(pontos: np.ndarray) -> np.ndarray:
+    # longitude e latitude (graus) no WGS84 pela fórmula de Bowring, precisa ao milímetro na superfície
+    x, y, z = (np.asarray(pontos[:, eixo], dtype=np.float64) for eixo in range(3))
+    p = np.hypot(x, y)
+    theta = np.arctan2(z * WGS84_A, p * WGS84_B)
+    latitude = np.arctan2(z + WGS84_EP2 * WGS84_B * np.sin(theta) ** 3,
+                          p - WGS84_E2 * WGS84_A * np.cos(theta) ** 3)
+    return np.column_stack([np.degrees(np.arctan2(y, x)), np.degrees(latitude)])
+
+
+def ecef_de_geodesicas(longitude: float, latitude: float, altura: float = 0.0) -> np.ndarray:
+    # ponto ECEF de uma posição WGS84 (graus e metros), para montar o centro das consultas por raio
+    lon, lat = np.radians(longitude), np.radians(latitude)
+    n = WGS84_A / np.sqrt(1.0 - WGS84_E2 * np.sin(lat) ** 2)
+    return np.array([(n + altura) * np.cos(lat) * np.cos(lon),
+                     (n + altura) * np.cos(lat) * np.sin(lon),
+                     (n * (1.0 - WGS84_E2) + altura) * np.sin(lat)])
+
+
+def _listar_tiles_com_volume(tile: dict, tiles: List[tuple]):
+    if "content" in tile:
+        tiles.append((tile["content"]["uri"], tile["boundingVolume"]))
+    for child in tile.get("children", []):
+        _listar_tiles_com_volume(child, tiles)
+
+
+def _ler_layout_pnts(caminho: Path) -> dict:
+    # cabeçalho, feature table JSON e batch table JSON, sem ler as posições
+    with open(caminho, 'rb') as f:
+        header = f.read(TAMANHO_CABECALHO_PNTS)
+        _, _, _, ft_json_length, ft_binary_length, bt_json_length, _ = struct.unpack('<4sIIIIII', header)
+        feature_table_json = json.loads(f.read(ft_json_length))
+        f.seek(TAMANHO_CABECALHO_PNTS + ft_json_length + ft_binary_length)
+        batch_table_json = json.loads(f.read(bt_json_length)) if bt_json_length else {}
+    inicio_binario = TAMANHO_CABECALHO_PNTS + ft_json_length
+    inicio_batch = inicio_binario + ft_binary_length + bt_json_length
+    return {"feature_table": feature_table_json, "batch_table": batch_table_json,
+            "inicio_binario": inicio_binario, "inicio_batch": inicio_batch}
+
+
+def salvar_indice_espacial(output_dir: Path, tileset: dict, renomear: Optional[Callable[[str], str]] = None):
+    """
+    Grava indice_espacial.npy ao lado do tileset.json: um registro por tile
+    com conteúdo, com a caixa ECEF e a de longitude/latitude do tile, o formato
+    e os deslocamentos das posições, cores e atributos dentro do .pnts. Lê só o
+    cabeçalho e os JSONs de cada tile, como o relatório de compactação.
+    'renomear' dá a URI final de cada tile quando ele ainda vai ser movido
+    (tiling implícito); os arquivos são lidos no caminho atual.
+    """
+    output_dir = Path(output_dir)
+    if "implicitTiling" in tileset["root"]:
+        # tileset reaproveitado já convertido: a árvore explícita não existe mais
+        if not (output_dir / NOME_INDICE_ESPACIAL).exists():
+            print("Índice espacial não gerado: o tileset reaproveitado já está em tiling implícito")
+        return
+
+    tiles = []
+    _listar_tiles_com_volume(tileset["root"], tiles)
+    tiles = [(uri, bounding_volume) for uri, bounding_volume in tiles
+             if uri.endswith(".pnts") and (output_dir / uri).exists()]
+
+    layouts = [_ler_layout_pnts(output_dir / uri) for uri, _ in tiles]
+    propriedades = {ATRIBUTOS[nome][2]: nome for nome in ATRIBUTOS}
+    atributos = [propriedades[nome] for nome in layouts[0]["batch_table"] if nome in propriedades] if layouts else []
+    uris = [renomear(uri) if renomear else uri for uri, _ in tiles]
+
+    indice = np.zeros(len(tiles), dtype=_dtype_indice(max((len(uri) for uri in uris), default=1), atributos))
+    cantos = np.empty((len(tiles), 8, 3))
+    for i, ((_, bounding_volume), layout, uri) in enumerate(zip(tiles, layouts, uris)):
+        feature_table = layout["feature_table"]
+        registro = indice[i]
+        registro["uri"] = uri.encode('utf-8')
+        registro["pontos"] = feature_table["POINTS_LENGTH"]
+        cantos[i] = cantos_volume(bounding_volume)
+
+        if "POSITION_QUANTIZED" in feature_table:
+            registro["formato_posicao"] = POSICAO_QUANTIZADA
+            registro["inicio_posicoes"] = layout["inicio_binario"] + feature_table["POSITION_QUANTIZED"]["byteOffset"]
+            registro["referencia"] = feature_table["QUANTIZED_VOLUME_OFFSET"]
+            registro["escala"] = feature_table["QUANTIZED_VOLUME_SCALE"]
+        else:
+            registro["formato_posicao"] = POSICAO_FLOAT32
+            registro["inicio_posicoes"] = layout["inicio_binario"] + feature_table["POSITION"]["byteOffset"]
+            registro["referencia"] = feature_table.get("RTC_CENTER", [0.0, 0.0, 0.0])
+        cor = "RGB565" if "RGB565" in feature_table else "RGB"
+        registro["formato_cor"] = COR_RGB565 if cor == "RGB565" else COR_RGB
+        registro["inicio_cores"] = layout["inicio_binario"] + feature_table[cor]["byteOffset"]
+
+        for nome in atributos:
+            propriedade = layout["batch_table"].get(ATRIBUTOS[nome][2])
+            if propriedade is None:
+                raise ValueError(f"Tile sem o atributo '{nome}' dos demais: {uri}")
+            registro[f"inicio_{nome}"] = layout["inicio_batch"] + propriedade["byteOffset"]
+
+    if len(tiles):
+        indice["minimo"] = cantos.min(axis=1)
+        indice["maximo"] = cantos.max(axis=1)
+        # no formato quantizado a caixa de quantização é a dos próprios pontos, mais justa que a do nó
+        quantizados = indice["formato_posicao"] == POSICAO_QUANTIZADA
+        indice["minimo"][quantizados] = np.maximum(indice["minimo"][quantizados], indice["referencia"][quantizados])
+        indice["maximo"][quantizados] = np.minimum(indice["maximo"][quantizados],
+                                                   indice["referencia"][quantizados] + indice["escala"][quantizados])
+
+        # longitude é extrema nos cantos da caixa; a latitude pode passar deles pela curvatura
+        # das arestas, o que a margem (ordem de diagonal² / raio², em radianos) cobre
+        lonlat = geodesicas_de_ecef(cantos.reshape(-1, 3)).reshape(len(tiles), 8, 2)
+        diagonal = np.linalg.norm(indice["maximo"] - indice["minimo"], axis=1)
+        margem = np.degrees((diagonal / WGS84_B) ** 2) + 1e-7
+        indice["lonlat_minimo"] = lonlat.min(axis=1) - margem[:, None]
+        indice["lonlat_maximo"] = lonlat.max(axis=1) + margem[:, None]
+
+    np.save(output_dir / NOME_INDICE_ESPACIAL, indice)
+    metadados = {"versao": VERSAO_INDICE, "tiles": len(tiles), "pontos": int(indice["pontos"].sum()),
+                 "atributos": atributos}
+    with open(output_dir / NOME_METADADOS_INDICE, 'w') as f:
+        json.dump(metadados, f, indent=2)
+    print(f"Índice espacial salvo em: {output_dir / NOME_INDICE_ESPACIAL} ({len(tiles)} tiles)")
+
+
+def _dentro_do_poligono(lonlat: np.ndarray, vertices: np.ndarray) -> np.ndarray:
+    # regra par-ímpar: conta as arestas cruzadas por um raio horizontal a partir de cada ponto
+    x, y = lonlat[:, 0], lonlat[:, 1]
+    dentro = np.zeros(len(lonlat), dtype=bool)
+    for (x1, y1), (x2, y2) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if y1 == y2:
+            continue
+        cruza = (y1 > y) != (y2 > y)
+        dentro ^= cruza & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return dentro
+
+
+class IndiceEspacial:
+    """
+    Consultas de pontos sobre um tileset gerado, pelo indice_espacial.npy ao
+    lado do tileset.json. O índice é mapeado na memória e os tiles candidatos
+    saem de uma comparação vetorizada das caixas de todos eles; só os .pnts
+    candidatos são mapeados (np.memmap) e decodificados, e os pontos são
+    filtrados exatamente pela região. Cada ponto está em um único tile (os
+    nós internos do LOD só têm a amostra retirada dos filhos), então o
+    resultado não repete pontos.
+
+    As consultas devolvem {"pontos": ECEF float64 (n, 3), "cores": uint8 (n, 3)}
+    e um array por atributo gravado (classificacao, intensidade, retorno).
+    """
+
+    def __init__(self, tileset_dir: Path):
+        self.tileset_dir = Path(tileset_dir)
+        with open(self.tileset_dir / NOME_METADADOS_INDICE, 'r') as f:
+            self.metadados = json.load(f)
+        if self.metadados.get("versao") != VERSAO_INDICE:
+            raise ValueError(f"Versão do índice espacial não suportada: {self.metadados.get('versao')}")
+        self.atributos = tuple(self.metadados["atributos"])
+        self.indice = np.load(self.tileset_dir / NOME_INDICE_ESPACIAL, mmap_mode='r')
+        # caixas lidas uma vez, um array contíguo por eixo, para as comparações das consultas
+        self._minimo = np.ascontiguousarray(self.indice["minimo"].T)
+        self._maximo = np.ascontiguousarray(self.indice["maximo"].T)
+        self._lonlat_minimo = np.ascontiguousarray(self.indice["lonlat_minimo"].T)
+        self._lonlat_maximo = np.ascontiguousarray(self.indice["lonlat_maximo"].T)
+
+    def __len__(self) -> int:
+        return len(self.indice)
+
+    @staticmethod
+    def _cruzam(minimos: np.ndarray, maximos: np.ndarray, minimo: np.ndarray, maximo: np.ndarray) -> np.ndarray:
+        # eixo por eixo: o primeiro corta quase todos os tiles e os seguintes só olham os que sobraram
+        candidatos = np.flatnonzero((minimos[0] <= maximo[0]) & (maximos[0] >= minimo[0]))
+        for eixo in range(1, len(minimo)):
+            cruza = (minimos[eixo][candidatos] <= maximo[eixo]) & (maximos[eixo][candidatos] >= minimo[eixo])
+            candidatos = candidatos[cruza]
+        return candidatos
+
+    def tiles_na_caixa(self, minimo: Sequence[float], maximo: Sequence[float]) -> np.ndarray:
+        # posições no índice dos tiles cuja caixa cruza a caixa ECEF [minimo, maximo]
+        minimo, maximo = np.asarray(minimo, dtype=np.float64), np.asarray(maximo, dtype=np.float64)
+        return self._cruzam(self._minimo, self._maximo, minimo, maximo)
+
+    def tiles_no_raio(self, centro: Sequence[float], raio: float) -> np.ndarray:
+        # tiles na caixa em volta da esfera e, deles, os com o ponto mais próximo a até 'raio'
+        centro = np.asarray(centro, dtype=np.float64)
+        candidatos = self._cruzam(self._minimo, self._maximo, centro - raio, centro + raio)
+        mais_proximo = np.clip(centro[:, None], self._minimo[:, candidatos], self._maximo[:, candidatos])
+        return candidatos[np.sum((mais_proximo - centro[:, None]) ** 2, axis=0) <= raio * raio]
+
+    def tiles_no_poligono(self, vertices: np.ndarray) -> np.ndarray:
+        # pela caixa de longitude/latitude do polígono; os pontos são testados depois
+        vertices = np.asarray(vertices, dtype=np.float64)
+        return self._cruzam(self._lonlat_minimo, self._lonlat_maximo, vertices.min(axis=0), vertices.max(axis=0))
+
+    def ler_tile(self, posicao: int) -> Dict[str, np.ndarray]:
+        # decodifica os pontos de um tile do índice, mapeando o .pnts em vez de lê-lo inteiro
+        registro = self.indice[posicao]
+        n = int(registro["pontos"])
+        dados = np.memmap(self.tileset_dir / registro["uri"].decode('utf-8'), dtype=np.uint8, mode='r')
+
+        inicio = int(registro["inicio_posicoes"])
+        referencia = registro["referencia"].astype(np.float64)
+        if registro["formato_posicao"] == POSICAO_QUANTIZADA:
+            quantizados = dados[inicio:inicio + 6 * n].view('<u2').reshape(n, 3)
+            pontos = quantizados * (registro["escala"] / 65535.0) + referencia
+        else:
+            pontos = dados[inicio:inicio + 12 * n].view('<f4').reshape(n, 3) + referencia
+
+        inicio = int(registro["inicio_cores"])
+        if registro["formato_cor"] == COR_RGB565:
+            rgb565 = dados[inicio:inicio + 2 * n].view('<u2')
+            cores = np.empty((n, 3), dtype=np.uint8)
+            # replica os bits altos nos baixos, como o Cesium ao expandir para 8 bits
+            vermelho, verde, azul = (rgb565 >> 11) & 0x1F, (rgb565 >> 5) & 0x3F, rgb565 & 0x1F
+            cores[:, 0] = (vermelho << 3) | (vermelho >> 2)
+            cores[:, 1] = (verde << 2) | (verde >> 4)
+            cores[:, 2] = (azul << 3) | (azul >> 2)
+        else:
+            cores = np.array(dados[inicio:inicio + 3 * n].reshape(n, 3))
+
+        resultado = {"pontos": pontos, "cores": cores}
+        for nome in self.atributos:
+            tipo = ATRIBUTOS[nome][1]
+            inicio = int(registro[f"inicio_{nome}"])
+            resultado[nome] = np.array(dados[inicio:inicio + tipo.itemsize * n].view(tipo))
+        return resultado
+
+    def _consultar(self, candidatos: np.ndarray, filtro: Callable[[np.ndarray], np.ndarray]) -> Dict[str, np.ndarray]:
+        partes = []
+        for posicao in candidatos:
+            tile = self.ler_tile(int(posicao))
+            mascara = filtro(tile["pontos"])
+            if np.any(mascara):
+                partes.append({nome: valores[mascara] for nome, valores in tile.items()})
+        if not partes:
+            vazio = {"pontos": np.empty((0, 3)), "cores": np.empty((0, 3), dtype=np.uint8)}
+            vazio.update({nome: np.empty(0, dtype=ATRIBUTOS[nome][1]) for nome in self.atributos})
+            return vazio
+        return {nome: np.concatenate([parte[nome] for parte in partes]) for nome in partes[0]}
+
+    def consultar_caixa(self, minimo: Sequence[float], maximo: Sequence[float]) -> Dict[str, np.ndarray]:
+        # pontos dentro da caixa alinhada aos eixos ECEF [minimo, maximo]
+        minimo, maximo = np.asarray(minimo, dtype=np.float64), np.asarray(maximo, dtype=np.float64)
+        return self._consultar(self.tiles_na_caixa(minimo, maximo),
+                               lambda pontos: np.all((pontos >= minimo) & (pontos <= maximo), axis=1))
+
+    def consultar_raio(self, centro: Sequence[float], raio: float) -> Dict[str, np.ndarray]:
+        # pontos a até 'raio' metros do ponto ECEF 'centro' (ecef_de_geodesicas converte lon/lat)
+        centro = np.asarray(centro, dtype=np.float64)
+        return self._consultar(self.tiles_no_raio(centro, raio),
+                               lambda pontos: np.einsum('ij,ij->i', pontos - centro, pontos - centro) <= raio * raio)
+
+    def consultar_poligono(self, vertices: Sequence[Sequence[float]]) -> Dict[str, np.ndarray]:
+        # pontos cuja longitude/latitude (graus) cai dentro do polígono, em qualquer altura
+        vertices = np.asarray(vertices, dtype=np.float64)
+        if len(vertices) < 3:
+            raise ValueError("O polígono precisa de pelo menos 3 vértices")
+        minimo, maximo = vertices.min(axis=0), vertices.max(axis=0)
+
+        def filtro(pontos: np.ndarray) -> np.ndarray:
+            lonlat = geodesicas_de_ecef(pontos)
+            mascara = np.all((lonlat >= minimo) & (lonlat <= maximo), axis=1)
+            mascara[mascara] = _dentro_do_poligono(lonlat[mascara], vertices)
+            return mascara
+
+        return self._consultar(self.tiles_no_poligono(vertices), filtro)
@@ -2,14 +2,41 @@ import json
 import numpy as np
 import laspy
 from pathlib import Path
-from pyproj import CRS, Transformer
-from typing import Tuple, Dict
+from pyproj import Transformer
+from typing import Tuple, Dict, List, Iterator
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from multiprocessing import shared_memory
+from metricasBuild import etapa
+from memoriaCompartilhada import apagar_blocos, array_compartilhado, criar_bloco, soltar_blocos
+from atributosPontos import COLUNAS_RGB, validar_atributos, largura_cores, gravar_atributos
+from transformacaoEcef import (MODOS_TRANSFORMACAO, AproximacaoPlanoTangente, obter_transformador,
+                               transformacao_identidade, transformar_em_threads)
 
 class LAZExtractor:
-    def __init__(self, diretorio_ept: Path):
+    def __init__(self, diretorio_ept: Path, modo_transformacao: str = "exato",
+                 erro_maximo_aproximacao: float = 0.005, threads_transformacao: int = 1,
+                 atributos: tuple = ()):
+        if modo_transformacao not in MODOS_TRANSFORMACAO:
+            raise ValueError(f"Modo de transformação inválido: {modo_transformacao}")
+        validar_atributos(atributos)
+        
         self.diretorio_ept = diretorio_ept
+        self.modo_transformacao = modo_transformacao
+        self.erro_maximo_aproximacao = erro_maximo_aproximacao
+        self.threads_transformacao = threads_transformacao
+        # atributos do LAS (atributosPontos.ATRIBUTOS) gravados como colunas extras do array de cores
+        self.atributos = tuple(atributos)
+        self.largura_cores = largura_cores(self.atributos)
         self.metadados = self._ler_metadados_ept()
         self.transformer = self._configurar_transformador()
+        # entrada já em ECEF: os pontos passam direto, sem o PROJ
+        self.ecef_nativo = self.transformer is not None and transformacao_identidade(self.transformer)
+        if self.ecef_nativo:
+            print("Entrada já está em ECEF - reprojeção desativada")
+        # mantém vivos os blocos de memória compartilhada que sustentam os arrays retornados;
+        # o ParticionadorMorton os reordena ali mesmo e os workers de tiles os anexam pelo nome
+        self._memorias_compartilhadas = []
     
     def _ler_metadados_ept(self) -> Dict:
         # le os metadados do EPT
@@ -21,30 +48,22 @@ class LAZExtractor:
             return json.load(f)
     
     def _configurar_transformador(self) -> Transformer:
-        # configura o transformador de coordenadas UTM para ECEF
+        # configura o transformador do SRS do EPT (UTM) para ECEF, compartilhado entre arquivos e execuções
         try:
             srs = self.metadados.get("srs", {})
             if "horizontal" in srs:
-                utm_epsg = srs["horizontal"].replace("EPSG:", "")
-                crs_utm = CRS.from_epsg(int(utm_epsg))
-                crs_ecef = CRS.from_epsg(4978)  # ECEF
-                return Transformer.from_crs(crs_utm, crs_ecef, always_xy=True)
+                epsg = srs["horizontal"].replace("EPSG:", "")
+                return obter_transformador(f"EPSG:{int(epsg)}")
             else:
                 raise ValueError("EPSG não encontrado nos metadados EPT")
         except Exception as e:
             print(f"Erro ao configurar transformador: {e}")
             return None
     
-    def _extrair_cores_las(self, las: laspy.LasData) -> np.ndarray:
-        # extrai cores RGB do arquivo LAS/LAZ
-        if hasattr(las, 'red') and hasattr(las, 'green') and hasattr(las, 'blue'):
-            red = las.red
-            green = las.green  
-            blue = las.blue
-            
-            max_color = max(red.max(), green.max(), blue.max())
-            
-            if max_color > 255:
+    def _converter_cores(self, red: np.ndarray, green: np.ndarray, blue: np.ndarray,
+                         escala_16bit: bool) -> np.ndarray:
+        with etapa("cores", pontos=len(red)):
+            if escala_16bit:
                 # converte de 16-bit para 8-bit
                 red = (red / 65535.0 * 255).astype(np.uint8)
                 green = (green / 65535.0 * 255).astype(np.uint8)
@@ -55,26 +74,82 @@ class LAZExtractor:
                 green = green.astype(np.uint8)
                 blue = blue.astype(np.uint8)
             
-            cores = np.column_stack((red, green, blue))
+            return np.column_stack((red, green, blue))
+    
+    def _converter_cores_em_destino(self, red: np.ndarray, green: np.ndarray, blue: np.ndarray,
+                                    escala_16bit: bool, destino: np.ndarray):
+        # 16-bit -> 8-bit com deslocamento de bits, gravando direto no buffer de destino
+        with etapa("cores", pontos=len(red)):
+            for canal, valores in enumerate((red, green, blue)):
+                if escala_16bit:
+                    np.right_shift(valores, 8, out=destino[:, canal], casting='unsafe')
+                else:
+                    destino[:, canal] = valores
+    
+    def _extrair_cores_las(self, las: laspy.LasData) -> np.ndarray:
+        # extrai cores RGB do arquivo LAS/LAZ
+        if hasattr(las, 'red') and hasattr(las, 'green') and hasattr(las, 'blue'):
+            red = las.red
+            green = las.green  
+            blue = las.blue
+            
+            max_color = max(red.max(), green.max(), blue.max())
+            
+            cores = self._converter_cores(red, green, blue, max_color > 255)
             print(f"  Cores extraídas: formato {'16-bit' if max_color > 255 else '8-bit'} -> RGB 8-bit")
         else:
             print("  Aviso: arquivo não contém informações de cor, usando cor padrão (branco)")
             # Cor branca como padrão se não houver cores
             cores = np.full((len(las.points), 3), 255, dtype=np.uint8)
         
-        return cores
+        return self._anexar_atributos(las, cores)
+    
+    def _anexar_atributos(self, fonte, cores: np.ndarray) -> np.ndarray:
+        # RGB seguido das colunas dos atributos configurados
+        if not self.atributos:
+            return cores
+        completas = np.empty((len(cores), self.largura_cores), dtype=np.uint8)
+        completas[:, :COLUNAS_RGB] = cores
+        gravar_atributos(fonte, self.atributos, completas)
+        return completas
     
-    def _converter_coordenadas_para_ecef(self, pontos: np.ndarray) -> np.ndarray:
+    def _aproximacao_do_arquivo(self, header) -> AproximacaoPlanoTangente:
+        # aproximação ajustada à caixa do cabeçalho, ou None se o modo é exato ou o erro passa do limite
+        if self.modo_transformacao != "plano_tangente" or self.transformer is None or self.ecef_nativo:
+            return None
+        
+        aproximacao = AproximacaoPlanoTangente(self.transformer, header.mins, header.maxs)
+        if aproximacao.erro > self.erro_maximo_aproximacao:
+            print(f"  Erro do plano tangente de {aproximacao.erro * 1000:.2f} mm acima do limite de "
+                  f"{self.erro_maximo_aproximacao * 1000:.2f} mm - usando a transformação exata")
+            return None
+        return aproximacao
+    
+    def _transformar_em_lugar(self, x: np.ndarray, y: np.ndarray, z: np.ndarray,
+                              aproximacao: AproximacaoPlanoTangente = None):
+        if self.ecef_nativo:
+            return
+        with etapa("reprojecao", pontos=len(x)):
+            # pontos fora da caixa do cabeçalho (cabeçalho desatualizado) ficam com a transformação exata
+            if aproximacao is not None and aproximacao.cobre(x, y, z):
+                aproximacao.aplicar_em_lugar(x, y, z)
+            else:
+                transformar_em_threads(self.transformer, x, y, z, self.threads_transformacao)
+    
+    def _converter_coordenadas_para_ecef(self, pontos: np.ndarray,
+                                         aproximacao: AproximacaoPlanoTangente = None) -> np.ndarray:
         # converte coordenadas UTM para ECEF
         if self.transformer is None:
             print("Aviso: Transformador não configurado, usando coordenadas originais")
             return pontos
         
+        if self.ecef_nativo:
+            return pontos
+        
         try:
-            x_ecef, y_ecef, z_ecef = self.transformer.transform(
-                pontos[:, 0], pontos[:, 1], pontos[:, 2]
-            )
-            return np.column_stack([x_ecef, y_ecef, z_ecef])
+            x, y, z = (np.array(pontos[:, i], dtype=np.float64) for i in range(3))
+            self._transformar_em_lugar(x, y, z, aproximacao)
+            return np.column_stack([x, y, z])
         except Exception as e:
             print(f"Erro na conversão para ECEF: {e}")
             return pontos
@@ -82,11 +157,15 @@ class LAZExtractor:
     def processar_arquivo_laz(self, arquivo_laz: Path) -> Tuple[np.ndarray, np.ndarray]:
         try:
             with laspy.open(arquivo_laz) as las_file:
-                las = las_file.read()
+                with etapa("leitura_laz") as medida:
+                    las = las_file.read()
+                    medida["pontos"] = len(las.points)
                 
                 pontos = np.column_stack([las.x, las.y, las.z])
                 
-                pontos_ecef = self._converter_coordenadas_para_ecef(pontos)
+                pontos_ecef = self._converter_coordenadas_para_ecef(
+                    pontos, self._aproximacao_do_arquivo(las.header)
+                )
                 
                 cores = self._extrair_cores_las(las)
                 
@@ -96,32 +175,261 @@ class LAZExtractor:
             print(f"Erro ao processar {arquivo_laz}: {e}")
             return None, None
     
-    def processar_todos_arquivos_laz(self) -> Tuple[np.ndarray, np.ndarray]:
-        arquivos_laz = list(self.diretorio_ept.glob("**/*.laz"))
+    def _chunks_medidos(self, las_file, pontos_por_chunk: int):
+        # o chunk_iterator descompacta sob demanda, então o tempo de cada next() é o da leitura
+        iterador = iter(las_file.chunk_iterator(pontos_por_chunk))
+        while True:
+            with etapa("leitura_laz") as medida:
+                chunk = next(iterador, None)
+                medida["pontos"] = 0 if chunk is None else len(chunk)
+            if chunk is None:
+                return
+            yield chunk
+    
+    def iterar_chunks_arquivo_laz(self, arquivo_laz: Path,
+                                  pontos_por_chunk: int) -> Iterator[Tuple[np.ndarray, np.ndarray, bool]]:
+        """
+        Lê o arquivo em blocos de até pontos_por_chunk pontos, já em ECEF. A
+        escala das cores vale para o arquivo inteiro, mas só fica conhecida
+        quando aparece um canal acima de 255: até lá os blocos saem como 8-bit.
+        O terceiro item é True no bloco em que o arquivo se revela 16-bit depois
+        de outros blocos já entregues; nessa escala o RGB deles (todos <= 255)
+        vale 0, e quem os guardou deve zerá-lo.
+        """
+        with laspy.open(arquivo_laz) as las_file:
+            dimensoes = set(las_file.header.point_format.dimension_names)
+            tem_cores = {'red', 'green', 'blue'} <= dimensoes
+            escala_16bit = False
+            entregues = 0
+            aproximacao = self._aproximacao_do_arquivo(las_file.header)
+            
+            for chunk in self._chunks_medidos(las_file, pontos_por_chunk):
+                pontos = np.column_stack([chunk.x, chunk.y, chunk.z])
+                pontos_ecef = self._converter_coordenadas_para_ecef(pontos, aproximacao)
+                del pontos
+                
+                zerar_anteriores = False
+                if tem_cores:
+                    red, green, blue = chunk.red, chunk.green, chunk.blue
+                    if not escala_16bit and max(red.max(), green.max(), blue.max()) > 255:
+                        escala_16bit = True
+                        zerar_anteriores = entregues > 0
+                    cores = self._converter_cores(red, green, blue, escala_16bit)
+                else:
+                    cores = np.full((len(pontos_ecef), 3), 255, dtype=np.uint8)
+                
+                entregues += 1
+                yield pontos_ecef, self._anexar_atributos(chunk, cores), zerar_anteriores
+    
+    def _ler_arquivo_em_buffers(self, arquivo_laz: Path, pontos: np.ndarray, cores: np.ndarray,
+                                origem: np.ndarray, pontos_por_chunk: int) -> int:
+        """
+        Lê um arquivo em blocos direto para as fatias 'pontos' (float32, relativos
+        a 'origem') e 'cores' (uint8) já alocadas para ele. A reprojeção é feita
+        in-place nos arrays float64 de cada bloco, então só um bloco por vez existe
+        em float64. Retorna quantos pontos foram gravados.
+        """
+        capacidade = len(pontos)
+        gravados = 0
+        try:
+            with laspy.open(arquivo_laz) as las_file:
+                dimensoes = set(las_file.header.point_format.dimension_names)
+                tem_cores = {'red', 'green', 'blue'} <= dimensoes
+                escala_16bit = False
+                aproximacao = self._aproximacao_do_arquivo(las_file.header)
+                
+                for chunk in self._chunks_medidos(las_file, pontos_por_chunk):
+                    n = min(len(chunk), capacidade - gravados)
+                    if n <= 0:
+                        break
+                    
+                    x, y, z = (np.asarray(chunk.x)[:n], np.asarray(chunk.y)[:n], np.asarray(chunk.z)[:n])
+                    if self.transformer is not None:
+                        self._transformar_em_lugar(x, y, z, aproximacao)
+                    
+                    destino = pontos[gravados:gravados + n]
+                    for eixo, valores in enumerate((x, y, z)):
+                        np.subtract(valores, origem[eixo], out=destino[:, eixo], casting='unsafe')
+                    del x, y, z
+                    
+                    if tem_cores:
+                        red, green, blue = chunk.red[:n], chunk.green[:n], chunk.blue[:n]
+                        if not escala_16bit and max(red.max(), green.max(), blue.max()) > 255:
+                            # arquivo 16-bit: os blocos já gravados como 8-bit (todos <= 255) são
+                            # reescalados, como se a escala tivesse sido decidida pelo arquivo inteiro
+                            escala_16bit = True
+                            np.right_shift(cores[:gravados, :COLUNAS_RGB], 8, out=cores[:gravados, :COLUNAS_RGB])
+                        self._converter_cores_em_destino(red, green, blue, escala_16bit,
+                                                         cores[gravados:gravados + n])
+                    else:
+                        cores[gravados:gravados + n, :COLUNAS_RGB] = 255
+                    if self.atributos:
+                        gravar_atributos(chunk, self.atributos, cores[gravados:gravados + n])
+                    
+                    gravados += n
+        except Exception as e:
+            print(f"Erro ao processar {arquivo_laz}: {e}")
+            return 0
+        
+        return gravados
+    
+    def listar_arquivos_laz(self) -> List[Path]:
+        # ordenado para que a saída não dependa da ordem do sistema de arquivos
+        arquivos_laz = sorted(self.diretorio_ept.glob("**/*.laz"))
         
         if not arquivos_laz:
             raise ValueError(f"Nenhum arquivo LAZ encontrado em: {self.diretorio_ept}")
         
-        todos_pontos = []
-        todas_cores = []
+        return arquivos_laz
+    
+    def ler_cabecalhos_laz(self, arquivos_laz: List[Path]) -> List[Dict]:
+        # lê só os cabeçalhos: contagem de pontos e bounds no SRS de origem
+        cabecalhos = []
+        for arquivo_laz in arquivos_laz:
+            with laspy.open(arquivo_laz) as las_file:
+                header = las_file.header
+                cabecalhos.append({
+                    "arquivo": arquivo_laz,
+                    "point_count": int(header.point_count),
+                    "mins": np.asarray(header.mins, dtype=np.float64),
+                    "maxs": np.asarray(header.maxs, dtype=np.float64)
+                })
+        return cabecalhos
+    
+    def estimar_bounds_ecef(self, cabecalhos: List[Dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Estima os bounds ECEF de todos os arquivos sem ler os pontos, transformando
+        uma grade 3x3x3 de cada caixa do cabeçalho. Uma pequena margem cobre a
+        curvatura entre os pontos amostrados.
+        """
+        amostras = []
+        for cabecalho in cabecalhos:
+            eixos = [np.linspace(cabecalho["mins"][i], cabecalho["maxs"][i], 3) for i in range(3)]
+            grade = np.stack(np.meshgrid(*eixos, indexing='ij'), axis=-1).reshape(-1, 3)
+            amostras.append(self._converter_coordenadas_para_ecef(grade))
         
-        print(f"Encontrados {len(arquivos_laz)} arquivos LAZ")
+        amostras = np.vstack(amostras)
+        min_coords = np.min(amostras, axis=0)
+        max_coords = np.max(amostras, axis=0)
+        padding = (max_coords - min_coords) * 0.005 + 1.0
+        return min_coords - padding, max_coords + padding
+    
+    def _faixas_dos_arquivos(self, cabecalhos: List[Dict]) -> Tuple[List[int], List[int], int]:
+        # faixa [inicio, inicio + capacidade) de cada arquivo no buffer único, pelos cabeçalhos
+        capacidades = [c["point_count"] for c in cabecalhos]
+        inicios = np.concatenate([[0], np.cumsum(capacidades)[:-1]]).astype(int).tolist()
+        total = int(sum(capacidades))
         
-        for i, arquivo_laz in enumerate(arquivos_laz, 1):
-            print(f"Processando arquivo {i}/{len(arquivos_laz)}: {arquivo_laz.name}")
-            
-            pontos, cores = self.processar_arquivo_laz(arquivo_laz)
-            
-            if pontos is not None and cores is not None:
-                todos_pontos.append(pontos)
-                todas_cores.append(cores)
+        if total == 0:
+            raise ValueError("Nenhum arquivo LAZ válido foi processado!")
+        
+        return inicios, capacidades, total
+    
+    def _compactar_lacunas(self, pontos: np.ndarray, cores: np.ndarray,
+                           inicios: List[int], gravados: List[int]) -> int:
+        # compacta as lacunas deixadas por arquivos com falha ou com menos pontos que o cabeçalho
+        destino = 0
+        for inicio, n in zip(inicios, gravados):
+            if n > 0 and inicio != destino:
+                pontos[destino:destino + n] = pontos[inicio:inicio + n]
+                cores[destino:destino + n] = cores[inicio:inicio + n]
+            destino += n
         
-        if not todos_pontos:
+        if destino == 0:
             raise ValueError("Nenhum arquivo LAZ válido foi processado!")
         
-        # combina todos os pontos e cores
-        pontos_combinados = np.vstack(todos_pontos)
-        cores_combinadas = np.vstack(todas_cores)
+        return destino
+    
+    def _processar_arquivos_paralelo(self, arquivos_laz: List[Path], num_workers: int,
+                                     origem: np.ndarray = None,
+                                     pontos_por_chunk: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Distribui a leitura dos arquivos em um pool de processos. Cada worker grava
+        seus pontos direto na faixa do arquivo dentro de um bloco de memória
+        compartilhada, dimensionado pelas contagens dos cabeçalhos, e a ordem final
+        segue a ordem (determinística) da lista de arquivos. Com 'origem' os pontos
+        são gravados em float32 relativos a ela, como na ingestão de baixa memória.
+        """
+        inicios, capacidades, total = self._faixas_dos_arquivos(self.ler_cabecalhos_laz(arquivos_laz))
+        tipo_pontos = np.float64 if origem is None else np.float32
+        
+        shm_pontos = criar_bloco(total * 3 * np.dtype(tipo_pontos).itemsize)
+        shm_cores = criar_bloco(total * self.largura_cores)
+        self._memorias_compartilhadas.extend([shm_pontos, shm_cores])
+        
+        try:
+            # spawn: fork depois que pyproj/laszip iniciaram threads pode travar os workers
+            with ProcessPoolExecutor(max_workers=num_workers,
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_inicializar_worker_leitura,
+                                     initargs=(self.diretorio_ept, self.modo_transformacao,
+                                               self.erro_maximo_aproximacao, self.atributos)) as pool:
+                futures = [
+                    pool.submit(_processar_arquivo_em_memoria_compartilhada, arquivo_laz, inicio,
+                                capacidade, total, shm_pontos.name, shm_cores.name, origem, pontos_por_chunk)
+                    for arquivo_laz, inicio, capacidade in zip(arquivos_laz, inicios, capacidades)
+                ]
+                
+                gravados = []
+                for i, (arquivo_laz, future) in enumerate(zip(arquivos_laz, futures), 1):
+                    gravados.append(future.result())
+                    print(f"Arquivo {i}/{len(arquivos_laz)} processado: {arquivo_laz.name}")
+        except BaseException:
+            self._memorias_compartilhadas = [shm for shm in self._memorias_compartilhadas
+                                             if shm not in (shm_pontos, shm_cores)]
+            soltar_blocos([shm_pontos, shm_cores])
+            raise
+        
+        pontos = np.ndarray((total, 3), dtype=tipo_pontos, buffer=shm_pontos.buf)
+        cores = np.ndarray((total, self.largura_cores), dtype=np.uint8, buffer=shm_cores.buf)
+        
+        destino = self._compactar_lacunas(pontos, cores, inicios, gravados)
+        return pontos[:destino], cores[:destino]
+    
+    def liberar_memoria_compartilhada(self):
+        # tira do /dev/shm os blocos dos arrays retornados; os blocos continuam abertos
+        # (fechá-los desfaria o mapeamento sob os arrays) até o extractor ser coletado
+        apagar_blocos(self._memorias_compartilhadas)
+    
+    def _alocar_saida(self, shape, dtype, compartilhado: bool) -> np.ndarray:
+        # com compartilhado os arrays já nascem num bloco que os workers de tiles anexam, sem cópia depois
+        if not compartilhado:
+            return np.empty(shape, dtype=dtype)
+        array, shm = array_compartilhado(shape, dtype)
+        self._memorias_compartilhadas.append(shm)
+        return array
+    
+    def processar_todos_arquivos_laz(self, num_workers: int = 1,
+                                     compartilhado: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        arquivos_laz = self.listar_arquivos_laz()
+        
+        print(f"Encontrados {len(arquivos_laz)} arquivos LAZ")
+        
+        if num_workers > 1 and len(arquivos_laz) > 1:
+            print(f"Leitura paralela com {num_workers} processos")
+            pontos_combinados, cores_combinadas = self._processar_arquivos_paralelo(arquivos_laz, num_workers)
+        else:
+            todos_pontos = []
+            todas_cores = []
+            
+            for i, arquivo_laz in enumerate(arquivos_laz, 1):
+                print(f"Processando arquivo {i}/{len(arquivos_laz)}: {arquivo_laz.name}")
+                
+                pontos, cores = self.processar_arquivo_laz(arquivo_laz)
+                
+                if pontos is not None and cores is not None:
+                    todos_pontos.append(pontos)
+                    todas_cores.append(cores)
+            
+            if not todos_pontos:
+                raise ValueError("Nenhum arquivo LAZ válido foi processado!")
+            
+            # combina todos os pontos e cores
+            total = sum(len(pontos) for pontos in todos_pontos)
+            pontos_combinados = np.concatenate(
+                todos_pontos, out=self._alocar_saida((total, 3), todos_pontos[0].dtype, compartilhado))
+            cores_combinadas = np.concatenate(
+                todas_cores, out=self._alocar_saida((total, self.largura_cores), np.uint8, compartilhado))
         
         print(f"Total de pontos carregados: {len(pontos_combinados):,}")
         
@@ -133,5 +441,113 @@ class LAZExtractor:
         
         return pontos_combinados, cores_combinadas
     
+    def processar_todos_arquivos_laz_baixa_memoria(self, num_workers: int = 1,
+                                                   pontos_por_chunk: int = 250_000,
+                                                   compartilhado: bool = False
+                                                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Ingestão de baixa memória: os buffers finais são alocados uma vez pelas
+        contagens dos cabeçalhos e preenchidos bloco a bloco, sem np.vstack no fim.
+        As posições ficam em float32 relativas a uma origem ECEF float64 (o centro
+        dos bounds estimados), 15 bytes por ponto em vez de 27. Retorna pontos,
+        cores e a origem, que o generator soma de volta ao gravar os tiles. Com
+        compartilhado os buffers já são os blocos que os workers de tiles anexam.
+        """
+        arquivos_laz = self.listar_arquivos_laz()
+        
+        print(f"Encontrados {len(arquivos_laz)} arquivos LAZ")
+        
+        cabecalhos = self.ler_cabecalhos_laz(arquivos_laz)
+        min_ecef, max_ecef = self.estimar_bounds_ecef(cabecalhos)
+        origem = (min_ecef + max_ecef) / 2.0
+        
+        # espaçamento entre floats32 vizinhos no ponto mais distante da origem
+        resolucao = float(np.spacing(np.float32(np.max(max_ecef - origem))))
+        print(f"Ingestão de baixa memória: float32 relativo à origem "
+              f"[{origem[0]:.2f}, {origem[1]:.2f}, {origem[2]:.2f}], resolução de {resolucao * 1000:.2f} mm")
+        
+        if num_workers > 1 and len(arquivos_laz) > 1:
+            print(f"Leitura paralela com {num_workers} processos")
+            pontos, cores = self._processar_arquivos_paralelo(arquivos_laz, num_workers, origem, pontos_por_chunk)
+        else:
+            inicios, capacidades, total = self._faixas_dos_arquivos(cabecalhos)
+            pontos = self._alocar_saida((total, 3), np.float32, compartilhado)
+            cores = self._alocar_saida((total, self.largura_cores), np.uint8, compartilhado)
+            
+            gravados = []
+            for i, (arquivo_laz, inicio, capacidade) in enumerate(zip(arquivos_laz, inicios, capacidades), 1):
+                print(f"Processando arquivo {i}/{len(arquivos_laz)}: {arquivo_laz.name}")
+                gravados.append(self._ler_arquivo_em_buffers(
+                    arquivo_laz, pontos[inicio:inicio + capacidade], cores[inicio:inicio + capacidade],
+                    origem, pontos_por_chunk
+                ))
+            
+            destino = self._compactar_lacunas(pontos, cores, inicios, gravados)
+            pontos, cores = pontos[:destino], cores[:destino]
+        
+        print(f"Total de pontos carregados: {len(pontos):,}")
+        
+        min_coords = np.min(pontos, axis=0) + origem
+        max_coords = np.max(pontos, axis=0) + origem
+        print(f"Bounds ECEF:")
+        print(f"  Min: [{min_coords[0]:.2f}, {min_coords[1]:.2f}, {min_coords[2]:.2f}]")
+        print(f"  Max: [{max_coords[0]:.2f}, {max_coords[1]:.2f}, {max_coords[2]:.2f}]")
+        
+        return pontos, cores, origem
+    
     def obter_bounds_globais(self, pontos: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
-        return np.min(pontos, axis=0), np.max(pontos, axis=0)
\ No newline at end of file
+        return np.min(pontos, axis=0), np.max(pontos, axis=0)
+
+
+# extractor de cada processo do pool de leitura, criado uma vez por processo
+_extractor_worker = None
+
+
+def _inicializar_worker_leitura(diretorio_ept: Path, modo_transformacao: str, erro_maximo_aproximacao: float,
+                                atributos: tuple = ()):
+    global _extractor_worker
+    # uma thread de reprojeção por worker: os processos do pool já ocupam os núcleos
+    _extractor_worker = LAZExtractor(diretorio_ept, modo_transformacao, erro_maximo_aproximacao,
+                                     atributos=atributos)
+
+
+def _processar_arquivo_em_memoria_compartilhada(arquivo_laz: Path, inicio: int, capacidade: int, total: int,
+                                                nome_pontos: str, nome_cores: str, origem: np.ndarray = None,
+                                                pontos_por_chunk: int = None) -> int:
+    # processa um arquivo no worker e grava o resultado na faixa [inicio, inicio + capacidade)
+    if origem is not None:
+        # baixa memória: lê em blocos direto para a faixa, em float32 relativo à origem
+        shm_pontos = shared_memory.SharedMemory(name=nome_pontos)
+        shm_cores = shared_memory.SharedMemory(name=nome_cores)
+        try:
+            destino_pontos = np.ndarray((total, 3), dtype=np.float32, buffer=shm_pontos.buf)
+            destino_cores = np.ndarray((total, _extractor_worker.largura_cores), dtype=np.uint8,
+                                       buffer=shm_cores.buf)
+            n = _extractor_worker._ler_arquivo_em_buffers(
+                arquivo_laz, destino_pontos[inicio:inicio + capacidade],
+                destino_cores[inicio:inicio + capacidade], origem, pontos_por_chunk
+            )
+            del destino_pontos, destino_cores
+        finally:
+            shm_pontos.close()
+            shm_cores.close()
+        return n
+    
+    pontos, cores = _extractor_worker.processar_arquivo_laz(arquivo_laz)
+    if pontos is None or cores is None:
+        return 0
+    
+    n = min(len(pontos), capacidade)
+    shm_pontos = shared_memory.SharedMemory(name=nome_pontos)
+    shm_cores = shared_memory.SharedMemory(name=nome_cores)
+    try:
+        destino_pontos = np.ndarray((total, 3), dtype=np.float64, buffer=shm_pontos.buf)
+        destino_cores = np.ndarray((total, _extractor_worker.largura_cores), dtype=np.uint8, buffer=shm_cores.buf)
+        destino_pontos[inicio:inicio + n] = pontos[:n]
+        destino_cores[inicio:inicio + n] = cores[:n]
+        del destino_pontos, destino_cores
+    finally:
+        shm_pontos.close()
+        shm_cores.close()
+    
+    return n
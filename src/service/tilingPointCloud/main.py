@@ -1,25 +1,119 @@
+import json
 from pathlib import Path
 from lazExtractor import LAZExtractor
-from tilesGenerator import TileGenerator
-from tilesGeneratorQuality import TileGeneratorQuality
-
-def main():
-    DIRETORIO_EPT = Path("/assets")
-
-    MAXIMO_PONTOS_POR_TILE = 25000
-    MAX_NIVEIS_OCTREE = 6
-    
-    print("Lendo dados dos arquivos LAZ...")
-    processor = LAZExtractor(DIRETORIO_EPT)
-    todos_pontos, todas_cores = processor.processar_todos_arquivos_laz()
-    
-    generator = TileGeneratorQuality(
-        max_points_per_tile=MAXIMO_PONTOS_POR_TILE,
-        max_levels=MAX_NIVEIS_OCTREE
+from streamingTiler import StreamingTiler
+from eptTiler import EPTTiler
+from incrementalTiler import IncrementalTiler
+from metricasBuild import build_instrumentado
+from configuracaoBuild import GENERATORS, OPCOES_LEITURA, configuracao_da_linha_de_comando
+from estimativaBuild import estimar_build, imprimir_estimativa
+from filtragemPontos import FiltroPontos
+from observadorEpt import ObservadorEPT
+
+def criar_generator(config, output_dir=None):
+    # output_dir sobrescreve diretorio_saida (o modo contínuo grava na área de publicação)
+    parametros_generator = {}
+    if output_dir is not None:
+        parametros_generator["output_dir"] = Path(output_dir)
+    elif config["diretorio_saida"] is not None:
+        parametros_generator["output_dir"] = Path(config["diretorio_saida"])
+    return GENERATORS[config["generator"]](
+        max_points_per_tile=config["max_pontos_por_tile"],
+        max_levels=config["max_niveis_octree"],
+        divisao=config["divisao"],
+        volume_limite=config["volume_limite"],
+        num_workers=config["workers_tiles"],
+        lod=config["lod"],
+        formato_posicao=config["formato_posicao"],
+        formato_cor=config["formato_cor"],
+        compressao=tuple(config["compressao"]),
+        atributos=tuple(config["atributos"]),
+        normais=config["normais"],
+        indice_espacial=config["indice_espacial"],
+        limite_lote_escrita=config["limite_lote_escrita"],
+        tiling_implicito=config["tiling_implicito"],
+        niveis_subarvore=config["niveis_subarvore"],
+        niveis_por_tileset=config["niveis_por_tileset_externo"],
+        **parametros_generator
+    )
+
+def main(argv=None):
+    # opções e padrões em configuracaoBuild.OPCOES; veja python main.py --help
+    config, acoes = configuracao_da_linha_de_comando(argv)
+
+    if acoes["mostrar_config"]:
+        print(json.dumps(config, indent=2, ensure_ascii=False))
+        return
+
+    processor = LAZExtractor(
+        Path(config["diretorio_ept"]),
+        modo_transformacao=config["modo_transformacao"],
+        erro_maximo_aproximacao=config["erro_maximo_plano_tangente"],
+        threads_transformacao=config["threads_transformacao"],
+        atributos=tuple(config["atributos"])
     )
-    
-    tileset = generator.gerar_tileset(todos_pontos, todas_cores)
-    generator.salvar_tileset_json(tileset)
+
+    generator = criar_generator(config)
+
+    if acoes["dry_run"]:
+        imprimir_estimativa(estimar_build(
+            processor, generator, config["modo_ingestao"],
+            profundidade_maxima_ept=config["profundidade_maxima_ept"],
+            ingestao_baixa_memoria=config["ingestao_baixa_memoria"]
+        ))
+        return
+
+    # deduplicação e outliers entre a leitura e o generator (desligados sem resolucao/celula)
+    filtro = FiltroPontos(config["resolucao_deduplicacao"], config["celula_outliers"], config["desvios_outliers"])
+
+    diretorio_metricas = Path(config["diretorio_metricas"]) if config["diretorio_metricas"] is not None else None
+    if acoes["observar"]:
+        # modo contínuo do incremental: cada lote novo de LAZ vira uma nova versão publicada do tileset
+        observador = ObservadorEPT(
+            processor, lambda output_dir: criar_generator(config, output_dir), generator.output_dir,
+            nivel_particao=config["nivel_particao_incremental"], intervalo=config["intervalo_observacao"],
+            espera=config["espera_observacao"], diretorio_metricas=diretorio_metricas
+        )
+        try:
+            observador.executar()
+        except KeyboardInterrupt:
+            print("Observador encerrado")
+        return
+
+    modo_ingestao = config["modo_ingestao"]
+    with build_instrumentado(diretorio_metricas, perfil_amostragem=config["perfil_amostragem"]):
+        if modo_ingestao == "streaming":
+            tiler = StreamingTiler(processor, generator, limite_memoria_mb=config["limite_memoria_mb"], filtro=filtro)
+            tileset = tiler.gerar_tileset()
+        elif modo_ingestao == "hierarquia_ept":
+            tiler = EPTTiler(processor, generator, profundidade_maxima=config["profundidade_maxima_ept"])
+            tileset = tiler.gerar_tileset()
+        elif modo_ingestao == "incremental":
+            tiler = IncrementalTiler(processor, generator, nivel_particao=config["nivel_particao_incremental"])
+            tileset = tiler.gerar_tileset(forcar_regeneracao=config["forcar_regeneracao"])
+        else:
+            print("Lendo dados dos arquivos LAZ...")
+            # com workers de tiles a leitura já grava em memória compartilhada, que o particionador
+            # reordena ali mesmo em vez de copiar a nuvem inteira para outro bloco
+            compartilhado = generator.num_workers > 1
+            if config["ingestao_baixa_memoria"]:
+                todos_pontos, todas_cores, generator.origem = processor.processar_todos_arquivos_laz_baixa_memoria(
+                    num_workers=config["workers_leitura"], compartilhado=compartilhado
+                )
+            else:
+                todos_pontos, todas_cores = processor.processar_todos_arquivos_laz(
+                    num_workers=config["workers_leitura"], compartilhado=compartilhado
+                )
+            if filtro.ativo:
+                todos_pontos, todas_cores = filtro.filtrar(todos_pontos, todas_cores)
+            # o TileGeneratorQuality só reaproveita a saída gerada com a mesma leitura e as mesmas opções
+            generator.parametros_leitura = {chave: config[chave] for chave in OPCOES_LEITURA}
+            tileset = generator.gerar_tileset(todos_pontos, todas_cores,
+                                              forcar_regeneracao=config["forcar_regeneracao"])
+            del todos_pontos, todas_cores
+            processor.liberar_memoria_compartilhada()
+
+        generator.salvar_tileset_json(tileset)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
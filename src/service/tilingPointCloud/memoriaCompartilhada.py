@@ -0,0 +1,69 @@
+import numpy as np
+import weakref
+from multiprocessing import shared_memory
+from typing import Iterable, Optional, Tuple
+
+# blocos criados por este processo e ainda abertos, pelo nome
+_blocos = weakref.WeakValueDictionary()
+
+
+def criar_bloco(tamanho: int) -> shared_memory.SharedMemory:
+    """
+    Cria um bloco de memória compartilhada e o registra, para que
+    localizar_bloco encontre os arrays montados sobre ele. O nome fica no
+    /dev/shm até apagar_blocos ou soltar_blocos: outros processos anexam o
+    bloco por ele.
+    """
+    shm = shared_memory.SharedMemory(create=True, size=max(1, tamanho))
+    _blocos[shm.name] = shm
+    return shm
+
+
+def array_compartilhado(shape, dtype) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+    # array novo dentro de um bloco próprio; o bloco vai junto para ser solto depois
+    shm = criar_bloco(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf), shm
+
+
+def localizar_bloco(array: np.ndarray) -> Optional[Tuple[str, int]]:
+    # nome do bloco que contém o array e a posição dele em bytes, se o array for contíguo dentro de um bloco
+    if not array.flags.c_contiguous or array.nbytes == 0:
+        return None
+    endereco = array.__array_interface__["data"][0]
+    for nome, shm in list(_blocos.items()):
+        if shm.buf is None:
+            continue
+        inicio = np.frombuffer(shm.buf, dtype=np.uint8).__array_interface__["data"][0]
+        if inicio <= endereco and endereco + array.nbytes <= inicio + shm.size:
+            return nome, endereco - inicio
+    return None
+
+
+def apagar_blocos(blocos: Iterable[shared_memory.SharedMemory]):
+    # tira os nomes do /dev/shm; quem já mapeou os blocos continua com eles até fechá-los
+    for shm in blocos:
+        _blocos.pop(shm.name, None)
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def soltar_blocos(blocos: Iterable[shared_memory.SharedMemory], apagar: bool = True):
+    """
+    Fecha os blocos e, com apagar, tira os nomes do /dev/shm. Fechar desfaz
+    o mapeamento mesmo com arrays ainda apontando para ele, então só serve
+    para quem sabe que nenhum array do bloco sobrou.
+    """
+    blocos = list(blocos)
+    for shm in blocos:
+        try:
+            shm.close()
+        except BufferError:
+            # ainda há exportações do buffer; o mapeamento é solto quando elas acabarem
+            pass
+    if apagar:
+        apagar_blocos(blocos)
+    else:
+        for shm in blocos:
+            _blocos.pop(shm.name, None)
@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import signal
+import shutil
+import threading
+import contextlib
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+# caminho do log JSON lines; vai pelo ambiente para que os workers (spawn) gravem no mesmo arquivo
+VARIAVEL_LOG_METRICAS = "TILER_METRICAS_JSONL"
+
+_arquivo_log = None
+_pid_arquivo_log = None
+_trava_log = threading.Lock()
+
+
+def configurar_metricas(caminho_jsonl: Path):
+    # começa um log novo para o build; os processos criados depois herdam o caminho
+    caminho_jsonl = Path(caminho_jsonl)
+    caminho_jsonl.parent.mkdir(parents=True, exist_ok=True)
+    caminho_jsonl.write_text("")
+    os.environ[VARIAVEL_LOG_METRICAS] = str(caminho_jsonl)
+
+
+def encerrar_metricas():
+    # fecha o log deste processo; etapas medidas depois disso não gravam nada
+    global _arquivo_log, _pid_arquivo_log
+    with _trava_log:
+        if _arquivo_log is not None:
+            _arquivo_log.close()
+        _arquivo_log = _pid_arquivo_log = None
+    os.environ.pop(VARIAVEL_LOG_METRICAS, None)
+
+
+def _memoria_bytes() -> Tuple[int, int]:
+    # RSS atual e pico (VmHWM) do processo
+    rss = pico = 0
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    rss = int(linha.split()[1]) * 1024
+                elif linha.startswith("VmHWM:"):
+                    pico = int(linha.split()[1]) * 1024
+    except OSError:
+        pass
+    return rss, pico
+
+
+def _gravar_linha(registro: dict):
+    global _arquivo_log, _pid_arquivo_log
+    with _trava_log:
+        # um arquivo aberto por processo, em modo append: cada linha vai inteira em um write
+        if _arquivo_log is None or _pid_arquivo_log != os.getpid():
+            _arquivo_log = open(os.environ[VARIAVEL_LOG_METRICAS], 'a', buffering=1)
+            _pid_arquivo_log = os.getpid()
+        _arquivo_log.write(json.dumps(registro, separators=(',', ':')) + "\n")
+
+
+@contextlib.contextmanager
+def etapa(nome: str, pontos: int = 0, bytes_escritos: int = 0):
+    """
+    Mede uma etapa do build e grava uma linha no log: duração, pontos, bytes
+    escritos e memória do processo ao fim. O bloco recebe o dicionário de
+    contadores e pode preenchê-lo quando os valores só são conhecidos depois.
+    Sem configurar_metricas a etapa não mede nada.
+    """
+    contadores = {"pontos": pontos, "bytes": bytes_escritos}
+    if VARIAVEL_LOG_METRICAS not in os.environ:
+        yield contadores
+        return
+
+    inicio = time.perf_counter()
+    try:
+        yield contadores
+    finally:
+        duracao = time.perf_counter() - inicio
+        rss, pico = _memoria_bytes()
+        _gravar_linha({
+            "ts": round(time.time(), 3),
+            "pid": os.getpid(),
+            "etapa": nome,
+            "duracao_s": round(duracao, 6),
+            "pontos": int(contadores["pontos"]),
+            "bytes": int(contadores["bytes"]),
+            "rss_bytes": rss,
+            "pico_rss_bytes": pico
+        })
+
+
+def resumir_metricas(caminho_jsonl: Path) -> Dict[str, dict]:
+    # soma as linhas do log por etapa, de todos os processos
+    resumo = {}
+    with open(caminho_jsonl, 'r') as f:
+        for linha in f:
+            if not linha.strip():
+                continue
+            registro = json.loads(linha)
+            total = resumo.setdefault(registro["etapa"], {
+                "execucoes": 0, "duracao_s": 0.0, "pontos": 0, "bytes": 0, "pico_rss_bytes": 0, "processos": set()
+            })
+            total["execucoes"] += 1
+            total["duracao_s"] += registro["duracao_s"]
+            total["pontos"] += registro["pontos"]
+            total["bytes"] += registro["bytes"]
+            total["pico_rss_bytes"] = max(total["pico_rss_bytes"], registro["pico_rss_bytes"])
+            total["processos"].add(registro["pid"])
+
+    for total in resumo.values():
+        total["processos"] = len(total["processos"])
+    return resumo
+
+
+def salvar_prometheus(caminho_prom: Path, resumo: Dict[str, dict], duracao_build: float):
+    """
+    Grava as métricas no formato de textfile do node_exporter. O arquivo é
+    escrito ao lado e renomeado, para o coletor nunca ler um arquivo pela metade.
+    """
+    metricas = [
+        ("tiler_etapa_segundos_total", "counter", "duracao_s",
+         "Tempo gasto na etapa, somado entre os processos"),
+        ("tiler_etapa_execucoes_total", "counter", "execucoes", "Quantas vezes a etapa foi executada"),
+        ("tiler_etapa_pontos_total", "counter", "pontos", "Pontos processados pela etapa"),
+        ("tiler_etapa_bytes_total", "counter", "bytes", "Bytes gravados pela etapa"),
+        ("tiler_etapa_pico_rss_bytes", "gauge", "pico_rss_bytes",
+         "Maior pico de memória residente de um processo ao fim da etapa")
+    ]
+    linhas = []
+    for nome, tipo, campo, descricao in metricas:
+        linhas.append(f"# HELP {nome} {descricao}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for etapa_nome in sorted(resumo):
+            linhas.append(f'{nome}{{etapa="{etapa_nome}"}} {resumo[etapa_nome][campo]}')
+    linhas.append("# HELP tiler_build_duracao_segundos Duração do último build")
+    linhas.append("# TYPE tiler_build_duracao_segundos gauge")
+    linhas.append(f"tiler_build_duracao_segundos {duracao_build:.3f}")
+    linhas.append("# HELP tiler_build_fim_timestamp_segundos Fim do último build (unix)")
+    linhas.append("# TYPE tiler_build_fim_timestamp_segundos gauge")
+    linhas.append(f"tiler_build_fim_timestamp_segundos {time.time():.0f}")
+
+    caminho_prom = Path(caminho_prom)
+    caminho_prom.parent.mkdir(parents=True, exist_ok=True)
+    temporario = caminho_prom.with_name(caminho_prom.name + ".tmp")
+    with open(temporario, 'w') as f:
+        f.write("\n".join(linhas) + "\n")
+    os.replace(temporario, caminho_prom)
+
+
+def imprimir_resumo(resumo: Dict[str, dict], duracao_build: float):
+    print(f"Métricas do build ({duracao_build:.1f} s):")
+    for nome, total in sorted(resumo.items(), key=lambda item: -item[1]["duracao_s"]):
+        print(f"  {nome:<18} {total['duracao_s']:>10.2f} s  {total['execucoes']:>8} execuções  "
+              f"{total['pontos']:>14,} pontos  {total['bytes']:>16,} bytes  "
+              f"pico {total['pico_rss_bytes'] / 2 ** 20:,.0f} MB")
+
+
+def iniciar_perfil_amostragem(destino: Path) -> Optional[Callable[[], None]]:
+    """
+    Liga o py-spy (profiler por amostragem, opcional: pip install py-spy) no
+    processo atual e nos workers, gravando um flamegraph SVG em 'destino' quando
+    a função retornada é chamada. Dentro do Docker o container precisa de
+    CAP_SYS_PTRACE. Sem o py-spy retorna None.
+    """
+    py_spy = shutil.which("py-spy")
+    if py_spy is None:
+        print("py-spy não encontrado - perfil por amostragem desativado")
+        return None
+
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    processo = subprocess.Popen(
+        [py_spy, "record", "--pid", str(os.getpid()), "--subprocesses", "--rate", "100",
+         "--format", "flamegraph", "--output", str(destino)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    def parar():
+        # com SIGINT o py-spy para de amostrar e grava o flamegraph
+        processo.send_signal(signal.SIGINT)
+        try:
+            processo.wait(timeout=120)
+            print(f"Flamegraph salvo em: {destino}")
+        except subprocess.TimeoutExpired:
+            processo.kill()
+            print("py-spy não terminou a tempo - flamegraph descartado")
+
+    return parar
+
+
+@contextlib.contextmanager
+def build_instrumentado(diretorio_metricas: Optional[Path], perfil_amostragem: bool = False):
+    """
+    Envolve um build inteiro: abre o log de métricas em diretorio_metricas
+    (build.jsonl), opcionalmente liga o perfil por amostragem e, ao fim, grava
+    o resumo por etapa em tiler.prom. Com diretorio_metricas=None não faz nada.
+    """
+    if diretorio_metricas is None:
+        yield
+        return
+
+    diretorio_metricas = Path(diretorio_metricas)
+    caminho_jsonl = diretorio_metricas / "build.jsonl"
+    configurar_metricas(caminho_jsonl)
+    parar_perfil = iniciar_perfil_amostragem(diretorio_metricas / "flamegraph.svg") if perfil_amostragem else None
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        if parar_perfil is not None:
+            parar_perfil()
+        duracao = time.perf_counter() - inicio
+        encerrar_metricas()
+        resumo = resumir_metricas(caminho_jsonl)
+        salvar_prometheus(diretorio_metricas / "tiler.prom", resumo, duracao)
+        imprimir_resumo(resumo, duracao)
+        print(f"Métricas salvas em: {caminho_jsonl} e {diretorio_metricas / 'tiler.prom'}")
@@ -0,0 +1,166 @@
+import json
+import numpy as np
+import laspy
+from pathlib import Path
+from typing import Dict, Tuple
+
+DISTRIBUICOES = ("terreno_plano", "dossel_denso", "outliers_esparsos")
+
+EPSG_SINTETICO = 31983
+# canto sudoeste do levantamento sintético (UTM 23S)
+ORIGEM_SINTETICA = np.array([300000.0, 7400000.0, 700.0])
+# altura do cubo de um nó folha que contém terreno e dossel
+ALTURA_MAXIMA_SUPERFICIE = 64.0
+NOME_PARAMETROS = "sintetico.json"
+
+
+def _superficie(x: np.ndarray, y: np.ndarray, lado: float) -> np.ndarray:
+    # relevo suave: duas ondulações longas e uma curta, até ~8 m de amplitude
+    u, v = x / lado, y / lado
+    return 4.0 + 2.5 * np.sin(2 * np.pi * u) * np.cos(2 * np.pi * v) + 1.0 * np.sin(7 * np.pi * (u + v)) \
+        + 0.4 * np.cos(23 * np.pi * u)
+
+
+def _altura_dossel(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # copas de ~8 m de diâmetro em grade irregular, de 12 a 28 m de altura
+    fase = np.sin(x * 0.79) * np.cos(y * 0.71) + np.sin((x + y) * 0.37)
+    return 20.0 + 8.0 * np.clip(fase, -1.0, 1.0)
+
+
+def _cores(rng: np.random.Generator, classes: np.ndarray) -> np.ndarray:
+    # RGB 16-bit como no LAS: solo marrom, vegetação verde, ruído claro
+    base = np.array([[0, 0, 0], [0, 0, 0], [120, 95, 70], [0, 0, 0], [0, 0, 0], [60, 120, 50], [0, 0, 0],
+                     [220, 220, 220]], dtype=np.float64)
+    cores = base[classes] + rng.normal(0, 12, (len(classes), 3))
+    return (np.clip(cores, 0, 255) * 257).astype(np.uint16)
+
+
+def _pontos_do_no(rng: np.random.Generator, distribuicao: str, minimo: np.ndarray, maximo: np.ndarray,
+                  quantidade: int, lado: float, so_ruido: bool) -> Tuple[np.ndarray, np.ndarray]:
+    x = rng.uniform(minimo[0], maximo[0], quantidade)
+    y = rng.uniform(minimo[1], maximo[1], quantidade)
+    relativo_x, relativo_y = x - ORIGEM_SINTETICA[0], y - ORIGEM_SINTETICA[1]
+    solo = ORIGEM_SINTETICA[2] + _superficie(relativo_x, relativo_y, lado)
+    z = solo + rng.normal(0, 0.05, quantidade)
+    classes = np.full(quantidade, 2, dtype=np.uint8)
+
+    if distribuicao == "dossel_denso":
+        # 70% dos retornos na copa, concentrados perto do topo
+        copa = rng.random(quantidade) < 0.7
+        topo = _altura_dossel(relativo_x[copa], relativo_y[copa])
+        z[copa] = solo[copa] + np.maximum(topo - rng.exponential(3.0, int(copa.sum())), 0.5)
+        classes[copa] = 5
+
+    if distribuicao == "outliers_esparsos":
+        # 1% de ruído espalhado pelo cubo do nó (pássaros, multipercurso); nós acima do solo só têm ruído
+        ruido = np.ones(quantidade, dtype=bool) if so_ruido else rng.random(quantidade) < 0.01
+        z[ruido] = rng.uniform(minimo[2], maximo[2], int(ruido.sum()))
+        classes[ruido] = 7
+
+    return np.column_stack([x, y, np.clip(z, minimo[2], maximo[2])]), classes
+
+
+def _gravar_laz(caminho: Path, pontos: np.ndarray, classes: np.ndarray, rng: np.random.Generator):
+    header = laspy.LasHeader(point_format=3, version="1.2")
+    header.scales = [0.001, 0.001, 0.001]
+    header.offsets = ORIGEM_SINTETICA
+    las = laspy.LasData(header)
+    las.x, las.y, las.z = pontos[:, 0], pontos[:, 1], pontos[:, 2]
+    cores = _cores(rng, classes)
+    las.red, las.green, las.blue = cores[:, 0], cores[:, 1], cores[:, 2]
+    las.classification = classes
+    las.intensity = rng.integers(200, 3000, len(pontos)).astype(np.uint16)
+    las.return_number = np.ones(len(pontos), dtype=np.uint8)
+    las.number_of_returns = np.ones(len(pontos), dtype=np.uint8)
+    las.write(caminho)
+
+
+def _planejar_nos(total_pontos: int, pontos_por_no: int, distribuicao: str,
+                  rng: np.random.Generator) -> Tuple[int, Dict[str, int]]:
+    """
+    Nós da hierarquia e quantos pontos cada um recebe. Como num EPT de terreno,
+    cada nível tem 4x os nós (e os pontos) do anterior, então todos os nós da
+    camada do solo (Z=0) ficam com a mesma quantidade. Com outliers alguns nós
+    acima do solo (Z=1) recebem só ruído.
+    """
+    profundidade = 0
+    while sum(4 ** d for d in range(profundidade + 1)) * pontos_por_no < total_pontos:
+        profundidade += 1
+
+    nos_solo = [(d, x, y) for d in range(profundidade + 1) for x in range(2 ** d) for y in range(2 ** d)]
+    por_no = total_pontos // len(nos_solo)
+    contagens = {f"{d}-{x}-{y}-0": por_no for d, x, y in nos_solo}
+    # o resto da divisão vai para a raiz, para o total ser exato
+    contagens["0-0-0-0"] += total_pontos - por_no * len(nos_solo)
+
+    if distribuicao == "outliers_esparsos":
+        for d in range(1, profundidade + 1):
+            for x, y in rng.integers(0, 2 ** d, (max(1, 4 ** d // 16), 2)).tolist():
+                contagens.setdefault(f"{d}-{x}-{y}-1", max(1, por_no // 1000))
+
+    return profundidade, contagens
+
+
+def gerar_ept_sintetico(destino: Path, total_pontos: int, distribuicao: str = "terreno_plano",
+                        pontos_por_no: int = 500_000, semente: int = 0) -> Path:
+    """
+    Grava em 'destino' um EPT sintético (ept.json, ept-hierarchy/ e um LAZ por
+    nó em ept-data/) com total_pontos pontos na distribuição pedida. Os nós são
+    gerados um de cada vez, então a memória não depende do tamanho da nuvem.
+    Se 'destino' já tiver um EPT gerado com os mesmos parâmetros nada é refeito.
+    """
+    if distribuicao not in DISTRIBUICOES:
+        raise ValueError(f"Distribuição inválida: {distribuicao}")
+
+    destino = Path(destino)
+    parametros = {"total_pontos": total_pontos, "distribuicao": distribuicao,
+                  "pontos_por_no": pontos_por_no, "semente": semente}
+    parametros_path = destino / NOME_PARAMETROS
+    if parametros_path.exists():
+        with open(parametros_path, 'r') as f:
+            if json.load(f) == parametros:
+                print(f"EPT sintético já existe em: {destino}")
+                return destino
+
+    # sem o arquivo de parâmetros uma geração interrompida não é confundida com uma completa
+    parametros_path.unlink(missing_ok=True)
+    rng = np.random.default_rng(semente)
+    profundidade, contagens = _planejar_nos(total_pontos, pontos_por_no, distribuicao, rng)
+    # o nó folha de solo precisa ter ao menos ALTURA_MAXIMA_SUPERFICIE de altura
+    lado = max(1024.0, ALTURA_MAXIMA_SUPERFICIE * 2 ** profundidade)
+    bounds = np.concatenate([ORIGEM_SINTETICA, ORIGEM_SINTETICA + lado])
+
+    (destino / "ept-data").mkdir(parents=True, exist_ok=True)
+    (destino / "ept-hierarchy").mkdir(parents=True, exist_ok=True)
+    for antigo in (destino / "ept-data").glob("*.laz"):
+        antigo.unlink()
+
+    print(f"Gerando EPT sintético '{distribuicao}': {total_pontos:,} pontos em {len(contagens)} nós, "
+          f"profundidade {profundidade}")
+    for i, (chave, quantidade) in enumerate(sorted(contagens.items()), 1):
+        d, x, y, z = (int(v) for v in chave.split("-"))
+        tamanho = lado / 2 ** d
+        minimo = bounds[:3] + np.array([x, y, z]) * tamanho
+        pontos, classes = _pontos_do_no(rng, distribuicao, minimo, minimo + tamanho, quantidade, lado, z > 0)
+        _gravar_laz(destino / "ept-data" / f"{chave}.laz", pontos, classes, rng)
+        if i % 50 == 0:
+            print(f"  {i}/{len(contagens)} nós gravados")
+
+    with open(destino / "ept-hierarchy" / "0-0-0-0.json", 'w') as f:
+        json.dump(contagens, f)
+    with open(destino / "ept.json", 'w') as f:
+        json.dump({
+            "version": "1.0.0",
+            "bounds": bounds.tolist(),
+            "boundsConforming": bounds.tolist(),
+            "dataType": "laszip",
+            "hierarchyType": "json",
+            "points": sum(contagens.values()),
+            "span": 128,
+            "srs": {"authority": "EPSG", "horizontal": str(EPSG_SINTETICO)}
+        }, f, indent=2)
+    with open(parametros_path, 'w') as f:
+        json.dump(parametros, f, indent=2)
+
+    return destino
+
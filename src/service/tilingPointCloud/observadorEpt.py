@@ -0,0 +1,183 @@
+import os
+import time
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from lazExtractor import LAZExtractor
+from incrementalTiler import IncrementalTiler
+from metricasBuild import build_instrumentado
+from compressaoTiles import EXTENSOES_COMPRESSAO
+
+# pasta dentro da saída onde cada atualização é montada antes de ser publicada;
+# fica no mesmo sistema de arquivos da saída, para os hardlinks e o os.replace
+NOME_AREA_PUBLICACAO = ".publicacao"
+# tiles nunca são reescritos no lugar: o build incremental grava as subárvores afetadas com
+# nomes novos e os irmãos comprimidos são trocados via arquivo temporário.
+# Por isso podem ser compartilhados por hardlink; o resto (tileset.json, índice,
+# relatórios) é reescrito no lugar e é copiado
+SUFIXOS_COMPARTILHADOS = (".pnts",) + tuple(".pnts" + extensao for extensao in EXTENSOES_COMPRESSAO.values())
+
+
+def _arquivos(diretorio: Path) -> List[Path]:
+    # arquivos da saída, relativos a ela, sem a área de publicação e sem temporários
+    arquivos = []
+    for pasta, subpastas, nomes in os.walk(diretorio):
+        if Path(pasta) == diretorio:
+            subpastas[:] = [s for s in subpastas if s != NOME_AREA_PUBLICACAO]
+        arquivos.extend(Path(pasta, nome).relative_to(diretorio) for nome in nomes if not nome.endswith(".tmp"))
+    return sorted(arquivos)
+
+
+def preparar_area_publicacao(output_dir: Path) -> Path:
+    """
+    Espelha a saída publicada em output_dir/.publicacao, onde a próxima versão
+    do tileset é gerada sem que os viewers vejam nada pela metade. Os tiles
+    entram por hardlink (nenhum byte copiado), os demais arquivos são copiados.
+    """
+    output_dir = Path(output_dir)
+    area = output_dir / NOME_AREA_PUBLICACAO
+    # sobra de uma atualização interrompida
+    shutil.rmtree(area, ignore_errors=True)
+    area.mkdir(parents=True)
+
+    for relativo in _arquivos(output_dir):
+        destino = area / relativo
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        if relativo.name.endswith(SUFIXOS_COMPARTILHADOS):
+            try:
+                os.link(output_dir / relativo, destino)
+                continue
+            except OSError:
+                # sistema de arquivos sem hardlinks: copia
+                pass
+        shutil.copy2(output_dir / relativo, destino)
+    return area
+
+
+def publicar(area: Path, output_dir: Path) -> Tuple[int, int]:
+    """
+    Troca a saída publicada pela versão montada na área de publicação. Os
+    tiles regenerados têm nomes novos (geração da build no nome), então entrar
+    com eles não altera nada que o tileset.json publicado referencia; o
+    tileset.json (e os irmãos comprimidos dele) entra por último com
+    os.replace, que é atômico e é o único ponto de troca de versão, e só
+    depois dele os arquivos que a nova versão não usa mais são apagados. Um
+    viewer sempre lê um tileset.json inteiro e os tiles da mesma versão.
+    Retorna os arquivos trocados e os removidos.
+    """
+    area, output_dir = Path(area), Path(output_dir)
+    novos = _arquivos(area)
+    raiz = sorted((r for r in novos if r.parent == Path(".") and r.name.startswith("tileset.json")),
+                  key=lambda r: (len(r.name), r.name))
+    trocados = 0
+    for relativo in [r for r in novos if r not in raiz] + raiz:
+        origem, destino = area / relativo, output_dir / relativo
+        if destino.exists() and os.path.samefile(origem, destino):
+            continue
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(origem, destino)
+        trocados += 1
+
+    publicados: Set[Path] = set(novos)
+    removidos = 0
+    for relativo in _arquivos(output_dir):
+        if relativo not in publicados:
+            (output_dir / relativo).unlink()
+            removidos += 1
+    # pastas que ficaram vazias (tiling implícito)
+    for pasta, _, _ in sorted(os.walk(output_dir), key=lambda item: -len(item[0])):
+        if Path(pasta) != output_dir and NOME_AREA_PUBLICACAO not in Path(pasta).relative_to(output_dir).parts:
+            if not os.listdir(pasta):
+                os.rmdir(pasta)
+    return trocados, removidos
+
+
+def instantaneo_laz(diretorio_ept: Path) -> Dict[str, Tuple[int, int]]:
+    # tamanho e mtime de cada .laz; um arquivo ainda sendo copiado muda a cada leitura
+    estados = {}
+    for arquivo in Path(diretorio_ept).glob("**/*.laz"):
+        try:
+            estado = arquivo.stat()
+        except FileNotFoundError:
+            continue
+        estados[arquivo.as_posix()] = (estado.st_size, estado.st_mtime_ns)
+    return estados
+
+
+class ObservadorEPT:
+    """
+    Modo contínuo do build incremental: verifica o diretório EPT a cada
+    intervalo segundos e, quando os .laz ficam espera segundos sem mudar
+    (uma cópia em andamento muda tamanho e mtime), roda o IncrementalTiler,
+    que lê só as entradas novas, alteradas ou que dividem subárvores com elas.
+    Cada atualização é gerada numa área de publicação e trocada atomicamente
+    pela saída servida (publicar).
+    """
+
+    def __init__(self, extractor: LAZExtractor, criar_generator: Callable[[Path], object], output_dir: Path,
+                 nivel_particao: int = 2, intervalo: float = 10.0, espera: float = 30.0,
+                 diretorio_metricas: Optional[Path] = None):
+        self.extractor = extractor
+        # um generator novo por atualização, gravando na área de publicação
+        self.criar_generator = criar_generator
+        self.output_dir = Path(output_dir)
+        self.nivel_particao = nivel_particao
+        self.intervalo = intervalo
+        self.espera = espera
+        self.diretorio_metricas = diretorio_metricas
+
+    def atualizar(self) -> bool:
+        # gera e publica uma nova versão do tileset; False se nada mudou
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        area = preparar_area_publicacao(self.output_dir)
+        try:
+            generator = self.criar_generator(area)
+            tiler = IncrementalTiler(self.extractor, generator, nivel_particao=self.nivel_particao,
+                                     reaproveitar_hashes=True, versionar_tiles=True)
+            with build_instrumentado(self.diretorio_metricas):
+                tileset = tiler.gerar_tileset()
+                if tiler.reaproveitado:
+                    return False
+                generator.salvar_tileset_json(tileset)
+            trocados, removidos = publicar(area, self.output_dir)
+            print(f"Nova versão publicada em {self.output_dir}: {trocados} arquivos trocados, {removidos} removidos")
+            return True
+        finally:
+            shutil.rmtree(area, ignore_errors=True)
+
+    def executar(self, ciclos: Optional[int] = None):
+        """
+        Laço do modo contínuo (ciclos=None roda até ser interrompido). Um erro
+        na atualização não derruba o observador: a saída publicada continua a
+        anterior e a mesma entrada só é tentada de novo quando algum .laz mudar.
+        """
+        print(f"Observando {self.extractor.diretorio_ept} a cada {self.intervalo:g} s "
+              f"(atualiza após {self.espera:g} s sem mudanças)")
+        visto = instantaneo_laz(self.extractor.diretorio_ept)
+        ultima_mudanca = time.monotonic()
+        processado = None
+        ciclo = 0
+        while ciclos is None or ciclo < ciclos:
+            ciclo += 1
+            atual = instantaneo_laz(self.extractor.diretorio_ept)
+            if atual != visto:
+                novos = len(set(atual) - set(visto))
+                removidos = len(set(visto) - set(atual))
+                alterados = sum(1 for arquivo in set(atual) & set(visto) if atual[arquivo] != visto[arquivo])
+                print(f"Mudança nos LAZ: {novos} novos, {alterados} alterados, {removidos} removidos")
+                visto = atual
+                ultima_mudanca = time.monotonic()
+
+            if visto != processado and time.monotonic() - ultima_mudanca >= self.espera:
+                processado = visto
+                if not visto:
+                    print(f"Nenhum arquivo LAZ em {self.extractor.diretorio_ept}, aguardando")
+                else:
+                    try:
+                        if not self.atualizar():
+                            print("Nenhuma entrada mudou - tileset publicado mantido")
+                    except Exception as e:
+                        print(f"Erro na atualização, mantendo o tileset publicado: {e}")
+
+            if ciclos is None or ciclo < ciclos:
+                time.sleep(self.intervalo)
@@ -0,0 +1,254 @@
+import numpy as np
+from multiprocessing import shared_memory
+from typing import List, Tuple
+from memoriaCompartilhada import criar_bloco, localizar_bloco, soltar_blocos
+
+# 21 bits por eixo -> 63 bits intercalados cabem em uma chave uint64
+PROFUNDIDADE_MAXIMA_MORTON = 21
+
+# quantidade de pontos processados por bloco ao calcular as chaves
+TAMANHO_BLOCO_CHAVES = 4_000_000
+# pontos olhados para escolher o eixo de corte em dividir_mediana
+PONTOS_ESCOLHA_EIXO = 10_000
+
+
+def _espalhar_bits(valores: np.ndarray) -> np.ndarray:
+    # insere dois bits zero entre cada bit de um inteiro de 21 bits
+    v = valores & np.uint64(0x1FFFFF)
+    v = (v | (v << np.uint64(32))) & np.uint64(0x1F00000000FFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x1F0000FF0000FF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x100F00F00F00F00F)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x10C30C30C30C30C3)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x1249249249249249)
+    return v
+
+
+def calcular_chaves_morton(pontos: np.ndarray, bounds, profundidade: int) -> np.ndarray:
+    """
+    Calcula a chave Morton (Z-order) de cada ponto dentro de bounds, com
+    'profundidade' níveis de subdivisão. O bit 0 de cada trio é o eixo X,
+    o bit 1 o Y e o bit 2 o Z, a mesma convenção dos octantes (i & 1, i & 2, i & 4).
+    """
+    min_bounds = np.asarray(bounds[0], dtype=np.float64)
+    max_bounds = np.asarray(bounds[1], dtype=np.float64)
+    celulas = 1 << profundidade
+    extensao = np.maximum(max_bounds - min_bounds, np.finfo(np.float64).tiny)
+    escala = celulas / extensao
+
+    chaves = np.zeros(len(pontos), dtype=np.uint64)
+    for inicio in range(0, len(pontos), TAMANHO_BLOCO_CHAVES):
+        fim = min(inicio + TAMANHO_BLOCO_CHAVES, len(pontos))
+        bloco = chaves[inicio:fim]
+        for eixo in range(3):
+            indice = np.floor((pontos[inicio:fim, eixo] - min_bounds[eixo]) * escala[eixo])
+            np.clip(indice, 0, celulas - 1, out=indice)
+            bloco |= _espalhar_bits(indice.astype(np.uint64)) << np.uint64(eixo)
+
+    return chaves
+
+
+def calcular_bounds_octante(bounds, octante: int) -> Tuple[np.ndarray, np.ndarray]:
+    # limites do octante 'octante' de bounds
+    min_bounds, max_bounds = bounds
+    center = (min_bounds + max_bounds) / 2.0
+
+    oct_min = min_bounds.copy()
+    oct_max = max_bounds.copy()
+
+    if octante & 1: oct_min[0] = center[0]
+    else: oct_max[0] = center[0]
+
+    if octante & 2: oct_min[1] = center[1]
+    else: oct_max[1] = center[1]
+
+    if octante & 4: oct_min[2] = center[2]
+    else: oct_max[2] = center[2]
+
+    return oct_min, oct_max
+
+
+def _reordenar_para(array: np.ndarray, ordem: np.ndarray, destino: np.ndarray):
+    # aplica a permutação coluna a coluna para manter só uma coluna temporária
+    if array.ndim == 1:
+        destino[:] = array[ordem]
+        return
+    for coluna in range(array.shape[1]):
+        destino[:, coluna] = array[ordem, coluna]
+
+
+def _reordenar_inplace(array: np.ndarray, ordem: np.ndarray):
+    _reordenar_para(array, ordem, array)
+
+
+class ParticionadorMorton:
+    """
+    Ordena os pontos uma única vez pela chave Morton e expõe cada nó da octree
+    como uma fatia contígua [inicio, fim) dos mesmos arrays de pontos e cores.
+    Os arrays recebidos são reordenados in-place. Com compartilhado=True os
+    arrays também ficam legíveis por outros processos: os que já estão num bloco
+    de memoriaCompartilhada (leitura paralela, buckets do streaming) são
+    reordenados ali mesmo e os demais são copiados ordenados para um bloco novo.
+    """
+
+    def __init__(self, pontos: np.ndarray, cores: np.ndarray, bounds,
+                 profundidade: int, nivel_base: int = 0, compartilhado: bool = False):
+        self.profundidade = max(0, min(profundidade, PROFUNDIDADE_MAXIMA_MORTON))
+        self.nivel_base = nivel_base
+        self.bounds = bounds
+        # blocos criados por este particionador, anexados de outro processo, e (nome, posição, shape, dtype)
+        # de chaves, pontos e cores para o descritor
+        self._memorias = []
+        self._anexadas = []
+        self._blocos = []
+
+        chaves = calcular_chaves_morton(pontos, bounds, self.profundidade)
+        ordem = np.argsort(chaves, kind='stable')
+
+        if compartilhado:
+            self.chaves = self._alocar_compartilhado(chaves.shape, chaves.dtype)
+            self.chaves[:] = chaves[ordem]
+            del chaves
+            self.pontos = self._compartilhar(pontos, ordem)
+            self.cores = self._compartilhar(cores, ordem)
+        else:
+            self.chaves = chaves[ordem]
+            del chaves
+            _reordenar_inplace(pontos, ordem)
+            _reordenar_inplace(cores, ordem)
+            self.pontos = pontos
+            self.cores = cores
+        del ordem
+
+    def _alocar_compartilhado(self, shape, dtype) -> np.ndarray:
+        shm = criar_bloco(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        self._memorias.append(shm)
+        self._blocos.append((shm.name, 0, tuple(shape), np.dtype(dtype).str))
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def _compartilhar(self, array: np.ndarray, ordem: np.ndarray) -> np.ndarray:
+        # reordena no próprio bloco quando o array já está em memória compartilhada, sem segunda cópia
+        bloco = localizar_bloco(array)
+        if bloco is None:
+            destino = self._alocar_compartilhado(array.shape, array.dtype)
+            _reordenar_para(array, ordem, destino)
+            return destino
+        _reordenar_inplace(array, ordem)
+        self._blocos.append((bloco[0], bloco[1], array.shape, array.dtype.str))
+        return array
+
+    def descritor(self) -> dict:
+        # dados para outro processo anexar os mesmos arrays ordenados sem copiá-los
+        if not self._blocos:
+            raise ValueError("Particionador não está em memória compartilhada")
+        return {
+            "memorias": list(self._blocos),
+            "bounds": self.bounds,
+            "profundidade": self.profundidade,
+            "nivel_base": self.nivel_base
+        }
+
+    @classmethod
+    def anexar(cls, descritor: dict) -> 'ParticionadorMorton':
+        # reconstrói o particionador em outro processo a partir de descritor()
+        particionador = cls.__new__(cls)
+        particionador.profundidade = descritor["profundidade"]
+        particionador.nivel_base = descritor["nivel_base"]
+        particionador.bounds = descritor["bounds"]
+        particionador._memorias = []
+        particionador._anexadas = []
+        particionador._blocos = list(descritor["memorias"])
+
+        arrays = []
+        for nome, posicao, shape, dtype in descritor["memorias"]:
+            shm = shared_memory.SharedMemory(name=nome)
+            particionador._anexadas.append(shm)
+            arrays.append(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=posicao))
+        particionador.chaves, particionador.pontos, particionador.cores = arrays
+
+        return particionador
+
+    def liberar(self):
+        # fecha os blocos anexados e apaga os criados por este particionador; os
+        # blocos de quem chamou (leitura paralela, buckets) continuam com ele
+        memorias, self._memorias = self._memorias, []
+        anexadas, self._anexadas = self._anexadas, []
+        self._blocos = []
+        self.chaves = self.pontos = self.cores = None
+        soltar_blocos(anexadas, apagar=False)
+        soltar_blocos(memorias)
+
+    def mover_para_frente(self, inicio: int, fim: int, selecionados: np.ndarray) -> int:
+        """
+        Move os pontos marcados em 'selecionados' para o começo de [inicio, fim).
+        A partição é estável, então o restante continua ordenado pela chave e
+        ainda pode ser dividido com dividir(). Retorna quantos foram movidos.
+        """
+        ordem = np.concatenate([np.flatnonzero(selecionados), np.flatnonzero(~selecionados)])
+        for array in (self.chaves, self.pontos, self.cores):
+            array[inicio:fim] = array[inicio:fim][ordem]
+        return int(np.count_nonzero(selecionados))
+
+    def fatia(self, inicio: int, fim: int) -> Tuple[np.ndarray, np.ndarray]:
+        # views (sem cópia) dos pontos e cores de um nó
+        return self.pontos[inicio:fim], self.cores[inicio:fim]
+
+    def dividir(self, inicio: int, fim: int, nivel: int, bounds) -> List[dict]:
+        """
+        Divide o nó [inicio, fim) do nível 'nivel' em até 8 octantes não vazios,
+        usando busca binária nas chaves ordenadas em vez de máscaras.
+        """
+        nivel_relativo = nivel - self.nivel_base
+        if fim <= inicio:
+            return []
+        if nivel_relativo >= self.profundidade:
+            # sem bits restantes na chave: o nó não pode mais ser dividido
+            return [{'inicio': inicio, 'fim': fim, 'bounds': bounds, 'octante': 0}]
+
+        deslocamento = np.uint64(3 * (self.profundidade - nivel_relativo - 1))
+        prefixo = (self.chaves[inicio] >> (deslocamento + np.uint64(3))) << (deslocamento + np.uint64(3))
+        limites = prefixo + (np.arange(1, 8, dtype=np.uint64) << deslocamento)
+
+        cortes = inicio + np.searchsorted(self.chaves[inicio:fim], limites, side='left')
+        inicios = [inicio] + cortes.tolist()
+        fins = cortes.tolist() + [fim]
+
+        octantes = []
+        for i in range(8):
+            if fins[i] > inicios[i]:
+                octantes.append({
+                    'inicio': inicios[i],
+                    'fim': fins[i],
+                    'bounds': calcular_bounds_octante(bounds, i),
+                    'octante': i
+                })
+
+        return octantes
+
+    def dividir_mediana(self, inicio: int, fim: int, partes: int) -> List[dict]:
+        """
+        Divide [inicio, fim) em 'partes' fatias com o mesmo número de pontos
+        (a menos de um), como numa kd-tree: cada grupo é cortado no eixo de
+        maior extensão, na posição proporcional às partes de cada lado. Os
+        pontos são reordenados só dentro de [inicio, fim), que deixa de estar
+        na ordem das chaves Morton.
+        """
+        grupos = [(inicio, fim, max(1, partes))]
+        fatias = []
+        while grupos:
+            a, b, k = grupos.pop()
+            if k == 1 or b - a < 2:
+                fatias.append((a, b))
+                continue
+            pontos = self.pontos[a:b]
+            # a extensão de uma amostra basta para escolher o eixo
+            amostra = pontos[::max(1, (b - a) // PONTOS_ESCOLHA_EIXO)]
+            eixo = int(np.argmax(np.max(amostra, axis=0) - np.min(amostra, axis=0)))
+            k_esquerda = k // 2
+            corte = (b - a) * k_esquerda // k
+            ordem = np.argpartition(pontos[:, eixo], corte)
+            for array in (self.chaves, self.pontos, self.cores):
+                _reordenar_inplace(array[a:b], ordem)
+            grupos.append((a + corte, b, k - k_esquerda))
+            grupos.append((a, a + corte, k_esquerda))
+
+        return [{'inicio': a, 'fim': b, 'octante': i} for i, (a, b) in enumerate(sorted(fatias)) if b > a]
@@ -0,0 +1,115 @@
+import math
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from octreeMorton import ParticionadorMorton
+
+# estado de cada processo do pool de tiles, criado uma vez por processo
+_generator_worker = None
+
+# um pool para o build inteiro: streaming, EPT e incremental constroem uma octree por
+# bucket, nó ou subárvore, e criar um pool spawn para cada uma custaria a importação
+# de todos os workers a cada vez
+_pool_tiles = None
+_generator_pool = None
+
+
+def _inicializar_worker_tiles(generator):
+    global _generator_worker
+    _generator_worker = generator
+
+
+def _construir_subarvore(descritor: dict, max_levels: int, inicio: int, fim: int, nivel: int,
+                         bounds, caminho: str):
+    # constrói uma subárvore inteira no worker e devolve o fragmento do tileset;
+    # max_levels vem com a tarefa porque os tilers o ajustam a cada octree
+    particionador = ParticionadorMorton.anexar(descritor)
+    try:
+        _generator_worker.max_levels = max_levels
+        _generator_worker.tile_counter = 0
+        _generator_worker.comparacao_volumes = _generator_worker._comparacao_volumes_vazia()
+        tile_dict = _generator_worker._construir_no_octree(
+            particionador, inicio, fim, nivel, bounds, caminho
+        )
+        _generator_worker.descarregar_tiles()
+    finally:
+        particionador.liberar()
+    return tile_dict, _generator_worker.tile_counter, _generator_worker.comparacao_volumes
+
+
+def _obter_pool(generator) -> ProcessPoolExecutor:
+    global _pool_tiles, _generator_pool
+    if _generator_pool is not generator:
+        encerrar_pool_tiles()
+    if _pool_tiles is None:
+        _pool_tiles = ProcessPoolExecutor(max_workers=generator.num_workers,
+                                          mp_context=multiprocessing.get_context("spawn"),
+                                          initializer=_inicializar_worker_tiles,
+                                          initargs=(generator,))
+        _generator_pool = generator
+    return _pool_tiles
+
+
+def encerrar_pool_tiles():
+    # encerra o pool do build; o próximo construir_octree_paralela cria outro
+    global _pool_tiles, _generator_pool
+    pool, _pool_tiles, _generator_pool = _pool_tiles, None, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+atexit.register(encerrar_pool_tiles)
+
+
+def niveis_sequenciais(num_workers: int) -> int:
+    # níveis divididos no processo principal: ~4 subárvores por worker para balancear a carga
+    return max(1, math.ceil(math.log(4 * num_workers, 8)))
+
+
+def construir_octree_paralela(generator, particionador: ParticionadorMorton, nivel: int,
+                              bounds, caminho: str = "r") -> dict:
+    """
+    Divide os primeiros níveis da octree no processo principal e constrói cada
+    subárvore restante no pool de processos do build. Os workers leem os pontos
+    ordenados direto da memória compartilhada do particionador, gravam seus
+    .pnts em paralelo e devolvem fragmentos do tileset, que são encaixados nos
+    nós reservados da árvore principal. Os nomes dos tiles vêm do caminho do
+    nó na octree, então não colidem entre workers.
+    """
+    generator._nivel_paralelo = nivel + niveis_sequenciais(generator.num_workers)
+    generator._subarvores_pendentes = []
+    try:
+        tile_raiz = generator._construir_no_octree(
+            particionador, 0, len(particionador.pontos), nivel, bounds, caminho
+        )
+        pendentes = generator._subarvores_pendentes
+    finally:
+        generator._nivel_paralelo = None
+        generator._subarvores_pendentes = None
+
+    if not pendentes:
+        return tile_raiz
+
+    # as maiores subárvores primeiro, para que nenhum worker fique com a última tarefa longa
+    pendentes.sort(key=lambda pendente: pendente[1][1] - pendente[1][0], reverse=True)
+    print(f"Construindo {len(pendentes)} subárvores em {generator.num_workers} processos...")
+
+    descritor = particionador.descritor()
+    pool = _obter_pool(generator)
+    try:
+        futures = [(no, pool.submit(_construir_subarvore, descritor, generator.max_levels, *tarefa))
+                   for no, tarefa in pendentes]
+
+        for no, future in futures:
+            tile_dict, tiles_criados, comparacao_volumes = future.result()
+            no.update(tile_dict)
+            generator.tile_counter += tiles_criados
+            for chave, valor in comparacao_volumes.items():
+                generator.comparacao_volumes[chave] += valor
+    except BaseException:
+        # espera as tarefas em andamento antes de quem chamou soltar a memória
+        # compartilhada; um pool quebrado também não serve para a próxima octree
+        encerrar_pool_tiles()
+        raise
+
+    return tile_raiz
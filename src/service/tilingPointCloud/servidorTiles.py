@@ -0,0 +1,405 @@
+import os
+import sys
+import html
+import asyncio
+import argparse
+import posixpath
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+# só biblioteca padrão: o servidor roda no container do viewer sem numpy nem py3dtiles
+
+PREFIXO_TILES = "/3dTilesPointCloud/"
+CAMINHO_METRICAS = "/metricas"
+# irmãos pré-comprimidos gravados pelo compressaoTiles, na ordem de preferência
+CODIFICACOES = (("br", ".br"), ("gzip", ".gz"))
+TIPOS_CONTEUDO = {
+    ".json": "application/json", ".pnts": "application/octet-stream", ".subtree": "application/octet-stream",
+    ".npy": "application/octet-stream", ".html": "text/html; charset=utf-8", ".js": "application/javascript",
+    ".css": "text/css", ".png": "image/png", ".jpg": "image/jpeg", ".svg": "image/svg+xml",
+}
+CABECALHOS_CORS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, HEAD, OPTIONS",
+    "Access-Control-Allow-Headers": "Origin, Content-Type, Accept, Range, If-None-Match, If-Modified-Since",
+    "Access-Control-Expose-Headers": "Content-Length, Content-Range, Content-Encoding, ETag",
+}
+MOTIVOS = {200: "OK", 204: "No Content", 206: "Partial Content", 304: "Not Modified", 400: "Bad Request",
+           404: "Not Found", 405: "Method Not Allowed", 416: "Range Not Satisfiable", 500: "Internal Server Error"}
+TAMANHO_MAXIMO_CABECALHO = 64 * 1024
+# conexões keep-alive paradas por mais que isso são fechadas
+TEMPO_OCIOSO_S = 30.0
+# arquivos fora do cache são enviados em blocos desse tamanho
+TAMANHO_BLOCO_ENVIO = 1024 * 1024
+
+
+class CacheTiles:
+    """
+    Cache LRU dos bytes dos arquivos servidos, limitado por orcamento_bytes.
+    Cada entrada guarda o mtime e o tamanho do arquivo lido; um arquivo
+    regravado por um build novo não bate mais e é relido do disco. Arquivos
+    maiores que maximo_item_bytes não entram, para um tile enorme não
+    expulsar todos os tiles quentes da raiz.
+    """
+
+    def __init__(self, orcamento_bytes: int, maximo_item_bytes: Optional[int] = None):
+        self.orcamento_bytes = orcamento_bytes
+        self.maximo_item_bytes = maximo_item_bytes if maximo_item_bytes is not None else orcamento_bytes // 8
+        self._entradas: "OrderedDict[str, Tuple[Tuple[int, int], bytes]]" = OrderedDict()
+        self.bytes_usados = 0
+        self.acertos = 0
+        self.faltas = 0
+        self.remocoes = 0
+
+    def __len__(self) -> int:
+        return len(self._entradas)
+
+    @property
+    def taxa_acerto(self) -> float:
+        total = self.acertos + self.faltas
+        return self.acertos / total if total else 0.0
+
+    def cabe(self, tamanho: int) -> bool:
+        return tamanho <= self.maximo_item_bytes
+
+    def obter(self, chave: str, versao: Tuple[int, int]) -> Optional[bytes]:
+        entrada = self._entradas.get(chave)
+        if entrada is None or entrada[0] != versao:
+            return None
+        self._entradas.move_to_end(chave)
+        return entrada[1]
+
+    def guardar(self, chave: str, versao: Tuple[int, int], dados: bytes):
+        if not self.cabe(len(dados)):
+            return
+        antiga = self._entradas.pop(chave, None)
+        if antiga is not None:
+            self.bytes_usados -= len(antiga[1])
+        self._entradas[chave] = (versao, dados)
+        self.bytes_usados += len(dados)
+        while self.bytes_usados > self.orcamento_bytes:
+            _, (_, removidos) = self._entradas.popitem(last=False)
+            self.bytes_usados -= len(removidos)
+            self.remocoes += 1
+
+
+def _versao(estado: os.stat_result) -> Tuple[int, int]:
+    return estado.st_mtime_ns, estado.st_size
+
+
+def _etag(estado: os.stat_result, codificacao: Optional[str]) -> str:
+    sufixo = f"-{codificacao}" if codificacao else ""
+    return f'"{estado.st_mtime_ns:x}-{estado.st_size:x}{sufixo}"'
+
+
+def interpretar_range(cabecalho: str, tamanho: int) -> Optional[Tuple[int, int]]:
+    """
+    Intervalo [inicio, fim] (inclusivo) de um Range 'bytes=...' com uma só
+    faixa. Devolve None para pedidos que serão atendidos com o arquivo inteiro
+    (várias faixas ou sintaxe desconhecida) e levanta ValueError quando a
+    faixa não é satisfatível (416).
+    """
+    unidade, _, faixas = cabecalho.partition("=")
+    if unidade.strip().lower() != "bytes" or "," in faixas:
+        return None
+    inicio_texto, separador, fim_texto = (texto.strip() for texto in faixas.partition("-"))
+    if not separador or not (inicio_texto or fim_texto):
+        return None
+    try:
+        inicio = int(inicio_texto) if inicio_texto else None
+        fim = int(fim_texto) if fim_texto else None
+    except ValueError:
+        return None
+
+    if inicio is None:
+        # bytes=-n: os últimos n bytes
+        if fim <= 0 or tamanho == 0:
+            raise ValueError("faixa vazia")
+        return max(0, tamanho - fim), tamanho - 1
+    if inicio >= tamanho or (fim is not None and fim < inicio):
+        raise ValueError("faixa fora do arquivo")
+    return inicio, tamanho - 1 if fim is None else min(fim, tamanho - 1)
+
+
+class ServidorTiles:
+    """
+    Servidor HTTP/1.1 em asyncio para a pasta de saída do tiler e a página do
+    viewer, no lugar do nginx do serviço cesium-viewer. Os tiles mais pedidos
+    (raiz e níveis de cima, que todo viewer baixa) ficam no CacheTiles; leituras
+    simultâneas do mesmo arquivo esperam uma única leitura do disco. Serve os
+    irmãos .br/.gz quando o cliente aceita, com Range, ETag, If-None-Match e
+    If-Modified-Since, e expõe as métricas do cache em /metricas.
+    """
+
+    def __init__(self, diretorio_tiles: Path, diretorio_pagina: Optional[Path] = None,
+                 cache_mb: int = 256, prefixo_tiles: str = PREFIXO_TILES):
+        self.diretorio_tiles = Path(diretorio_tiles).resolve()
+        self.diretorio_pagina = Path(diretorio_pagina).resolve() if diretorio_pagina is not None else None
+        self.prefixo_tiles = "/" + prefixo_tiles.strip("/") + "/"
+        self.cache = CacheTiles(cache_mb * 1024 * 1024)
+        self._leituras: Dict[str, asyncio.Future] = {}
+        self.requisicoes: Dict[int, int] = {}
+        self.bytes_enviados = 0
+        self.bytes_lidos_disco = 0
+
+    def _resolver(self, caminho_url: str) -> Optional[Path]:
+        # arquivo local do caminho pedido, sem sair das pastas servidas
+        caminho_url = posixpath.normpath(unquote(caminho_url))
+        if caminho_url.startswith(self.prefixo_tiles) or caminho_url + "/" == self.prefixo_tiles:
+            base, relativo = self.diretorio_tiles, caminho_url[len(self.prefixo_tiles):]
+        elif self.diretorio_pagina is not None:
+            base, relativo = self.diretorio_pagina, caminho_url.lstrip("/")
+        else:
+            return None
+        destino = (base / relativo).resolve()
+        if destino != base and base not in destino.parents:
+            return None
+        if destino.is_dir() and base == self.diretorio_pagina and (destino / "index.html").is_file():
+            destino = destino / "index.html"
+        return destino
+
+    async def _ler_arquivo(self, caminho: Path, estado: os.stat_result) -> bytes:
+        chave = str(caminho)
+        versao = _versao(estado)
+        dados = self.cache.obter(chave, versao)
+        if dados is not None:
+            self.cache.acertos += 1
+            return dados
+
+        pendente = self._leituras.get(chave)
+        if pendente is not None:
+            # outro viewer já está lendo o mesmo tile: espera a mesma leitura
+            self.cache.acertos += 1
+            return await asyncio.shield(pendente)
+
+        self.cache.faltas += 1
+        pendente = asyncio.get_running_loop().run_in_executor(None, caminho.read_bytes)
+        self._leituras[chave] = pendente
+        try:
+            dados = await asyncio.shield(pendente)
+        finally:
+            del self._leituras[chave]
+        self.bytes_lidos_disco += len(dados)
+        # só guarda se o arquivo não mudou durante a leitura
+        if len(dados) == estado.st_size:
+            self.cache.guardar(chave, versao, dados)
+        return dados
+
+    def _escolher_variante(self, caminho: Path, estado: os.stat_result,
+                           aceita: str) -> Tuple[Path, os.stat_result, Optional[str]]:
+        # irmão pré-comprimido com o mesmo mtime do original (o compressaoTiles copia o mtime)
+        aceitas = {parte.split(";")[0].strip().lower() for parte in aceita.split(",")}
+        for codificacao, extensao in CODIFICACOES:
+            if codificacao not in aceitas:
+                continue
+            irmao = caminho.with_name(caminho.name + extensao)
+            try:
+                estado_irmao = irmao.stat()
+            except OSError:
+                continue
+            if estado_irmao.st_mtime_ns == estado.st_mtime_ns:
+                return irmao, estado_irmao, codificacao
+        return caminho, estado, None
+
+    def _nao_modificado(self, cabecalhos: Dict[str, str], etag: str, estado: os.stat_result) -> bool:
+        if "if-none-match" in cabecalhos:
+            etags = [valor.strip() for valor in cabecalhos["if-none-match"].split(",")]
+            return "*" in etags or etag in etags or "W/" + etag in etags
+        if "if-modified-since" in cabecalhos:
+            try:
+                return int(estado.st_mtime) <= parsedate_to_datetime(cabecalhos["if-modified-since"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _metricas(self) -> bytes:
+        linhas = ["# HELP servidor_tiles_requisicoes_total Requisições respondidas, por status",
+                  "# TYPE servidor_tiles_requisicoes_total counter"]
+        linhas += [f'servidor_tiles_requisicoes_total{{status="{status}"}} {quantidade}'
+                   for status, quantidade in sorted(self.requisicoes.items())]
+        for nome, tipo, valor, descricao in (
+            ("servidor_tiles_cache_acertos_total", "counter", self.cache.acertos, "Leituras atendidas pelo cache"),
+            ("servidor_tiles_cache_faltas_total", "counter", self.cache.faltas, "Leituras que foram ao disco"),
+            ("servidor_tiles_cache_taxa_acerto", "gauge", f"{self.cache.taxa_acerto:.4f}",
+             "Fração das leituras atendidas pelo cache"),
+            ("servidor_tiles_cache_bytes", "gauge", self.cache.bytes_usados, "Bytes guardados no cache"),
+            ("servidor_tiles_cache_orcamento_bytes", "gauge", self.cache.orcamento_bytes, "Limite do cache"),
+            ("servidor_tiles_cache_itens", "gauge", len(self.cache), "Arquivos no cache"),
+            ("servidor_tiles_cache_remocoes_total", "counter", self.cache.remocoes,
+             "Arquivos expulsos do cache pelo limite de memória"),
+            ("servidor_tiles_bytes_enviados_total", "counter", self.bytes_enviados, "Bytes de corpo enviados"),
+            ("servidor_tiles_bytes_lidos_disco_total", "counter", self.bytes_lidos_disco, "Bytes lidos do disco"),
+        ):
+            linhas += [f"# HELP {nome} {descricao}", f"# TYPE {nome} {tipo}", f"{nome} {valor}"]
+        return ("\n".join(linhas) + "\n").encode("utf-8")
+
+    def _listagem(self, diretorio: Path, caminho_url: str) -> bytes:
+        # como o autoindex do nginx, para navegar pela saída do tiler
+        itens = sorted(diretorio.iterdir(), key=lambda item: (not item.is_dir(), item.name))
+        base = caminho_url.rstrip("/") + "/"
+        linhas = [f'<a href="{html.escape(base + item.name)}{"/" if item.is_dir() else ""}">'
+                  f'{html.escape(item.name)}{"/" if item.is_dir() else ""}</a>' for item in itens]
+        return (f"<html><head><title>Index of {html.escape(base)}</title></head><body>"
+                f"<h1>Index of {html.escape(base)}</h1><pre>" + "\n".join(linhas) + "</pre></body></html>"
+                ).encode("utf-8")
+
+    async def _responder(self, metodo: str, caminho_url: str,
+                         cabecalhos: Dict[str, str]) -> Tuple[int, Dict[str, str], object]:
+        # status, cabeçalhos e corpo (bytes, ou (caminho, inicio, fim) para enviar do disco em blocos)
+        if metodo == "OPTIONS":
+            return 204, {}, b""
+        if metodo not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD, OPTIONS"}, b""
+        if caminho_url == CAMINHO_METRICAS:
+            return 200, {"Content-Type": "text/plain; version=0.0.4", "Cache-Control": "no-store"}, self._metricas()
+
+        caminho = self._resolver(caminho_url)
+        if caminho is None:
+            return 404, {}, b""
+        if caminho.is_dir():
+            return 200, {"Content-Type": "text/html; charset=utf-8"}, self._listagem(caminho, caminho_url)
+        try:
+            estado_original = caminho.stat()
+        except OSError:
+            return 404, {}, b""
+
+        arquivo, estado, codificacao = self._escolher_variante(caminho, estado_original,
+                                                               cabecalhos.get("accept-encoding", ""))
+        etag = _etag(estado, codificacao)
+        resposta = {
+            "Content-Type": TIPOS_CONTEUDO.get(caminho.suffix.lower(), "application/octet-stream"),
+            "ETag": etag,
+            "Last-Modified": formatdate(estado.st_mtime, usegmt=True),
+            "Accept-Ranges": "bytes",
+            "Vary": "Accept-Encoding",
+        }
+        if codificacao is not None:
+            resposta["Content-Encoding"] = codificacao
+        if self._nao_modificado(cabecalhos, etag, estado):
+            return 304, resposta, b""
+
+        tamanho = estado.st_size
+        inicio, fim, status = 0, tamanho - 1, 200
+        # If-Range com outro ETag: o cliente tem uma versão antiga e recebe o arquivo inteiro
+        if "range" in cabecalhos and cabecalhos.get("if-range", etag) == etag:
+            try:
+                faixa = interpretar_range(cabecalhos["range"], tamanho)
+            except ValueError:
+                resposta["Content-Range"] = f"bytes */{tamanho}"
+                return 416, resposta, b""
+            if faixa is not None:
+                (inicio, fim), status = faixa, 206
+                resposta["Content-Range"] = f"bytes {inicio}-{fim}/{tamanho}"
+
+        if metodo == "HEAD":
+            resposta["Content-Length"] = str(fim - inicio + 1)
+            return status, resposta, b""
+        if not self.cache.cabe(tamanho):
+            self.cache.faltas += 1
+            return status, resposta, (arquivo, inicio, fim)
+        dados = await self._ler_arquivo(arquivo, estado)
+        return status, resposta, memoryview(dados)[inicio:fim + 1]
+
+    async def _enviar_do_disco(self, writer: asyncio.StreamWriter, arquivo: Path, inicio: int, fim: int):
+        loop = asyncio.get_running_loop()
+        with open(arquivo, 'rb') as f:
+            f.seek(inicio)
+            restante = fim - inicio + 1
+            while restante > 0:
+                bloco = await loop.run_in_executor(None, f.read, min(TAMANHO_BLOCO_ENVIO, restante))
+                if not bloco:
+                    break
+                writer.write(bloco)
+                await writer.drain()
+                restante -= len(bloco)
+                self.bytes_lidos_disco += len(bloco)
+                self.bytes_enviados += len(bloco)
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    bruto = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), TEMPO_OCIOSO_S)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, asyncio.LimitOverrunError,
+                        ConnectionError):
+                    return
+                linhas = bruto.decode("latin-1").split("\r\n")
+                partes = linhas[0].split()
+                if len(partes) != 3:
+                    writer.write(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    await writer.drain()
+                    return
+                metodo, alvo, versao_http = partes
+                cabecalhos = {}
+                for linha in linhas[1:]:
+                    nome, separador, valor = linha.partition(":")
+                    if separador:
+                        cabecalhos[nome.strip().lower()] = valor.strip()
+                manter = (cabecalhos.get("connection", "").lower() != "close"
+                          if versao_http == "HTTP/1.1" else cabecalhos.get("connection", "").lower() == "keep-alive")
+
+                try:
+                    status, resposta, corpo = await self._responder(metodo.upper(), urlsplit(alvo).path, cabecalhos)
+                except Exception as e:
+                    print(f"Erro ao responder {metodo} {alvo}: {e}")
+                    status, resposta, corpo = 500, {}, b""
+                self.requisicoes[status] = self.requisicoes.get(status, 0) + 1
+
+                resposta.update(CABECALHOS_CORS)
+                resposta["Date"] = formatdate(usegmt=True)
+                resposta["Connection"] = "keep-alive" if manter else "close"
+                if "Content-Length" not in resposta:
+                    tamanho = corpo[2] - corpo[1] + 1 if isinstance(corpo, tuple) else len(corpo)
+                    resposta["Content-Length"] = str(tamanho if status not in (204, 304) else 0)
+                if status in (204, 304):
+                    resposta.pop("Content-Length")
+                cabecalho = f"HTTP/1.1 {status} {MOTIVOS.get(status, '')}\r\n" + "".join(
+                    f"{nome}: {valor}\r\n" for nome, valor in resposta.items()) + "\r\n"
+                writer.write(cabecalho.encode("latin-1"))
+                if isinstance(corpo, tuple):
+                    await self._enviar_do_disco(writer, *corpo)
+                elif corpo:
+                    writer.write(corpo)
+                    self.bytes_enviados += len(corpo)
+                await writer.drain()
+                if not manter:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def servir(self, host: str = "0.0.0.0", porta: int = 8000):
+        servidor = await asyncio.start_server(self._atender, host, porta, limit=TAMANHO_MAXIMO_CABECALHO)
+        print(f"Servindo {self.diretorio_tiles} em http://{host}:{porta}{self.prefixo_tiles}"
+              + (f" e a página de {self.diretorio_pagina}" if self.diretorio_pagina else "")
+              + f", cache de {self.cache.orcamento_bytes // (1024 * 1024)} MB, métricas em {CAMINHO_METRICAS}")
+        async with servidor:
+            await servidor.serve_forever()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Servidor dos tiles gerados e da página do viewer, "
+                                                 "com cache em memória dos tiles mais pedidos")
+    parser.add_argument("--diretorio-tiles", type=Path, default=Path("/3dTilesPointCloud"),
+                        help="pasta de saída do tiler (padrão: /3dTilesPointCloud)")
+    parser.add_argument("--diretorio-pagina", type=Path, default=None,
+                        help="pasta com o index.html do viewer (src/page); sem ela só os tiles são servidos")
+    parser.add_argument("--prefixo-tiles", default=PREFIXO_TILES, help=f"URL dos tiles (padrão: {PREFIXO_TILES})")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--cache-mb", type=int, default=256, help="memória do cache de tiles (padrão: 256)")
+    args = parser.parse_args(argv)
+
+    servidor = ServidorTiles(args.diretorio_tiles, args.diretorio_pagina, args.cache_mb, args.prefixo_tiles)
+    try:
+        asyncio.run(servidor.servir(args.host, args.porta))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+import os
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Dict, List, Tuple, Optional
+from lazExtractor import LAZExtractor
+from atributosPontos import COLUNAS_RGB
+from boundingVolumes import caixa_envolvente
+from filtragemPontos import FiltroPontos
+from memoriaCompartilhada import array_compartilhado, soltar_blocos
+from octreeMorton import calcular_chaves_morton, calcular_bounds_octante, PROFUNDIDADE_MAXIMA_MORTON
+
+# memória estimada por ponto durante a leitura de um bloco (registro laspy, coordenadas e transformação)
+BYTES_POR_PONTO_LEITURA = 160
+# memória estimada por ponto ao gerar os tiles de um bucket, fora as cores (pontos, chaves e ordenação);
+# com vários workers de tiles o bucket é lido direto para memória compartilhada e reordenado ali, sem cópia
+BYTES_POR_PONTO_TILING = 61
+PROFUNDIDADE_MAXIMA_BUCKETS = 8
+
+
+def montar_arvore(tiles_por_caminho: Dict[Tuple[int, ...], dict], prefixo: Tuple[int, ...] = (),
+                  tipo_volume: str = "aabb") -> dict:
+    """
+    Monta os níveis acima de subárvores já construídas, indexadas pelo caminho de
+    octantes a partir da raiz. Esses nós são contêineres "ADD" que só agrupam os filhos,
+    com um bounding volume do tipo tipo_volume que envolve os deles.
+    """
+    if prefixo in tiles_por_caminho:
+        return tiles_por_caminho[prefixo]
+
+    nivel_filho = len(prefixo) + 1
+    octantes_filhos = sorted({caminho[len(prefixo)] for caminho in tiles_por_caminho
+                              if len(caminho) >= nivel_filho and caminho[:len(prefixo)] == prefixo})
+    children = [montar_arvore(tiles_por_caminho, prefixo + (octante,), tipo_volume) for octante in octantes_filhos]
+
+    return {
+        "boundingVolume": caixa_envolvente([child["boundingVolume"] for child in children], tipo_volume),
+        "geometricError": 2.0 * max(child["geometricError"] for child in children),
+        "refine": "ADD",
+        "children": children
+    }
+
+
+class StreamingTiler:
+    """
+    Gera o tileset sem carregar a nuvem inteira na memória: os arquivos LAZ são
+    lidos em blocos, os pontos são despejados em buckets da octree no disco e
+    cada bucket é convertido em tiles de forma independente. O pico de memória
+    fica limitado por limite_memoria_mb, e não pelo tamanho do levantamento.
+    """
+
+    def __init__(self, extractor: LAZExtractor, generator, limite_memoria_mb: int = 4096,
+                 diretorio_temporario: Optional[Path] = None, filtro: Optional[FiltroPontos] = None):
+        self.extractor = extractor
+        self.generator = generator
+        # outliers contados enquanto os blocos vão para os buckets; filtragem e deduplicação em cada bucket
+        self.filtro = filtro if filtro is not None and filtro.ativo else None
+        self.limite_memoria_bytes = limite_memoria_mb * 1024 * 1024
+        self.diretorio_temporario = diretorio_temporario
+        self.pontos_por_chunk = max(10_000, self.limite_memoria_bytes // BYTES_POR_PONTO_LEITURA)
+        self.max_pontos_bucket = max(self.generator.max_points_per_tile,
+                                     self.limite_memoria_bytes
+                                     // (BYTES_POR_PONTO_TILING + self.extractor.largura_cores))
+
+    def _escolher_profundidade_buckets(self, total_pontos: int) -> int:
+        # levantamentos são quase 2.5D, então cada nível divide os pontos por ~4
+        profundidade = 0
+        while (total_pontos / (4 ** profundidade) > self.max_pontos_bucket
+               and profundidade < PROFUNDIDADE_MAXIMA_BUCKETS):
+            profundidade += 1
+        return profundidade
+
+    def _caminho_da_chave(self, chave: int, profundidade: int) -> Tuple[int, ...]:
+        return tuple((chave >> (3 * (profundidade - 1 - k))) & 7 for k in range(profundidade))
+
+    def _bounds_do_caminho(self, bounds, caminho: Tuple[int, ...]):
+        for octante in caminho:
+            bounds = calcular_bounds_octante(bounds, octante)
+        return bounds
+
+    def _arquivos_bucket(self, diretorio: Path, caminho: Tuple[int, ...]) -> Tuple[Path, Path]:
+        nome = "-".join(str(o) for o in caminho) if caminho else "r"
+        return diretorio / f"{nome}.xyz", diretorio / f"{nome}.rgb"
+
+    def _despejar_em_buckets(self, pontos: np.ndarray, cores: np.ndarray, bounds,
+                             profundidade: int, caminho_base: Tuple[int, ...],
+                             diretorio: Path, buckets: Dict[Tuple[int, ...], dict],
+                             trechos: Optional[List[Tuple[Path, int, int]]] = None):
+        # agrupa o bloco por bucket (uma ordenação) e anexa cada grupo ao arquivo do bucket;
+        # com 'trechos' anota onde as cores de cada grupo foram gravadas (arquivo, byte inicial, linhas)
+        chaves = calcular_chaves_morton(pontos, bounds, profundidade)
+        ordem = np.argsort(chaves, kind='stable')
+        chaves = chaves[ordem]
+        pontos = pontos[ordem]
+        cores = cores[ordem]
+        del ordem
+
+        unicas, inicios = np.unique(chaves, return_index=True)
+        fins = np.append(inicios[1:], len(chaves))
+
+        for chave, inicio, fim in zip(unicas.tolist(), inicios.tolist(), fins.tolist()):
+            caminho = caminho_base + self._caminho_da_chave(chave, profundidade)
+            arquivo_xyz, arquivo_rgb = self._arquivos_bucket(diretorio, caminho)
+
+            with open(arquivo_xyz, 'ab') as f:
+                pontos[inicio:fim].tofile(f)
+            with open(arquivo_rgb, 'ab') as f:
+                if trechos is not None:
+                    trechos.append((arquivo_rgb, f.seek(0, os.SEEK_END), fim - inicio))
+                cores[inicio:fim].tofile(f)
+
+            bucket = buckets.setdefault(caminho, {"caminho": caminho, "pontos": 0})
+            bucket["pontos"] += fim - inicio
+
+    def _zerar_rgb(self, trechos: List[Tuple[Path, int, int]]):
+        # o arquivo se revelou 16-bit: os blocos já despejados como 8-bit valem 0 nessa escala
+        for arquivo_rgb, inicio, linhas in trechos:
+            cores = np.memmap(arquivo_rgb, dtype=np.uint8, mode='r+', offset=inicio,
+                              shape=(linhas, self.extractor.largura_cores))
+            cores[:, :COLUNAS_RGB] = 0
+            cores.flush()
+            del cores
+
+    def _carregar_bucket(self, diretorio: Path, caminho: Tuple[int, ...],
+                         modo: str = 'r', memorias: Optional[list] = None) -> Tuple[np.ndarray, np.ndarray]:
+        arquivo_xyz, arquivo_rgb = self._arquivos_bucket(diretorio, caminho)
+        if modo == 'memmap':
+            pontos = np.memmap(arquivo_xyz, dtype=np.float64, mode='r').reshape(-1, 3)
+            cores = np.memmap(arquivo_rgb, dtype=np.uint8, mode='r').reshape(-1, self.extractor.largura_cores)
+        elif modo == 'compartilhado':
+            # direto para blocos de memória compartilhada, que os workers de tiles anexam sem cópia;
+            # os blocos vão para 'memorias', para serem soltos depois da octree do bucket
+            pontos = self._ler_em_bloco(arquivo_xyz, np.float64, 3, memorias)
+            cores = self._ler_em_bloco(arquivo_rgb, np.uint8, self.extractor.largura_cores, memorias)
+        else:
+            pontos = np.fromfile(arquivo_xyz, dtype=np.float64).reshape(-1, 3)
+            cores = np.fromfile(arquivo_rgb, dtype=np.uint8).reshape(-1, self.extractor.largura_cores)
+        return pontos, cores
+
+    def _ler_em_bloco(self, arquivo: Path, dtype, colunas: int, memorias: list) -> np.ndarray:
+        linhas = arquivo.stat().st_size // (np.dtype(dtype).itemsize * colunas)
+        array, shm = array_compartilhado((linhas, colunas), dtype)
+        memorias.append(shm)
+        with open(arquivo, 'rb') as f:
+            f.readinto(memoryview(array).cast('B'))
+        return array
+
+    def _redividir_bucket(self, diretorio: Path, bucket: dict, bounds_globais) -> Dict[Tuple[int, ...], dict]:
+        # bucket acima do limite de memória: divide em 8 sub-buckets lendo o arquivo por partes
+        caminho = bucket["caminho"]
+        bounds = self._bounds_do_caminho(bounds_globais, caminho)
+        pontos, cores = self._carregar_bucket(diretorio, caminho, modo='memmap')
+
+        sub_buckets = {}
+        for inicio in range(0, len(pontos), self.pontos_por_chunk):
+            fim = min(inicio + self.pontos_por_chunk, len(pontos))
+            self._despejar_em_buckets(np.array(pontos[inicio:fim]), np.array(cores[inicio:fim]),
+                                      bounds, 1, caminho, diretorio, sub_buckets)
+        del pontos, cores
+
+        for arquivo in self._arquivos_bucket(diretorio, caminho):
+            arquivo.unlink()
+
+        return sub_buckets
+
+    def gerar_tileset(self) -> dict:
+        arquivos_laz = self.extractor.listar_arquivos_laz()
+        cabecalhos = self.extractor.ler_cabecalhos_laz(arquivos_laz)
+        total_pontos = sum(c["point_count"] for c in cabecalhos)
+
+        bounds = self.extractor.estimar_bounds_ecef(cabecalhos)
+        self.generator.bounds_raiz = bounds
+        profundidade = self._escolher_profundidade_buckets(total_pontos)
+
+        print(f"Modo streaming: {len(arquivos_laz)} arquivos LAZ, {total_pontos:,} pontos")
+        print(f"Limite de memória: {self.limite_memoria_bytes // (1024 * 1024)} MB, "
+              f"{self.pontos_por_chunk:,} pontos/bloco, até {self.max_pontos_bucket:,} pontos/bucket, "
+              f"profundidade dos buckets: {profundidade}")
+
+        self.generator._limpar_diretorio_saida()
+        self.generator.tile_counter = 0
+        self.generator.comparacao_volumes = self.generator._comparacao_volumes_vazia()
+
+        with tempfile.TemporaryDirectory(prefix="buckets_", dir=self.diretorio_temporario) as tmp:
+            diretorio = Path(tmp)
+            buckets: Dict[Tuple[int, ...], dict] = {}
+
+            for i, arquivo_laz in enumerate(arquivos_laz, 1):
+                print(f"Despejando arquivo {i}/{len(arquivos_laz)} em buckets: {arquivo_laz.name}")
+                # onde foram parar as cores deste arquivo, caso a escala dele mude no meio da leitura
+                trechos = []
+                try:
+                    for pontos, cores, zerar_anteriores in self.extractor.iterar_chunks_arquivo_laz(
+                            arquivo_laz, self.pontos_por_chunk):
+                        if zerar_anteriores:
+                            self._zerar_rgb(trechos)
+                        if self.filtro is not None:
+                            self.filtro.contar(pontos)
+                        self._despejar_em_buckets(pontos, cores, bounds, profundidade, (), diretorio, buckets,
+                                                  trechos)
+                except Exception as e:
+                    print(f"Erro ao processar {arquivo_laz}: {e}")
+
+            if not buckets:
+                raise ValueError("Nenhum arquivo LAZ válido foi processado!")
+            if self.filtro is not None:
+                self.filtro.finalizar_contagem()
+
+            # garante que nenhum bucket excede o limite de memória antes de gerar os tiles
+            pendentes = list(buckets.values())
+            buckets_finais = {}
+            while pendentes:
+                bucket = pendentes.pop()
+                if (bucket["pontos"] > self.max_pontos_bucket
+                        and len(bucket["caminho"]) < PROFUNDIDADE_MAXIMA_MORTON):
+                    # pontos que não se separam (ex. duplicados) continuam descendo até o limite da chave
+                    pendentes.extend(self._redividir_bucket(diretorio, bucket, bounds).values())
+                    continue
+                buckets_finais[bucket["caminho"]] = bucket
+
+            print(f"{len(buckets_finais)} buckets gerados, maior com "
+                  f"{max(b['pontos'] for b in buckets_finais.values()):,} pontos")
+
+            max_levels_original = self.generator.max_levels
+            modo = 'compartilhado' if self.generator.num_workers > 1 else 'r'
+            tiles_buckets = {}
+            try:
+                for j, caminho in enumerate(sorted(buckets_finais), 1):
+                    nivel = len(caminho)
+                    bounds_bucket = self._bounds_do_caminho(bounds, caminho)
+                    memorias = []
+                    try:
+                        pontos, cores = self._carregar_bucket(diretorio, caminho, modo, memorias)
+                        if self.filtro is not None:
+                            # compacta no lugar: o bucket filtrado continua no mesmo bloco
+                            pontos, cores = self.filtro.filtrar_bloco(pontos, cores)
+                            if len(pontos) == 0:
+                                continue
+
+                        # max_levels vale abaixo do nível do bucket
+                        self.generator.max_levels = max_levels_original + nivel
+                        tiles_buckets[caminho] = self.generator._construir_tiles_octree(
+                            pontos, cores, nivel, bounds_bucket, "r" + "".join(str(o) for o in caminho)
+                        )
+                        del pontos, cores
+                    finally:
+                        soltar_blocos(memorias)
+
+                    for arquivo in self._arquivos_bucket(diretorio, caminho):
+                        arquivo.unlink()
+                    print(f"Bucket {j}/{len(buckets_finais)} convertido em tiles")
+            finally:
+                self.generator.max_levels = max_levels_original
+
+        if self.filtro is not None:
+            self.filtro.imprimir_relatorio()
+        tile_raiz = montar_arvore(tiles_buckets, tipo_volume=self.generator.volume_limite)
+
+        tileset = {
+            "asset": {"version": "1.0"},
+            "geometricError": tile_raiz["geometricError"],
+            "root": tile_raiz
+        }
+
+        return tileset
@@ -0,0 +1,348 @@
+import json
+import shutil
+import numpy as np
+from pathlib import Path
+from octreeMorton import ParticionadorMorton
+from octreeParalela import construir_octree_paralela, encerrar_pool_tiles
+from amostragemLod import selecionar_amostra_voxel
+from divisaoAdaptativa import DIVISOES, construir_no_adaptativo
+from atributosPontos import validar_atributos, estimar_normais
+from boundingVolumes import TIPOS_VOLUME, volume_de_pontos, volume_em_m3, salvar_relatorio_volumes
+from codificacaoPnts import LIMITE_LOTE_ESCRITA, EscritorPnts, montar_tile_pnts, salvar_relatorio_compactacao
+from compressaoTiles import comprimir_tileset
+from indiceEspacial import salvar_indice_espacial
+from metricasBuild import etapa
+from tilingImplicito import converter_para_implicito, uri_conteudo_implicito
+from tilesetsExternos import resolver_tilesets_externos, dividir_tilesets_externos
+from verificacaoTileset import salvar_checksums_tiles
+
+class TileGeneratorBase:
+    """
+    Octree, LOD e gravação dos tiles e do tileset.json comuns aos generators.
+    Cada generator define os limites abaixo, _minimo_pontos_octante,
+    _erro_geometrico e gerar_tileset, e pode trocar _escrever_tile_pnts.
+    """
+    # octantes com menos pontos que isso não viram tiles filhos
+    PONTOS_MINIMOS_FILHO = 1
+    # abaixo desse erro geométrico o nó não é mais dividido
+    ERRO_GEOMETRICO_MINIMO = 0.0
+    # folga, em fração da extensão dos pontos, somada aos bounds calculados da raiz
+    MARGEM_BOUNDS = 0.0
+
+    def __init__(self, max_points_per_tile: int = 25000, max_levels: int = 6, num_workers: int = 1,
+                 lod: bool = False, formato_posicao: str = "float32", formato_cor: str = "rgb",
+                 compressao: tuple = (), tiling_implicito: bool = False, niveis_subarvore: int = 4,
+                 niveis_por_tileset: int = 0, output_dir: Path = Path("/3dTiles/"),
+                 divisao: str = "octree", volume_limite: str = "aabb", atributos: tuple = (),
+                 normais: bool = False, indice_espacial: bool = True,
+                 limite_lote_escrita: int = LIMITE_LOTE_ESCRITA):
+        self.output_dir = Path(output_dir)
+        self.max_points_per_tile = max_points_per_tile
+        self.max_levels = max_levels
+        self.tile_counter = 0
+        # com num_workers > 1 as subárvores abaixo de _nivel_paralelo são construídas em outros processos
+        self.num_workers = num_workers
+        self._nivel_paralelo = None
+        self._subarvores_pendentes = None
+        # com lod=True cada nó interno recebe uma amostra uniforme dos seus pontos como conteúdo
+        self.lod = lod
+        # "quantizado" grava POSITION_QUANTIZED (uint16 por eixo) e "rgb565" grava RGB565
+        self.formato_posicao = formato_posicao
+        self.formato_cor = formato_cor
+        # atributos do LAS que chegam como colunas extras das cores e vão para a batch table;
+        # têm que ser os mesmos do LAZExtractor. normais=True grava NORMAL_OCT16P estimado por tile
+        validar_atributos(atributos)
+        self.atributos = tuple(atributos)
+        self.normais = normais
+        # indice_espacial.npy ao lado do tileset.json, para as consultas de pontos do IndiceEspacial
+        self.indice_espacial = indice_espacial
+        # formatos ("gzip", "brotli") gravados ao lado de cada tile para o nginx servir pré-comprimidos
+        self.compressao = tuple(compressao)
+        # com limite_lote_escrita > 0 os .pnts pequenos são gravados em lote; descarregar_tiles() grava os pendentes
+        self._escritor = EscritorPnts(limite_lote_escrita)
+        # com tiling_implicito=True o tileset sai no formato 3D Tiles 1.1 implícito, com arquivos .subtree
+        self.tiling_implicito = tiling_implicito
+        self.niveis_subarvore = niveis_subarvore
+        # limites da raiz da octree, dos quais saem os octantes usados pelo tiling implícito
+        self.bounds_raiz = None
+        # com niveis_por_tileset > 0 a árvore é cortada em tilesets externos a cada tantos níveis (3D Tiles 1.0)
+        self.niveis_por_tileset = niveis_por_tileset
+        # origem ECEF (float64) dos pontos quando eles vêm relativos a ela em float32
+        # (ingestão de baixa memória); None quando os pontos já são ECEF absolutos
+        self.origem = None
+        # "adaptativa" corta os nós na mediana dos pontos (divisaoAdaptativa) em vez dos octantes do centro
+        if divisao not in DIVISOES:
+            raise ValueError(f"Divisão inválida: {divisao}")
+        if divisao == "adaptativa" and tiling_implicito:
+            raise ValueError("O tiling implícito precisa da divisão em octantes, não da adaptativa")
+        self.divisao = divisao
+        # "enu", "pca" ou "esfera" trocam a caixa alinhada aos eixos ECEF de cada nó por um volume mais justo
+        if volume_limite not in TIPOS_VOLUME:
+            raise ValueError(f"Tipo de bounding volume inválido: {volume_limite}")
+        if volume_limite != "aabb" and tiling_implicito:
+            raise ValueError("O tiling implícito usa as caixas dos octantes, não aceita outro bounding volume")
+        self.volume_limite = volume_limite
+        # soma dos volumes dos nós gerados, comparados com a caixa ECEF, para o relatório de bounding volumes
+        self.comparacao_volumes = self._comparacao_volumes_vazia()
+    
+    @staticmethod
+    def _comparacao_volumes_vazia() -> dict:
+        return {"nos": 0, "volume_aabb": 0.0, "volume": 0.0, "soma_razoes": 0.0}
+    
+    def _criar_bounding_volume_from_points(self, pontos: np.ndarray) -> dict:
+        # bounding volume do tipo volume_limite; fora do "aabb" também mede a caixa ECEF para o relatório
+        bounding_volume = volume_de_pontos(pontos, self.volume_limite, self.origem)
+        if self.volume_limite != "aabb":
+            volume_aabb = volume_em_m3(volume_de_pontos(pontos, "aabb"))
+            volume = volume_em_m3(bounding_volume)
+            self.comparacao_volumes["nos"] += 1
+            self.comparacao_volumes["volume_aabb"] += volume_aabb
+            self.comparacao_volumes["volume"] += volume
+            self.comparacao_volumes["soma_razoes"] += volume / volume_aabb if volume_aabb > 0 else 1.0
+        return bounding_volume
+    
+    def _estimar_normais(self, pontos: np.ndarray):
+        # normais pelos vizinhos dentro do próprio tile, ou None sem normais=True
+        if not self.normais:
+            return None
+        with etapa("normais", pontos=len(pontos)):
+            return estimar_normais(pontos, self.origem)
+    
+    def _escrever_tile_pnts(self, pontos: np.ndarray, cores: np.ndarray, filepath: Path,
+                            rtc_center: np.ndarray = None):
+        # escreve um tile no formato .pnts; com rtc_center as posições ficam relativas a ele
+        normais = self._estimar_normais(pontos)
+        with etapa("escrita_pnts", pontos=len(pontos)) as medida:
+            buffer = montar_tile_pnts(pontos, cores, self.formato_posicao, self.formato_cor,
+                                      rtc_center=rtc_center, origem=self.origem,
+                                      atributos=self.atributos, normais=normais)
+            self._escritor.adicionar(filepath, buffer)
+            medida["bytes"] = len(buffer)
+    
+    def _dividir_pontos_octree(self, particionador: ParticionadorMorton, inicio: int, fim: int,
+                               bounds, nivel: int = 0) -> list:
+        # octantes como fatias [inicio, fim) do array já ordenado por chave Morton
+        with etapa("divisao_octree", pontos=fim - inicio):
+            octantes = particionador.dividir(inicio, fim, nivel, bounds)
+        
+        min_points_threshold = self._minimo_pontos_octante(nivel)
+        return [
+            octante for octante in octantes
+            if octante['fim'] - octante['inicio'] >= min_points_threshold
+        ]
+    
+    def _separar_amostra_lod(self, particionador: ParticionadorMorton, inicio: int, fim: int):
+        # escolhe a amostra em grade de voxels e a move para o começo da fatia do nó
+        with etapa("amostragem_lod", pontos=fim - inicio):
+            pontos, _ = particionador.fatia(inicio, fim)
+            selecionados, espacamento = selecionar_amostra_voxel(pontos, self.max_points_per_tile)
+            return particionador.mover_para_frente(inicio, fim, selecionados), espacamento
+    
+    def _construir_tiles_octree(self, pontos: np.ndarray, cores: np.ndarray, 
+                               nivel: int = 0, bounds=None, caminho: str = "r") -> dict:
+        # ordena os pontos uma única vez e constrói a árvore sobre fatias contíguas;
+        # a divisão adaptativa reordena cada fatia ao dividir e não usa as chaves
+        profundidade_morton = self.max_levels - nivel if self.divisao == "octree" else 0
+        if bounds is None:
+            min_coords = np.min(pontos, axis=0).astype(np.float64)
+            max_coords = np.max(pontos, axis=0).astype(np.float64)
+            padding = (max_coords - min_coords) * self.MARGEM_BOUNDS
+            bounds = (min_coords - padding, max_coords + padding)
+        if caminho == "r":
+            self.bounds_raiz = bounds if self.origem is None else (bounds[0] + self.origem, bounds[1] + self.origem)
+        
+        if self.num_workers > 1:
+            with etapa("ordenacao_morton", pontos=len(pontos)):
+                particionador = ParticionadorMorton(pontos, cores, bounds, profundidade_morton, nivel,
+                                                    compartilhado=True)
+            try:
+                tile_dict = construir_octree_paralela(self, particionador, nivel, bounds, caminho)
+            finally:
+                particionador.liberar()
+        else:
+            with etapa("ordenacao_morton", pontos=len(pontos)):
+                particionador = ParticionadorMorton(pontos, cores, bounds, profundidade_morton, nivel)
+            tile_dict = self._construir_no_octree(particionador, 0, len(pontos), nivel, bounds, caminho)
+        
+        self.descarregar_tiles()
+        return tile_dict
+    
+    def descarregar_tiles(self):
+        # grava no disco os tiles que ainda estão no lote do escritor
+        self._escritor.descarregar()
+    
+    def _erro_geometrico(self, bounds, nivel: int) -> float:
+        raise NotImplementedError
+    
+    def _deve_criar_folha(self, quantidade: int, nivel: int, geometric_error: float) -> bool:
+        return (
+            quantidade <= self.max_points_per_tile or
+            nivel >= self.max_levels or
+            geometric_error < self.ERRO_GEOMETRICO_MINIMO
+        )
+    
+    def _minimo_pontos_octante(self, nivel: int) -> int:
+        # octantes com menos pontos que isso são descartados na divisão
+        raise NotImplementedError
+    
+    def _construir_no_octree(self, particionador: ParticionadorMorton, inicio: int, fim: int,
+                             nivel: int, bounds, caminho: str = "r") -> dict:
+        if self._subarvores_pendentes is not None and nivel >= self._nivel_paralelo:
+            # subárvore reservada para um worker; o fragmento é preenchido quando ele terminar
+            no = {}
+            self._subarvores_pendentes.append((no, (inicio, fim, nivel, bounds, caminho)))
+            return no
+        
+        if self.divisao == "adaptativa":
+            return construir_no_adaptativo(self, particionador, inicio, fim, nivel, caminho)
+        
+        # construção recursiva
+        pontos, cores = particionador.fatia(inicio, fim)
+        
+        bounding_volume = self._criar_bounding_volume_from_points(pontos)
+        
+        geometric_error = self._erro_geometrico(bounds, nivel)
+        
+        if self._deve_criar_folha(len(pontos), nivel, geometric_error):
+            self.tile_counter += 1
+            tile_filename = f"tile_{caminho}.pnts"
+            tile_path = self.output_dir / tile_filename
+            
+            self._escrever_tile_pnts(pontos, cores, tile_path)
+            
+            return {
+                "boundingVolume": bounding_volume,
+                "geometricError": 0.0 if self.lod else max(geometric_error, 1.0),
+                "content": {"uri": tile_filename},
+                "refine": "REPLACE"
+            }
+        else:
+            # tile pai -> divide em octantes
+            octantes = self._dividir_pontos_octree(particionador, inicio, fim, bounds, nivel)
+            
+            if len(octantes) <= 1:
+                # se não conseguiu dividi forçar criação de folha
+                self.tile_counter += 1
+                tile_filename = f"tile_{caminho}.pnts"
+                tile_path = self.output_dir / tile_filename
+                
+                self._escrever_tile_pnts(pontos, cores, tile_path)
+                
+                return {
+                    "boundingVolume": bounding_volume,
+                    "geometricError": 0.0 if self.lod else max(geometric_error, 1.0),
+                    "content": {"uri": tile_filename},
+                    "refine": "REPLACE"
+                }
+            
+            conteudo_lod = None
+            if self.lod:
+                # amostra uniforme do nó vira o conteúdo dele; o restante desce para os filhos
+                quantidade, espacamento = self._separar_amostra_lod(particionador, inicio, fim)
+                self.tile_counter += 1
+                tile_filename = f"tile_{caminho}.pnts"
+                amostra_pontos, amostra_cores = particionador.fatia(inicio, inicio + quantidade)
+                self._escrever_tile_pnts(amostra_pontos, amostra_cores, self.output_dir / tile_filename)
+                conteudo_lod = {"uri": tile_filename}
+                geometric_error = espacamento
+                octantes = self._dividir_pontos_octree(particionador, inicio + quantidade, fim, bounds, nivel)
+            
+            # cria tiles filhos recursivamente
+            children = []
+            for octante in octantes:
+                if octante['fim'] - octante['inicio'] >= self.PONTOS_MINIMOS_FILHO:
+                    child = self._construir_no_octree(
+                        particionador,
+                        octante['inicio'],
+                        octante['fim'],
+                        nivel + 1,
+                        octante['bounds'],
+                        caminho + str(octante['octante'])
+                    )
+                    children.append(child)
+            
+            tile_dict = {
+                "boundingVolume": bounding_volume,
+                "geometricError": geometric_error,
+                "refine": "ADD"
+            }
+            
+            if conteudo_lod is not None:
+                tile_dict["content"] = conteudo_lod
+            
+            if children:
+                tile_dict["children"] = children
+            
+            return tile_dict
+    
+    def _limpar_diretorio_saida(self):
+        """
+        Limpa o conteúdo do diretório de saída sem apagar o próprio diretório.
+        Isso evita o erro 'Device or resource busy' ao usar volumes Docker.
+        """
+        # Verifica se o diretório de saída realmente existe e é um diretório
+        if not self.output_dir.is_dir():
+            # saída ainda não existe (ex.: --saida apontando para uma pasta nova): só cria
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            return
+
+        print("Limpando diretório de saída...")
+        # Itera sobre cada item (arquivo, link ou subdiretório) DENTRO do diretório de saída
+        for item_path in self.output_dir.iterdir():
+            try:
+                # Se for um arquivo ou link simbólico, apaga com unlink()
+                if item_path.is_file() or item_path.is_symlink():
+                    item_path.unlink()
+                # Se for um subdiretório, apaga recursivamente com rmtree()
+                elif item_path.is_dir():
+                    shutil.rmtree(item_path)
+            except Exception as e:
+                print(f"Erro ao deletar {item_path}: {e}")
+        
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+    
+    def gerar_tileset(self, pontos: np.ndarray, cores: np.ndarray, forcar_regeneracao: bool = False) -> dict:
+        raise NotImplementedError
+    
+    def salvar_tileset_json(self, tileset: dict):
+        self.descarregar_tiles()
+        # todas as octrees do build já foram construídas
+        encerrar_pool_tiles()
+        with etapa("salvar_json") as medida:
+            # um tileset reaproveitado pode já estar dividido em tilesets externos
+            tileset = resolver_tilesets_externos(self.output_dir, tileset)
+            
+            if self.formato_posicao != "float32" or self.formato_cor != "rgb":
+                salvar_relatorio_compactacao(self.output_dir, tileset)
+            
+            if self.volume_limite != "aabb":
+                salvar_relatorio_volumes(self.output_dir, self.volume_limite, self.comparacao_volumes)
+            
+            if self.indice_espacial:
+                # antes do tiling implícito, que move os tiles e deixa só a raiz no tileset.json
+                salvar_indice_espacial(self.output_dir, tileset,
+                                       uri_conteudo_implicito if self.tiling_implicito else None)
+            
+            if self.tiling_implicito:
+                tileset = converter_para_implicito(self.output_dir, tileset, self.bounds_raiz, self.niveis_subarvore)
+            elif self.niveis_por_tileset > 0:
+                tileset = dividir_tilesets_externos(self.output_dir, tileset, self.niveis_por_tileset)
+            
+            tileset_path = self.output_dir / "tileset.json"
+            with open(tileset_path, 'w') as f:
+                if self.niveis_por_tileset > 0:
+                    json.dump(tileset, f, separators=(',', ':'))
+                else:
+                    json.dump(tileset, f, indent=2)
+            
+            print(f"Tileset salvo em: {tileset_path}")
+            print(f"Total de tiles criados: {self.tile_counter}")
+            medida["bytes"] = sum(arquivo.stat().st_size for arquivo in self.output_dir.glob("tileset*.json"))
+        
+        with etapa("checksums") as medida:
+            # CRC32 de cada tile no manifesto da build, conferido depois por verificar_tileset
+            medida["bytes"] = salvar_checksums_tiles(self.output_dir, self.num_workers)
+        
+        if self.compressao:
+            with etapa("compressao") as medida:
+                medida["bytes"] = comprimir_tileset(self.output_dir, self.compressao, self.num_workers)
\ No newline at end of file
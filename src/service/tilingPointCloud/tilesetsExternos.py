@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+from typing import Dict, List
+
+NOME_RELATORIO_TILESETS = "relatorio_tilesets.json"
+
+
+def _escrever_json_compacto(caminho: Path, dados: dict) -> int:
+    texto = json.dumps(dados, separators=(',', ':'))
+    with open(caminho, 'w') as f:
+        f.write(texto)
+    return len(texto.encode('utf-8'))
+
+
+def resolver_tilesets_externos(output_dir: Path, tileset: dict) -> dict:
+    """
+    Devolve o tileset com os tilesets externos (content.uri terminando em .json)
+    incorporados de volta na árvore, para que a árvore inteira possa ser
+    percorrida ou dividida de novo.
+    """
+    output_dir = Path(output_dir)
+
+    def resolver(tile: dict) -> dict:
+        uri = tile.get("content", {}).get("uri", "")
+        if uri.endswith(".json") and (output_dir / uri).exists():
+            with open(output_dir / uri, 'r') as f:
+                return resolver(json.load(f)["root"])
+        if "children" in tile:
+            return dict(tile, children=[resolver(child) for child in tile["children"]])
+        return tile
+
+    return dict(tileset, root=resolver(tileset["root"]))
+
+
+def dividir_tilesets_externos(output_dir: Path, tileset: dict, niveis_por_tileset: int) -> dict:
+    """
+    Corta a árvore a cada niveis_por_tileset níveis: cada nó com filhos nessa
+    profundidade vai para um tileset_<nó>.json próprio, referenciado pelo pai
+    via content.uri, e o Cesium só baixa o JSON das regiões que está exibindo.
+    O nome do nó é a sequência das posições dos filhos a partir da raiz (r, r0,
+    r03, ...). Todos os arquivos são gravados sem indentação, e um relatório
+    com os bytes de JSON por nível é salvo ao lado do tileset.json.
+    """
+    output_dir = Path(output_dir)
+    for antigo in output_dir.glob("tileset_*.json"):
+        antigo.unlink()
+
+    arquivos: List[Dict] = []
+
+    def dividir(tile: dict, nome: str, profundidade: int, nivel: int) -> dict:
+        if "children" not in tile:
+            return tile
+
+        children = []
+        for i, child in enumerate(tile["children"]):
+            nome_child = nome + str(i)
+            if profundidade + 1 < niveis_por_tileset or "children" not in child:
+                children.append(dividir(child, nome_child, profundidade + 1, nivel + 1))
+                continue
+
+            # o filho vira raiz de um tileset externo; no pai fica só um tile apontando para ele
+            uri = f"tileset_{nome_child}.json"
+            externo = {
+                "asset": {"version": "1.0"},
+                "geometricError": child["geometricError"],
+                "root": dividir(child, nome_child, 0, nivel + 1)
+            }
+            arquivos.append({"uri": uri, "nivel": nivel + 1,
+                             "bytes": _escrever_json_compacto(output_dir / uri, externo)})
+
+            referencia = {
+                "boundingVolume": child["boundingVolume"],
+                "geometricError": child["geometricError"],
+                "content": {"uri": uri}
+            }
+            if "refine" in child:
+                referencia["refine"] = child["refine"]
+            children.append(referencia)
+
+        return dict(tile, children=children)
+
+    tileset_raiz = dict(tileset, root=dividir(tileset["root"], "r", 0, 0))
+    arquivos.append({"uri": "tileset.json", "nivel": 0,
+                     "bytes": len(json.dumps(tileset_raiz, separators=(',', ':')).encode('utf-8'))})
+
+    salvar_relatorio_tilesets(output_dir, arquivos, len(json.dumps(tileset, indent=2).encode('utf-8')))
+    return tileset_raiz
+
+
+def salvar_relatorio_tilesets(output_dir: Path, arquivos: List[Dict], bytes_arquivo_unico: int):
+    niveis = {}
+    for arquivo in arquivos:
+        nivel = niveis.setdefault(arquivo["nivel"], {"nivel": arquivo["nivel"], "arquivos": 0, "bytes": 0})
+        nivel["arquivos"] += 1
+        nivel["bytes"] += arquivo["bytes"]
+
+    relatorio = {
+        "niveis": [niveis[n] for n in sorted(niveis)],
+        "bytes_total": sum(arquivo["bytes"] for arquivo in arquivos),
+        "bytes_tileset_unico": bytes_arquivo_unico,
+        "arquivos": sorted(arquivos, key=lambda arquivo: (arquivo["nivel"], arquivo["uri"]))
+    }
+    relatorio_path = Path(output_dir) / NOME_RELATORIO_TILESETS
+    with open(relatorio_path, 'w') as f:
+        json.dump(relatorio, f, indent=2)
+
+    print(f"Tilesets externos: {len(arquivos)} arquivos JSON, {relatorio['bytes_total']:,} bytes "
+          f"(tileset.json único teria {bytes_arquivo_unico:,} bytes)")
+    for nivel in relatorio["niveis"]:
+        print(f"  nível {nivel['nivel']}: {nivel['arquivos']} arquivos, {nivel['bytes']:,} bytes")
@@ -0,0 +1,248 @@
+import os
+import re
+import json
+import struct
+import numpy as np
+from pathlib import Path
+from typing import Dict, Iterator, List, Set, Tuple
+from codificacaoPnts import listar_conteudos
+
+URI_CONTEUDO = "content/{level}/{x}/{y}/{z}.pnts"
+URI_SUBARVORE = "subtrees/{level}/{x}/{y}/{z}.subtree"
+
+# só tiles nomeados pelo caminho na octree (tile_r0531.pnts) têm posição implícita
+PADRAO_TILE_OCTREE = re.compile(r"^tile_r([0-7]*)\.pnts$")
+
+Coordenada = Tuple[int, int, int, int]
+
+
+def caminho_para_coordenada(digitos: str) -> Coordenada:
+    # octante i: bit 0 é o X, bit 1 o Y e bit 2 o Z, a mesma ordem Morton do 3D Tiles
+    x = y = z = 0
+    for digito in digitos:
+        octante = int(digito)
+        x = (x << 1) | (octante & 1)
+        y = (y << 1) | ((octante >> 1) & 1)
+        z = (z << 1) | ((octante >> 2) & 1)
+    return len(digitos), x, y, z
+
+
+def _indice_morton(x: int, y: int, z: int, nivel: int) -> int:
+    indice = 0
+    for bit in range(nivel):
+        indice |= ((x >> bit) & 1) << (3 * bit)
+        indice |= ((y >> bit) & 1) << (3 * bit + 1)
+        indice |= ((z >> bit) & 1) << (3 * bit + 2)
+    return indice
+
+
+def _decodificar_morton(indice: int, nivel: int) -> Tuple[int, int, int]:
+    x = y = z = 0
+    for bit in range(nivel):
+        x |= ((indice >> (3 * bit)) & 1) << bit
+        y |= ((indice >> (3 * bit + 1)) & 1) << bit
+        z |= ((indice >> (3 * bit + 2)) & 1) << bit
+    return x, y, z
+
+
+def _inicio_nivel(nivel: int) -> int:
+    # quantidade de nós de uma octree completa acima de 'nivel': (8^nivel - 1) / 7
+    return ((1 << (3 * nivel)) - 1) // 7
+
+
+def _preencher_uri(modelo: str, coordenada: Coordenada) -> str:
+    nivel, x, y, z = coordenada
+    return modelo.format(level=nivel, x=x, y=y, z=z)
+
+
+def uri_conteudo_implicito(uri: str) -> str:
+    # para onde converter_para_implicito move o tile tile_r<caminho>.pnts
+    correspondencia = PADRAO_TILE_OCTREE.match(uri)
+    if correspondencia is None:
+        raise ValueError(f"Tile fora da octree não pode ir para o tiling implícito: {uri}")
+    return _preencher_uri(URI_CONTEUDO, caminho_para_coordenada(correspondencia.group(1)))
+
+
+def _bounds_para_box(bounds) -> List[float]:
+    min_coords, max_coords = np.asarray(bounds[0], dtype=np.float64), np.asarray(bounds[1], dtype=np.float64)
+    center = (min_coords + max_coords) / 2.0
+    half = (max_coords - min_coords) / 2.0
+    return [
+        float(center[0]), float(center[1]), float(center[2]),
+        float(half[0]), 0.0, 0.0,
+        0.0, float(half[1]), 0.0,
+        0.0, 0.0, float(half[2])
+    ]
+
+
+def _montar_subarvore(disponiveis: np.ndarray, conteudos: np.ndarray, filhas: np.ndarray) -> bytes:
+    """
+    Serializa um .subtree binário: cabeçalho 'subt', JSON e um buffer interno com
+    os bitstreams de disponibilidade. Bitstreams todos 0 ou todos 1 viram constantes.
+    """
+    buffer = bytearray()
+    buffer_views = []
+
+    def disponibilidade(bits: np.ndarray) -> dict:
+        quantidade = int(np.count_nonzero(bits))
+        if quantidade == 0:
+            return {"constant": 0}
+        if quantidade == len(bits):
+            return {"constant": 1}
+        buffer_views.append({"buffer": 0, "byteOffset": len(buffer), "byteLength": (len(bits) + 7) // 8})
+        buffer.extend(np.packbits(bits, bitorder='little').tobytes())
+        buffer.extend(b'\x00' * ((8 - len(buffer) % 8) % 8))
+        return {"bitstream": len(buffer_views) - 1, "availableCount": quantidade}
+
+    subtree_json = {
+        "tileAvailability": disponibilidade(disponiveis),
+        "contentAvailability": [disponibilidade(conteudos)],
+        "childSubtreeAvailability": disponibilidade(filhas)
+    }
+    if buffer_views:
+        subtree_json = dict({"buffers": [{"byteLength": len(buffer)}], "bufferViews": buffer_views}, **subtree_json)
+
+    json_bytes = json.dumps(subtree_json, separators=(',', ':')).encode('utf-8')
+    json_bytes += b' ' * ((8 - len(json_bytes) % 8) % 8)
+    return struct.pack('<4sIQQ', b'subt', 1, len(json_bytes), len(buffer)) + json_bytes + bytes(buffer)
+
+
+def _gravar_arquivo(caminho: Path, dados: bytes):
+    caminho.parent.mkdir(parents=True, exist_ok=True)
+    with open(caminho, 'wb', buffering=0) as f:
+        f.write(dados)
+
+
+def _ler_subarvore(caminho: Path, niveis_subarvore: int) -> Tuple[np.ndarray, np.ndarray]:
+    # bits de conteúdo e de subárvores filhas de um .subtree gravado por _montar_subarvore
+    with open(caminho, 'rb') as f:
+        dados = f.read()
+    magic, _, tamanho_json, tamanho_binario = struct.unpack_from('<4sIQQ', dados)
+    if magic != b'subt':
+        raise ValueError(f"Arquivo .subtree inválido: {caminho}")
+    subtree_json = json.loads(dados[24:24 + tamanho_json])
+    buffer = dados[24 + tamanho_json:24 + tamanho_json + tamanho_binario]
+
+    def bits(disponibilidade: dict, quantidade: int) -> np.ndarray:
+        if "constant" in disponibilidade:
+            return np.full(quantidade, bool(disponibilidade["constant"]))
+        view = subtree_json["bufferViews"][disponibilidade["bitstream"]]
+        empacotados = np.frombuffer(buffer, np.uint8, view["byteLength"], view["byteOffset"])
+        return np.unpackbits(empacotados, bitorder='little')[:quantidade].astype(bool)
+
+    return (bits(subtree_json["contentAvailability"][0], _inicio_nivel(niveis_subarvore)),
+            bits(subtree_json["childSubtreeAvailability"], 1 << (3 * niveis_subarvore)))
+
+
+def listar_conteudos_implicitos(output_dir: Path, raiz: dict) -> Iterator[str]:
+    """
+    URIs dos tiles com conteúdo de um tileset implícito, lendo um .subtree de
+    cada vez a partir da raiz (o inverso de converter_para_implicito).
+    """
+    implicito = raiz["implicitTiling"]
+    niveis_subarvore = implicito["subtreeLevels"]
+    pendentes = [(0, 0, 0, 0)]
+    while pendentes:
+        nivel_raiz, x_raiz, y_raiz, z_raiz = pendentes.pop()
+        conteudos, filhas = _ler_subarvore(
+            Path(output_dir) / _preencher_uri(implicito["subtrees"]["uri"], (nivel_raiz, x_raiz, y_raiz, z_raiz)),
+            niveis_subarvore
+        )
+        for relativo in range(niveis_subarvore):
+            inicio = _inicio_nivel(relativo)
+            for indice in np.flatnonzero(conteudos[inicio:inicio + (1 << (3 * relativo))]).tolist():
+                x, y, z = _decodificar_morton(indice, relativo)
+                yield _preencher_uri(raiz["content"]["uri"], (nivel_raiz + relativo, (x_raiz << relativo) + x,
+                                                              (y_raiz << relativo) + y, (z_raiz << relativo) + z))
+        for indice in np.flatnonzero(filhas).tolist():
+            x, y, z = _decodificar_morton(indice, niveis_subarvore)
+            pendentes.append((nivel_raiz + niveis_subarvore, (x_raiz << niveis_subarvore) + x,
+                              (y_raiz << niveis_subarvore) + y, (z_raiz << niveis_subarvore) + z))
+
+
+def converter_para_implicito(output_dir: Path, tileset: dict, bounds, niveis_subarvore: int = 4) -> dict:
+    """
+    Converte a árvore explícita em tiling implícito do 3D Tiles 1.1: cada tile
+    tile_r<caminho>.pnts é movido para content/{level}/{x}/{y}/{z}.pnts, a
+    disponibilidade de tiles e conteúdos vai para arquivos .subtree binários a
+    cada niveis_subarvore níveis e o tileset.json fica só com a raiz, então o
+    tamanho dele não depende mais da quantidade de tiles. 'bounds' são os
+    limites da raiz da octree, dos quais todos os octantes foram derivados.
+    """
+    if "implicitTiling" in tileset["root"]:
+        # tileset reaproveitado de uma build anterior já convertida
+        return tileset
+
+    output_dir = Path(output_dir)
+    conteudos: Set[Coordenada] = set()
+
+    for uri in listar_conteudos(tileset["root"]):
+        destino = output_dir / uri_conteudo_implicito(uri)
+        conteudos.add(caminho_para_coordenada(PADRAO_TILE_OCTREE.match(uri).group(1)))
+
+        destino.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(output_dir / uri, destino)
+
+    # um tile está disponível se tiver conteúdo ou algum descendente com conteúdo
+    disponiveis: Set[Coordenada] = set()
+    for nivel, x, y, z in conteudos:
+        while (nivel, x, y, z) not in disponiveis:
+            disponiveis.add((nivel, x, y, z))
+            if nivel == 0:
+                break
+            nivel, x, y, z = nivel - 1, x >> 1, y >> 1, z >> 1
+
+    niveis_disponiveis = max(nivel for nivel, _, _, _ in disponiveis) + 1
+    bits_tiles = _inicio_nivel(niveis_subarvore)
+    bits_filhas = 1 << (3 * niveis_subarvore)
+
+    subarvores: Dict[Coordenada, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def subarvore_de(nivel: int, x: int, y: int, z: int):
+        # subárvore que contém o tile e a posição dele dentro dela
+        nivel_raiz = (nivel // niveis_subarvore) * niveis_subarvore
+        relativo = nivel - nivel_raiz
+        raiz = (nivel_raiz, x >> relativo, y >> relativo, z >> relativo)
+        local = (x - (raiz[1] << relativo), y - (raiz[2] << relativo), z - (raiz[3] << relativo))
+        return raiz, relativo, local
+
+    for coordenada in sorted(disponiveis):
+        raiz, relativo, local = subarvore_de(*coordenada)
+        if raiz not in subarvores:
+            subarvores[raiz] = (np.zeros(bits_tiles, dtype=bool), np.zeros(bits_tiles, dtype=bool),
+                                np.zeros(bits_filhas, dtype=bool))
+        bits_disponiveis, bits_conteudo, bits_subarvores_filhas = subarvores[raiz]
+
+        indice = _inicio_nivel(relativo) + _indice_morton(*local, relativo)
+        bits_disponiveis[indice] = True
+        bits_conteudo[indice] = coordenada in conteudos
+
+        if relativo == 0 and raiz[0] > 0:
+            # a raiz de uma subárvore aparece como filha disponível na subárvore de cima
+            pai, _, local_pai = subarvore_de(raiz[0] - 1, raiz[1] >> 1, raiz[2] >> 1, raiz[3] >> 1)
+            filho_local = tuple((c << 1) | (r & 1) for c, r in zip(local_pai, raiz[1:]))
+            subarvores[pai][2][_indice_morton(*filho_local, niveis_subarvore)] = True
+
+    for raiz, (bits_disponiveis, bits_conteudo, bits_subarvores_filhas) in subarvores.items():
+        _gravar_arquivo(output_dir / _preencher_uri(URI_SUBARVORE, raiz),
+                        _montar_subarvore(bits_disponiveis, bits_conteudo, bits_subarvores_filhas))
+
+    print(f"Tiling implícito: {len(conteudos)} tiles em {niveis_disponiveis} níveis, "
+          f"{len(subarvores)} subárvores de {niveis_subarvore} níveis")
+
+    return {
+        "asset": {"version": "1.1"},
+        "geometricError": tileset["geometricError"],
+        "root": {
+            "boundingVolume": {"box": _bounds_para_box(bounds)},
+            "geometricError": tileset["root"]["geometricError"],
+            "refine": "ADD",
+            "content": {"uri": URI_CONTEUDO},
+            "implicitTiling": {
+                "subdivisionScheme": "OCTREE",
+                "subtreeLevels": niveis_subarvore,
+                "availableLevels": niveis_disponiveis,
+                "subtrees": {"uri": URI_SUBARVORE}
+            }
+        }
+    }
@@ -0,0 +1,147 @@
+import os
+import json
+import numpy as np
+from functools import lru_cache
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+import pyproj
+from pyproj import CRS, Transformer
+
+EPSG_ECEF = 4978
+MODOS_TRANSFORMACAO = ("exato", "plano_tangente")
+
+# pipelines PROJ já resolvidas por CRS de origem, reaproveitadas entre execuções
+CAMINHO_CACHE_PIPELINES = Path(os.environ.get(
+    "CACHE_PIPELINES_PROJ", Path.home() / ".cache" / "tilingPointCloud" / "pipelines_proj.json"
+))
+# abaixo disso por thread dividir a reprojeção não compensa o custo das threads
+PONTOS_MINIMOS_POR_THREAD = 100_000
+
+
+def _chave_cache(crs_origem: str) -> str:
+    # a versão do PROJ entra na chave: outra versão (ou outros grids) pode escolher outro pipeline
+    return f"{crs_origem}|{pyproj.proj_version_str}"
+
+
+def _ler_cache_pipelines() -> Dict[str, str]:
+    try:
+        with open(CAMINHO_CACHE_PIPELINES, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _salvar_cache_pipeline(crs_origem: str, definicao: str):
+    pipelines = _ler_cache_pipelines()
+    pipelines[_chave_cache(crs_origem)] = definicao
+    try:
+        CAMINHO_CACHE_PIPELINES.parent.mkdir(parents=True, exist_ok=True)
+        # temporário por processo: os workers de leitura podem gravar ao mesmo tempo
+        temporario = CAMINHO_CACHE_PIPELINES.with_name(f"{CAMINHO_CACHE_PIPELINES.name}.{os.getpid()}.tmp")
+        with open(temporario, 'w') as f:
+            json.dump(pipelines, f, indent=2)
+        os.replace(temporario, CAMINHO_CACHE_PIPELINES)
+    except OSError as e:
+        print(f"Aviso: não foi possível gravar o cache de pipelines PROJ: {e}")
+
+
+@lru_cache(maxsize=None)
+def obter_transformador(crs_origem: str) -> Transformer:
+    """
+    Transformador crs_origem -> ECEF, criado uma vez por processo. A definição do
+    pipeline escolhido pelo PROJ fica em CAMINHO_CACHE_PIPELINES, então nas
+    próximas execuções ele é recriado direto, sem a busca no proj.db.
+    """
+    definicao = _ler_cache_pipelines().get(_chave_cache(crs_origem))
+    if definicao:
+        return Transformer.from_pipeline(definicao)
+
+    transformador = Transformer.from_crs(CRS.from_user_input(crs_origem), CRS.from_epsg(EPSG_ECEF), always_xy=True)
+    definicao = transformador.definition
+    # com várias operações candidatas o PROJ só decide por ponto, e não há pipeline único para guardar
+    if definicao and "unavailable" not in definicao:
+        _salvar_cache_pipeline(crs_origem, definicao)
+    return transformador
+
+
+def transformacao_identidade(transformador: Transformer) -> bool:
+    # entrada já em ECEF (ex.: LAZ reprojetados pelo PDAL para EPSG:4978) resolve para um noop
+    return transformador.definition.startswith("proj=noop")
+
+
+def transformar_em_threads(transformador: Transformer, x: np.ndarray, y: np.ndarray, z: np.ndarray,
+                           num_threads: int = 1):
+    """
+    Reprojeta x, y e z in-place (arrays float64 contíguos). Com num_threads > 1
+    os arrays são divididos em fatias transformadas em paralelo: o PROJ libera
+    o GIL e o Transformer do pyproj pode ser usado por várias threads.
+    """
+    num_threads = min(num_threads, len(x) // PONTOS_MINIMOS_POR_THREAD)
+    if num_threads <= 1:
+        transformador.transform(x, y, z, inplace=True)
+        return
+
+    limites = np.linspace(0, len(x), num_threads + 1).astype(int).tolist()
+
+    def transformar_fatia(i: int):
+        inicio, fim = limites[i], limites[i + 1]
+        transformador.transform(x[inicio:fim], y[inicio:fim], z[inicio:fim], inplace=True)
+
+    with ThreadPoolExecutor(max_workers=num_threads) as pool:
+        list(pool.map(transformar_fatia, range(num_threads)))
+
+
+def _grade(mins: np.ndarray, maxs: np.ndarray, amostras: int) -> np.ndarray:
+    eixos = [np.linspace(mins[i], maxs[i], amostras) for i in range(3)]
+    return np.stack(np.meshgrid(*eixos, indexing='ij'), axis=-1).reshape(-1, 3)
+
+
+def _termos(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> list:
+    # termos do modelo além da constante: afins (plano tangente) e de segunda ordem,
+    # que cobrem a curvatura da Terra e a rotação da vertical ao longo da área
+    return [x, y, z, x * x, x * y, y * y, x * z, y * z]
+
+
+class AproximacaoPlanoTangente:
+    """
+    Aproximação de origem -> ECEF ajustada por mínimos quadrados sobre a caixa
+    de um arquivo: termos afins do plano tangente local mais os de segunda
+    ordem que cobrem a curvatura da Terra, avaliados com operações numpy no
+    lugar do pipeline PROJ. 'erro' é o maior desvio, em metros, medido numa
+    grade mais densa contra a transformação exata; só vale dentro da caixa.
+    """
+
+    # folga em metros em volta da caixa do cabeçalho, que também evita eixos degenerados
+    MARGEM = 1.0
+
+    def __init__(self, transformador: Transformer, mins: np.ndarray, maxs: np.ndarray):
+        self.mins = np.asarray(mins, dtype=np.float64) - self.MARGEM
+        self.maxs = np.asarray(maxs, dtype=np.float64) + self.MARGEM
+        self.centro = (self.mins + self.maxs) / 2.0
+
+        ajuste = _grade(self.mins, self.maxs, 5)
+        termos = np.column_stack(_termos(*(ajuste - self.centro).T) + [np.ones(len(ajuste))])
+        coeficientes, _, _, _ = np.linalg.lstsq(termos, self._exata(transformador, ajuste), rcond=None)
+        self.coeficientes, self.constante = coeficientes[:-1], coeficientes[-1]
+
+        validacao = _grade(self.mins, self.maxs, 9)
+        aproximados = np.column_stack(_termos(*(validacao - self.centro).T)) @ self.coeficientes + self.constante
+        self.erro = float(np.max(np.linalg.norm(aproximados - self._exata(transformador, validacao), axis=1)))
+
+    @staticmethod
+    def _exata(transformador: Transformer, pontos: np.ndarray) -> np.ndarray:
+        return np.column_stack(transformador.transform(pontos[:, 0], pontos[:, 1], pontos[:, 2]))
+
+    def cobre(self, x: np.ndarray, y: np.ndarray, z: np.ndarray) -> bool:
+        return all(len(v) == 0 or (v.min() >= lo and v.max() <= hi)
+                   for v, lo, hi in zip((x, y, z), self.mins, self.maxs))
+
+    def aplicar_em_lugar(self, x: np.ndarray, y: np.ndarray, z: np.ndarray):
+        termos = _termos(*(v - c for v, c in zip((x, y, z), self.centro)))
+        temporario = np.empty_like(x)
+        for eixo, destino in enumerate((x, y, z)):
+            destino.fill(self.constante[eixo])
+            for termo, coeficiente in zip(termos, self.coeficientes[:, eixo]):
+                np.multiply(termo, coeficiente, out=temporario)
+                destino += temporario
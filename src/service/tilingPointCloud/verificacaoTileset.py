@@ -0,0 +1,209 @@
+import sys
+import json
+import mmap
+import zlib
+import struct
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from buildManifest import ManifestoBuild
+from codificacaoPnts import TAMANHO_CABECALHO_PNTS
+from tilingImplicito import listar_conteudos_implicitos
+
+NOME_RELATORIO_VERIFICACAO = "relatorio_verificacao.json"
+# bytes por ponto de cada entrada da feature table e tamanho dos tipos da batch table
+BYTES_SEMANTICAS = {"POSITION": 12, "POSITION_QUANTIZED": 6, "RGBA": 4, "RGB": 3, "RGB565": 2,
+                    "NORMAL": 12, "NORMAL_OCT16P": 2}
+BYTES_COMPONENTES = {"BYTE": 1, "UNSIGNED_BYTE": 1, "SHORT": 2, "UNSIGNED_SHORT": 2, "INT": 4,
+                     "UNSIGNED_INT": 4, "FLOAT": 4, "DOUBLE": 8}
+COMPONENTES_POR_TIPO = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4}
+
+
+def iterar_conteudos(output_dir: Path, tileset: Optional[dict] = None) -> Iterator[str]:
+    """
+    URIs dos tiles do tileset, percorrendo a árvore sem montá-la inteira: cada
+    tileset externo é aberto só quando o percurso chega nele e o tiling
+    implícito é lido subárvore por subárvore. Um tileset externo que não existe
+    sai como URI, para a verificação apontar o arquivo faltando.
+    """
+    output_dir = Path(output_dir)
+    if tileset is None:
+        with open(output_dir / "tileset.json", 'r') as f:
+            tileset = json.load(f)
+    if "implicitTiling" in tileset["root"]:
+        yield from listar_conteudos_implicitos(output_dir, tileset["root"])
+        return
+
+    pendentes = [tileset["root"]]
+    while pendentes:
+        tile = pendentes.pop()
+        uri = tile.get("content", {}).get("uri")
+        if uri is not None and uri.endswith(".json") and (output_dir / uri).exists():
+            with open(output_dir / uri, 'r') as f:
+                pendentes.append(json.load(f)["root"])
+        elif uri is not None:
+            yield uri
+        pendentes.extend(reversed(tile.get("children", [])))
+
+
+def _verificar_secoes(dados: mmap.mmap, tamanho: int) -> Optional[str]:
+    magic, versao, byte_length, ft_json_length, ft_binary_length, bt_json_length, bt_binary_length = \
+        struct.unpack_from('<4sIIIIII', dados)
+    if magic != b'pnts':
+        return f"magic inválido {magic!r}"
+    if versao != 1:
+        return f"versão {versao} não suportada"
+    if byte_length != tamanho:
+        return f"byteLength {byte_length} diferente do tamanho do arquivo ({tamanho} bytes)"
+    if TAMANHO_CABECALHO_PNTS + ft_json_length + ft_binary_length + bt_json_length + bt_binary_length != byte_length:
+        return "tamanhos das seções não somam o byteLength"
+
+    try:
+        feature_table_json = json.loads(dados[TAMANHO_CABECALHO_PNTS:TAMANHO_CABECALHO_PNTS + ft_json_length])
+        inicio_batch = TAMANHO_CABECALHO_PNTS + ft_json_length + ft_binary_length
+        batch_table_json = json.loads(dados[inicio_batch:inicio_batch + bt_json_length]) if bt_json_length else {}
+        num_pontos = int(feature_table_json["POINTS_LENGTH"])
+    except (ValueError, KeyError, TypeError):
+        return "JSON da feature table ou da batch table inválido"
+
+    for semantica, tamanho_ponto in BYTES_SEMANTICAS.items():
+        if semantica in feature_table_json:
+            if feature_table_json[semantica]["byteOffset"] + num_pontos * tamanho_ponto > ft_binary_length:
+                return f"{semantica} passa do fim da feature table"
+    for nome, propriedade in batch_table_json.items():
+        if not isinstance(propriedade, dict) or "byteOffset" not in propriedade:
+            continue
+        tamanho_ponto = (BYTES_COMPONENTES.get(propriedade.get("componentType"), 0)
+                         * COMPONENTES_POR_TIPO.get(propriedade.get("type"), 0))
+        if propriedade["byteOffset"] + num_pontos * tamanho_ponto > bt_binary_length:
+            return f"{nome} passa do fim da batch table"
+    return None
+
+
+def verificar_pnts(caminho: Path, calcular_checksum: bool = False) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Problema encontrado no .pnts (ou None) e o CRC32 dele, quando pedido.
+    Confere magic, versão, byteLength contra o tamanho do arquivo, a soma das
+    seções e se cada entrada das tabelas cabe no corpo binário. O arquivo é
+    mapeado na memória; sem checksum só as páginas do cabeçalho e dos JSONs
+    são lidas.
+    """
+    try:
+        tamanho = caminho.stat().st_size
+    except FileNotFoundError:
+        return "arquivo não encontrado", None
+    if tamanho < TAMANHO_CABECALHO_PNTS:
+        return f"arquivo truncado ({tamanho} bytes)", None
+
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+        problema = _verificar_secoes(dados, tamanho)
+        checksum = f"{zlib.crc32(dados):08x}" if calcular_checksum else None
+    return problema, checksum
+
+
+def calcular_checksum_arquivo(caminho: Path) -> str:
+    # CRC32 do arquivo inteiro; detecta tiles corrompidos, não é um hash criptográfico
+    with open(caminho, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as dados:
+        return f"{zlib.crc32(dados):08x}"
+
+
+def salvar_checksums_tiles(output_dir: Path, num_workers: int = 1) -> int:
+    """
+    Grava no manifesto da build o CRC32 de cada tile do tileset já salvo, para
+    verificar_tileset apontar depois os tiles alterados ou corrompidos. zlib
+    libera o GIL, então um pool de threads basta. Retorna os bytes lidos.
+    """
+    output_dir = Path(output_dir)
+    uris = [uri for uri in iterar_conteudos(output_dir) if (output_dir / uri).is_file()]
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        checksums = list(pool.map(lambda uri: calcular_checksum_arquivo(output_dir / uri), uris))
+    ManifestoBuild(output_dir).atualizar({"checksums_tiles": dict(zip(uris, checksums))})
+    return sum((output_dir / uri).stat().st_size for uri in uris)
+
+
+def _subarvores_por_tile(manifesto: Optional[Dict]) -> Dict[str, str]:
+    # no modo incremental o manifesto diz a subárvore de cada tile, que é a unidade regenerável
+    if not manifesto:
+        return {}
+    return {uri: caminho for caminho, subarvore in manifesto.get("subarvores", {}).items()
+            for uri in subarvore["tiles"]}
+
+
+def verificar_tileset(output_dir: Path, comparar_checksums: bool = True, num_workers: int = 1) -> Dict:
+    """
+    Verifica todos os tiles do tileset em paralelo e diz exatamente quais
+    precisam ser regenerados: arquivo faltando, truncado ou com seções
+    inconsistentes e, com comparar_checksums e checksums no manifesto da
+    build, conteúdo diferente do gravado pela build. No modo incremental cada
+    tile inválido vem com a subárvore que o contém, para uma reconstrução
+    parcial. "erro" indica um tileset.json (ou .subtree) ilegível.
+    """
+    output_dir = Path(output_dir)
+    relatorio = {"valido": False, "tiles": 0, "checksums_comparados": False, "invalidos": [], "erro": None}
+    try:
+        uris = list(iterar_conteudos(output_dir))
+    except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+        relatorio["erro"] = f"{type(e).__name__}: {e}"
+        return relatorio
+
+    manifesto = ManifestoBuild(output_dir).carregar()
+    checksums = manifesto.get("checksums_tiles") if comparar_checksums and manifesto else None
+    relatorio["checksums_comparados"] = checksums is not None
+    subarvores = _subarvores_por_tile(manifesto)
+
+    with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+        resultados = list(pool.map(lambda uri: verificar_pnts(output_dir / uri, checksums is not None), uris))
+
+    for uri, (problema, checksum) in zip(uris, resultados):
+        if problema is None and checksums is not None:
+            if uri not in checksums:
+                problema = "tile ausente do manifesto da build"
+            elif checksums[uri] != checksum:
+                problema = "checksum diferente do manifesto da build"
+        if problema is not None:
+            invalido = {"uri": uri, "problema": problema}
+            if uri in subarvores:
+                invalido["subarvore"] = subarvores[uri]
+            relatorio["invalidos"].append(invalido)
+
+    relatorio["tiles"] = len(uris)
+    relatorio["valido"] = len(uris) > 0 and not relatorio["invalidos"]
+    return relatorio
+
+
+def imprimir_relatorio_verificacao(relatorio: Dict, limite: int = 10):
+    if relatorio["erro"] is not None:
+        print(f"Tileset ilegível: {relatorio['erro']}")
+        return
+    checksums = "com checksums" if relatorio["checksums_comparados"] else "sem checksums"
+    if relatorio["valido"]:
+        print(f"Tileset válido: {relatorio['tiles']} tiles verificados ({checksums})")
+        return
+    print(f"Tileset com {len(relatorio['invalidos'])} de {relatorio['tiles']} tiles a regenerar ({checksums})")
+    for invalido in relatorio["invalidos"][:limite]:
+        print(f"  {invalido['uri']}: {invalido['problema']}")
+    if len(relatorio["invalidos"]) > limite:
+        print(f"  ... e mais {len(relatorio['invalidos']) - limite}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Verifica os tiles de um tileset gerado e lista os que "
+                                                 "precisam ser regenerados")
+    parser.add_argument("diretorio", type=Path, help="pasta com o tileset.json")
+    parser.add_argument("--sem-checksums", action="store_true",
+                        help="só confere os cabeçalhos, sem ler os tiles inteiros")
+    parser.add_argument("--workers", type=int, default=8, help="threads da verificação (padrão: 8)")
+    args = parser.parse_args(argv)
+
+    relatorio = verificar_tileset(args.diretorio, not args.sem_checksums, args.workers)
+    imprimir_relatorio_verificacao(relatorio)
+    relatorio_path = args.diretorio / NOME_RELATORIO_VERIFICACAO
+    with open(relatorio_path, 'w') as f:
+        json.dump(relatorio, f, indent=2, ensure_ascii=False)
+    print(f"Relatório de verificação salvo em: {relatorio_path}")
+    return 0 if relatorio["valido"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())